@@ -0,0 +1,63 @@
+import json
+import math
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时退回标准库json
+    orjson = None
+
+
+def _default(obj):
+    """处理JSON不直接支持的类型：集合、NumPy/pandas标量"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'item'):
+        value = obj.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _replace_non_finite(obj):
+    """把NaN/Infinity替换为None，保证输出为严格JSON"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _replace_non_finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return [_replace_non_finite(value) for value in obj]
+    return obj
+
+
+def dumps(content: Any) -> bytes:
+    """
+    将内容序列化为UTF-8编码的严格JSON字节串，NaN/Infinity输出为null
+    
+    Args:
+        content: 可序列化的内容
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        text = json.dumps(content, ensure_ascii=False, separators=(',', ':'), allow_nan=False, default=_default)
+    except ValueError:
+        text = json.dumps(_replace_non_finite(content), ensure_ascii=False, separators=(',', ':'),
+                          allow_nan=False, default=_default)
+    return text.encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    高性能JSON响应：安装了orjson时使用orjson序列化，否则使用标准库json
+
+    路由直接返回该响应对象时，FastAPI会跳过jsonable_encoder的逐字段转换。
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
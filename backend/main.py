@@ -34,12 +34,14 @@ from backend.routers import crawler
 from backend.routers import history
 from backend.routers import preprocess
 from backend.routers import index
+from backend.routers import rag
 # 路由聚合
 app.include_router(search.router)
 app.include_router(crawler.router)
 app.include_router(history.router)
 app.include_router(preprocess.router)
 app.include_router(index.router)
+app.include_router(rag.router)
 
 # 配置 CORS
 app.add_middleware(
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from backend.utils.checkfile import check_multiple_files
-from backend.services.index_service import run_inverted_index
+from backend.services.index_service import run_inverted_index, run_neighbor_table, run_dense_index, run_passage_index, run_fts_index, run_spimi_index, run_incremental_index
 
 
 router = APIRouter(
@@ -11,16 +11,55 @@ router = APIRouter(
 @router.get("/check_index_file")
 async def check_index_file():
     target_files = [
-        "data/preprocessed_data/processed_documents.csv",
-        "data/preprocessed_data/tfidf_matrix.pkl"
+        "data/preprocessed_data/documents/columns.json",
+        "data/preprocessed_data/tfidf_matrix.npz"
     ]
     return check_multiple_files(
         file_paths=target_files
     )
     
 @router.get("/start_inverted_index")
-async def start_inverted_index(optimize,min_tfidf):
+async def start_inverted_index(optimize,min_tfidf,pruning: str = None,relative_threshold: float = 0.1,
+                               prune_top_k: int = 10,epsilon: float = 0.7,compress: bool = False,
+                               reorder: str = None,export_json: bool = False):
     return run_inverted_index(
         optimize=bool(optimize),
-        min_tfidf=float(min_tfidf)
-    )
\ No newline at end of file
+        min_tfidf=float(min_tfidf),
+        pruning=pruning or None,
+        compress=compress,
+        reorder=reorder or None,
+        export_json=export_json,
+        relative_threshold=relative_threshold,
+        prune_top_k=prune_top_k,
+        epsilon=epsilon
+    )
+
+
+@router.get("/start_neighbor_table")
+async def start_neighbor_table(top_k: int = 10):
+    return run_neighbor_table(top_k=top_k)
+
+
+@router.get("/start_dense_index")
+async def start_dense_index(n_components: int = 128):
+    return run_dense_index(n_components=n_components)
+
+
+@router.get("/start_passage_index")
+async def start_passage_index():
+    return run_passage_index()
+
+
+@router.get("/start_fts_index")
+async def start_fts_index():
+    return run_fts_index()
+
+
+@router.get("/start_spimi_index")
+async def start_spimi_index(memory_budget_mb: float = 256, workers: int = 1):
+    return run_spimi_index(memory_budget_mb=memory_budget_mb, workers=workers)
+
+
+@router.get("/start_incremental_index")
+async def start_incremental_index(merge_factor: int = 4):
+    return run_incremental_index(merge_factor=merge_factor)
\ No newline at end of file
@@ -0,0 +1,40 @@
+# =============== description ===============
+# 这里是RAG上下文组装的接口
+# ===========================================
+from fastapi import APIRouter, Query
+from typing import List, Optional
+from backend.services.rag_service import build_rag_context
+
+router = APIRouter(
+    prefix="/rag",
+    tags=['rag']
+)
+
+
+# =============== description ===============
+# 召回候选段落，用MMR去除内容重复的段落后按预算打包，返回上下文文本与引用
+# budget/unit: 上下文预算，unit为chars(字符数)或tokens(估计的token数)
+# diversity: MMR多样性权重，0时只按相关度选择
+# ===========================================
+@router.get("/context")
+async def context(
+    query: str,
+    budget: int = 2000,
+    unit: str = 'chars',
+    num_candidates: int = 50,
+    diversity: float = 0.3,
+    max_per_doc: Optional[int] = None,
+    source: Optional[List[str]] = Query(None),
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+):
+    filters = {'source': source, 'start_time': start_time, 'end_time': end_time}
+    return build_rag_context(
+        query,
+        budget=budget,
+        unit=unit,
+        num_candidates=num_candidates,
+        diversity=diversity,
+        filters=filters,
+        max_per_doc=max_per_doc
+    )
@@ -1,28 +1,130 @@
-from fastapi import APIRouter, Depends, HTTPException
-from backend.services.search_service import search_engine, get_snapshot,get_content
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from backend.core.responses import FastJSONResponse
+from backend.services.search_service import search_engine, search_stream, search_facets, search_passages, batch_search, get_similar_documents, get_snapshot,get_content
 
 router = APIRouter(
     prefix="/search",
     tags=["search"],
+    default_response_class=FastJSONResponse
 )
 
 
 # =============== description ===============
 # 最重要的搜索引擎接口
+# 可选过滤: source(可重复传入多个)、start_time、end_time
+# collapse: 是否折叠近似重复的结果
+# mode: lexical(倒排索引) / dense(LSA稠密检索) / hybrid(两路并行召回后融合)
+# rerank: lexical模式下是否对前500个候选做二阶段重排
+# diversify: lexical模式下按站点多样化结果，cap(每站点最多max_per_host条) / xquad，其他取值返回错误提示
+# stats: hybrid模式下返回 {"results": [...], "stats": 两路候选数与各阶段耗时(毫秒)}
 # ===========================================
 @router.get("/search_engine")
-async def search(query: str):
-    results = search_engine(query)
-    return results
+async def search(
+    query: str,
+    source: Optional[List[str]] = Query(None),
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    collapse: bool = True,
+    mode: str = 'lexical',
+    rerank: bool = False,
+    diversify: Optional[str] = None,
+    max_per_host: int = 2,
+    stats: bool = False
+):
+    filters = {'source': source, 'start_time': start_time, 'end_time': end_time}
+    results = search_engine(query, filters=filters, collapse=collapse, mode=mode, rerank=rerank,
+                            diversify=diversify, max_per_host=max_per_host, stats=stats)
+    return FastJSONResponse(results)
+
+
+# =============== description ===============
+# 流式搜索接口：参数同search_engine(仅lexical模式)
+# 结果以NDJSON逐行返回，每行一条结果，最后一行为 {"done": true, "total": n}
+# ===========================================
+@router.get("/search_stream")
+async def search_streaming(
+    query: str,
+    source: Optional[List[str]] = Query(None),
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    collapse: bool = True,
+    rerank: bool = False,
+    diversify: Optional[str] = None,
+    max_per_host: int = 2,
+    top_k: int = 50
+):
+    filters = {'source': source, 'start_time': start_time, 'end_time': end_time}
+    return StreamingResponse(
+        search_stream(query, filters=filters, collapse=collapse, rerank=rerank,
+                      diversify=diversify, max_per_host=max_per_host, top_k=top_k),
+        media_type='application/x-ndjson'
+    )
+
+
+# =============== description ===============
+# 分面统计接口：返回完整匹配集合按来源、发布月份的文档数
+# ===========================================
+@router.get("/facets")
+async def facets(
+    query: str,
+    source: Optional[List[str]] = Query(None),
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+):
+    filters = {'source': source, 'start_time': start_time, 'end_time': end_time}
+    return FastJSONResponse(search_facets(query, filters=filters))
+
+
+# =============== description ===============
+# 段落级检索接口：返回最相关的段落原文及其所属文档，供RAG组装上下文
+# max_per_doc: 每篇文档最多返回的段落数
+# ===========================================
+@router.get("/passages")
+async def passages(
+    query: str,
+    top_k: int = 10,
+    max_per_doc: Optional[int] = None,
+    source: Optional[List[str]] = Query(None),
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+):
+    filters = {'source': source, 'start_time': start_time, 'end_time': end_time}
+    return FastJSONResponse(search_passages(query, top_k=top_k, filters=filters, max_per_doc=max_per_doc))
+
+
+# =============== description ===============
+# 批量搜索接口，用于离线评测和批量报表
+# 请求体: {"queries": [...], "top_k": 50, "score_threshold": 0.2, "filters": {...}}
+# 结果以NDJSON逐行流式返回，每行对应一个查询
+# ===========================================
+@router.post("/batch_search")
+async def search_batch(payload: dict):
+    queries = payload.get('queries') or []
+    return StreamingResponse(
+        batch_search(
+            queries=[str(q) for q in queries],
+            top_k=int(payload.get('top_k', 50)),
+            score_threshold=float(payload.get('score_threshold', 0.2)),
+            filters=payload.get('filters')
+        ),
+        media_type='application/x-ndjson'
+    )
+
+
+@router.get("/similar")
+async def similar(doc_id: int, top_k: int = 10):
+    return FastJSONResponse(get_similar_documents(doc_id, top_k=top_k))
 
 
 @router.get("/get_snapshot")
 async def snapshot(doc_id: int):
     raw_html = get_snapshot(doc_id)
-    return raw_html
+    return FastJSONResponse(raw_html)
 
 
 @router.get("/get_content")
 async def content(doc_id: int):
     content = get_content(doc_id)
-    return content
+    return FastJSONResponse(content)
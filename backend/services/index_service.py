@@ -1,13 +1,18 @@
-from index import InvertedIndexBuilder
+from index import InvertedIndexBuilder, NeighborTableBuilder, DenseIndexBuilder, PassageIndexBuilder, FTSIndexBuilder, SPIMIIndexBuilder, IncrementalIndexer
 import json
 import threading
     
-def run_inverted_index(optimize,min_tfidf):
+def run_inverted_index(optimize,min_tfidf,pruning=None,compress=False,reorder=None,export_json=False,**pruning_params):
     preprocess_data_dir = "data/preprocessed_data"
     builder = InvertedIndexBuilder(preprocessed_data_dir=preprocess_data_dir)
     builder.run_pipeline(
         optimize=optimize,
-        min_tfidf=min_tfidf
+        min_tfidf=min_tfidf,
+        pruning=pruning,
+        compress=compress,
+        reorder=reorder,
+        export_json=export_json,
+        **pruning_params
     )
     try:
         report_path = "data/preprocessed_data/inverted_index/index_results.json"
@@ -18,6 +23,94 @@ def run_inverted_index(optimize,min_tfidf):
         return {'error': '文件格式错误'}
     except FileNotFoundError:
         return {'error': '文件未找到'}
-    
-    
-    
+
+
+def run_neighbor_table(top_k):
+    preprocess_data_dir = "data/preprocessed_data"
+    builder = NeighborTableBuilder(preprocessed_data_dir=preprocess_data_dir, top_k=top_k)
+    if not builder.run():
+        return {'error': '相似文档表构建失败'}
+    try:
+        info_path = "data/preprocessed_data/inverted_index/neighbors_info.json"
+        with open(info_path,'r',encoding='utf-8') as f:
+            info = json.load(f)
+        return info
+    except json.JSONDecodeError:
+        return {'error': '文件格式错误'}
+    except FileNotFoundError:
+        return {'error': '文件未找到'}
+
+
+def run_dense_index(n_components):
+    preprocess_data_dir = "data/preprocessed_data"
+    builder = DenseIndexBuilder(preprocessed_data_dir=preprocess_data_dir, n_components=n_components)
+    if not builder.run():
+        return {'error': '稠密索引构建失败'}
+    try:
+        info_path = "data/preprocessed_data/inverted_index/dense/dense_info.json"
+        with open(info_path,'r',encoding='utf-8') as f:
+            info = json.load(f)
+        return info
+    except json.JSONDecodeError:
+        return {'error': '文件格式错误'}
+    except FileNotFoundError:
+        return {'error': '文件未找到'}
+
+
+def run_passage_index():
+    preprocess_data_dir = "data/preprocessed_data"
+    builder = PassageIndexBuilder(preprocessed_data_dir=preprocess_data_dir)
+    if not builder.run():
+        return {'error': '段落索引构建失败'}
+    try:
+        info_path = "data/preprocessed_data/inverted_index/passages/passages_info.json"
+        with open(info_path,'r',encoding='utf-8') as f:
+            info = json.load(f)
+        return info
+    except json.JSONDecodeError:
+        return {'error': '文件格式错误'}
+    except FileNotFoundError:
+        return {'error': '文件未找到'}
+
+
+def run_fts_index():
+    preprocess_data_dir = "data/preprocessed_data"
+    builder = FTSIndexBuilder(preprocessed_data_dir=preprocess_data_dir)
+    if not builder.run():
+        return {'error': 'FTS5索引构建失败'}
+    try:
+        info_path = "data/preprocessed_data/inverted_index/fts_info.json"
+        with open(info_path,'r',encoding='utf-8') as f:
+            info = json.load(f)
+        return info
+    except json.JSONDecodeError:
+        return {'error': '文件格式错误'}
+    except FileNotFoundError:
+        return {'error': '文件未找到'}
+
+
+
+def run_spimi_index(memory_budget_mb, workers=1):
+    preprocess_data_dir = "data/preprocessed_data"
+    builder = SPIMIIndexBuilder(preprocessed_data_dir=preprocess_data_dir, memory_budget_mb=memory_budget_mb,
+                                workers=workers)
+    if not builder.run():
+        return {'error': 'SPIMI索引构建失败'}
+    try:
+        info_path = "data/preprocessed_data/inverted_index/spimi_info.json"
+        with open(info_path,'r',encoding='utf-8') as f:
+            info = json.load(f)
+        return info
+    except json.JSONDecodeError:
+        return {'error': '文件格式错误'}
+    except FileNotFoundError:
+        return {'error': '文件未找到'}
+
+
+def run_incremental_index(merge_factor):
+    # 只对新增或变化的页面写增量段，段的合并在后台线程中进行
+    indexer = IncrementalIndexer(merge_factor=merge_factor)
+    try:
+        return indexer.run(merge=True, background=True)
+    except Exception as e:
+        return {'error': f'增量索引失败: {e}'}
\ No newline at end of file
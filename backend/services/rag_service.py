@@ -0,0 +1,28 @@
+from backend.services.search_service import load_search_engine
+
+
+def build_rag_context(
+    query: str,
+    budget: int = 2000,
+    unit: str = 'chars',
+    num_candidates: int = 50,
+    diversity: float = 0.3,
+    filters: dict = None,
+    max_per_doc: int = None
+):
+    search_engine = load_search_engine()
+    if search_engine is None:
+        return {"加载索引失败"}
+    if not query:
+        return {"请输入查询词"}
+    if unit not in ('chars', 'tokens'):
+        return {"预算单位只能是chars或tokens"}
+    return search_engine.build_context(
+        query,
+        budget=budget,
+        unit=unit,
+        num_candidates=num_candidates,
+        diversity=diversity,
+        filters=filters,
+        max_per_doc=max_per_doc
+    )
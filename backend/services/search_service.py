@@ -1,26 +1,222 @@
-from retrieval import SearchEngine
+from retrieval import SearchEngine, FTSSearchEngine
+from retrieval.search_engine import DIVERSIFY_METHODS
+from index.stamp import read_build_stamp
 from backend.core.db import DBManager
+from backend.core.responses import dumps
+import json
+import os
+
+INDEX_DIR = "data/preprocessed_data/inverted_index"
+SEARCH_CONFIG_PATH = "retrieval/config.json"
+
+_engine_cache = {'engine': None, 'version': None}
+_fts_cache = {'engine': None, 'version': None}
+
+
+def load_search_engine():
+    """
+    获取已加载索引的搜索引擎实例，索引文件更新后自动重新加载
+    
+    返回:
+        SearchEngine: 加载失败时返回None
+    """
+    # 以构建标记作为版本号：倒排、相似文档表、稠密/段落子索引、增量段等任何构建步骤完成后都会更新它，
+    # 每次请求只需一次stat
+    version = read_build_stamp(INDEX_DIR)
+    if _engine_cache['engine'] is None or _engine_cache['version'] != version:
+        engine = SearchEngine(index_dir=INDEX_DIR)
+        if not engine.load_index():
+            return None
+        _engine_cache['engine'] = engine
+        _engine_cache['version'] = version
+    return _engine_cache['engine']
+
+
+def load_lexical_engine():
+    """
+    获取关键词检索使用的引擎，由retrieval/config.json中的lexical_engine选择:
+    inverted_index(默认，自建倒排索引) 或 fts5(SQLite FTS5磁盘索引)
+    
+    返回:
+        SearchEngine或FTSSearchEngine: 加载失败时返回None
+    """
+    config = {}
+    if os.path.exists(SEARCH_CONFIG_PATH):
+        with open(SEARCH_CONFIG_PATH, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    if config.get('lexical_engine', 'inverted_index') != 'fts5':
+        return load_search_engine()
+
+    db_path = os.path.join(INDEX_DIR, "fts.db")
+    version = os.path.getmtime(db_path) if os.path.exists(db_path) else None
+    if _fts_cache['engine'] is None or _fts_cache['version'] != version:
+        engine = FTSSearchEngine(index_dir=INDEX_DIR, **config.get('fts5_params', {}))
+        if not engine.load_index():
+            return None
+        _fts_cache['engine'] = engine
+        _fts_cache['version'] = version
+    return _fts_cache['engine']
 
 
 def search_engine(
     query: str, 
-    config: dict = None
+    config: dict = None,
+    filters: dict = None,
+    collapse: bool = True,
+    mode: str = 'lexical',
+    rerank: bool = False,
+    diversify: str = None,
+    max_per_host: int = 2,
+    stats: bool = False
 ):
-    index_dir = "data/preprocessed_data/inverted_index"
-    search_engine = SearchEngine(index_dir=index_dir)
-    if not search_engine.load_index():
+    if diversify and diversify not in DIVERSIFY_METHODS:
+        return {"多样化方式只能是cap或xquad"}
+    search_engine = load_lexical_engine() if mode == 'lexical' else load_search_engine()
+    if search_engine is None:
         return {"加载索引失败"}
     
     # 执行搜索
     if query:
-        results = search_engine.search(query, top_k=50,score_threshold=0.2)
+        summary = None
+        search_stats = None
+        if mode == 'dense':
+            results = search_engine.dense_search(query, top_k=50, filters=filters)
+        elif mode == 'hybrid':
+            results, search_stats = search_engine.hybrid_search(query, top_k=50, filters=filters, return_stats=True)
+        elif isinstance(search_engine, SearchEngine):
+            # 汇总信息(拼写建议)随本次查询返回，不读取引擎上的共享状态
+            *results, summary = search_engine.iter_search(query, top_k=50, score_threshold=0.2, filters=filters,
+                                                          collapse_duplicates=collapse, rerank=rerank,
+                                                          diversify=diversify, max_per_host=max_per_host,
+                                                          summary=True)
+        else:
+            results = search_engine.search(query, top_k=50, filters=filters)
+        if stats and search_stats is not None:
+            return {'results': results, 'stats': search_stats}
         if results:
             return results
-        else:
-            return {"未找到匹配的文档。"}
+        # 无结果时附带拼写建议
+        suggestion = summary.get('suggestion') if summary else None
+        if suggestion:
+            return {'message': "未找到匹配的文档。", 'did_you_mean': suggestion['suggestion'],
+                    'corrections': suggestion['corrections']}
+        return {"未找到匹配的文档。"}
     return {"请输入查询词"}
+
+
+def search_stream(
+    query: str,
+    filters: dict = None,
+    collapse: bool = True,
+    rerank: bool = False,
+    diversify: str = None,
+    max_per_host: int = 2,
+    top_k: int = 50
+):
+    """
+    流式搜索，以NDJSON格式每组装好一条结果就产出一行，最后一行为汇总信息
     
+    Args:
+        query: 查询字符串
+        filters: 过滤条件
+        top_k: 返回的最大结果数
+    """
+    search_engine = load_search_engine()
+    if search_engine is None:
+        yield dumps({'error': '加载索引失败'}) + b'\n'
+        return
+    if not query:
+        yield dumps({'error': '请输入查询词'}) + b'\n'
+        return
+    if diversify and diversify not in DIVERSIFY_METHODS:
+        yield dumps({'error': '多样化方式只能是cap或xquad'}) + b'\n'
+        return
+
+    total = 0
+    suggestion = None
+    for result in search_engine.iter_search(query, top_k=top_k, score_threshold=0.2, filters=filters,
+                                            collapse_duplicates=collapse, rerank=rerank,
+                                            diversify=diversify, max_per_host=max_per_host, summary=True):
+        if result.get('done'):
+            suggestion = result['suggestion']
+            continue
+        total += 1
+        yield dumps(result) + b'\n'
+
+    summary = {'done': True, 'total': total}
+    if total == 0 and suggestion:
+        summary['did_you_mean'] = suggestion['suggestion']
+    yield dumps(summary) + b'\n'
+
+
+def search_facets(
+    query: str,
+    filters: dict = None
+):
+    search_engine = load_search_engine()
+    if search_engine is None:
+        return {"加载索引失败"}
+    if not query:
+        return {"请输入查询词"}
+    return search_engine.facet_counts(query, filters=filters, score_threshold=0.2)
+
+
+def search_passages(
+    query: str,
+    top_k: int = 10,
+    filters: dict = None,
+    max_per_doc: int = None
+):
+    search_engine = load_search_engine()
+    if search_engine is None:
+        return {"加载索引失败"}
+    if not query:
+        return {"请输入查询词"}
+    results = search_engine.search_passages(query, top_k=top_k, filters=filters, max_per_doc=max_per_doc)
+    if results:
+        return results
+    return {"未找到匹配的段落。"}
+
+
+def get_similar_documents(
+    doc_id: int,
+    top_k: int = 10
+):
+    search_engine = load_search_engine()
+    if search_engine is None:
+        return {"加载索引失败"}
+    results = search_engine.similar_documents(doc_id, top_k=top_k)
+    if results:
+        return results
+    return {"未找到相似的文档。"}
+
+
+def batch_search(
+    queries: list,
+    top_k: int = 50,
+    score_threshold: float = 0.2,
+    filters: dict = None
+):
+    """
+    批量搜索，以NDJSON格式逐行产出每个查询的结果
     
+    Args:
+        queries: 查询字符串列表
+        top_k: 每个查询返回的最大结果数
+        score_threshold: 最低得分阈值
+        filters: 作用于整批查询的过滤条件
+    """
+    search_engine = load_search_engine()
+    if search_engine is None:
+        yield dumps({'error': '加载索引失败'}) + b'\n'
+        return
+
+    for query, results in search_engine.search_batch(queries, top_k=top_k, score_threshold=score_threshold,
+                                                          filters=filters):
+        line = {'query': query, 'total': len(results), 'results': results}
+        yield dumps(line) + b'\n'
+
+
 def get_snapshot(
     doc_id: int
 ):
@@ -1 +1,7 @@
-from .inverted_index import InvertedIndexBuilder
\ No newline at end of file
+from .inverted_index import InvertedIndexBuilder
+from .neighbors import NeighborTableBuilder
+from .dense_index import DenseIndexBuilder
+from .passage_index import PassageIndexBuilder
+from .fts_index import FTSIndexBuilder
+from .spimi import SPIMIIndexBuilder
+from .incremental import IncrementalIndexer
\ No newline at end of file
@@ -0,0 +1,237 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .postings import PostingsView, save_array
+
+# 每个块的倒排条目数
+BLOCK_SIZE = 128
+# 压缩倒排数组所在的子目录
+COMPRESSED_DIR = "compressed_postings"
+# 压缩倒排的各个数组，均保存为可内存映射的.npy文件
+COMPRESSED_ARRAYS = ("term_blocks", "block_entries", "block_first", "block_bits", "block_offsets", "block_max",
+                     "packed", "impacts")
+# 位打包数据末尾补齐的32位字数，解码时读取条目所在字的下一个字不会越界
+_PADDING_WORDS = 2
+
+
+def _block_layout(indptr, block_size):
+    """把每个词条的倒排表切成不超过block_size个条目的块，块不跨词条；返回(每词块数, 块起始条目)"""
+    lengths = np.diff(indptr)
+    blocks_per_term = (lengths + block_size - 1) // block_size
+    block_term = np.repeat(np.arange(len(lengths)), blocks_per_term)
+    first_block = np.repeat(np.cumsum(blocks_per_term) - blocks_per_term, blocks_per_term)
+    block_starts = indptr[:-1][block_term] + (np.arange(len(block_term)) - first_block) * block_size
+    return blocks_per_term, block_starts
+
+
+def packed_gap_bytes(indptr, rows, block_size=BLOCK_SIZE):
+    """估计按compress_postings的分块方式位打包行号间隔后的字节数，用于比较不同的文档顺序"""
+    indptr = np.asarray(indptr, dtype=np.int64)
+    _, block_starts = _block_layout(indptr, block_size)
+    if len(block_starts) == 0:
+        return 0
+    gaps = np.diff(np.asarray(rows, dtype=np.int64), prepend=0)
+    gaps[block_starts] = 0
+    block_bits = np.frexp(np.maximum.reduceat(gaps, block_starts).astype(np.float64))[1]
+    counts = np.diff(np.append(block_starts, len(gaps)))
+    return int(((counts * block_bits + 7) // 8).sum())
+
+
+def compress_postings(indptr, rows, weights, block_size=BLOCK_SIZE):
+    """
+    压缩按词组织的倒排数组
+
+    每个词条的倒排表按block_size个条目分块：块内文档行号存为首个行号加相邻行号的间隔，
+    间隔按块内最大值所需的位数紧凑位打包（块按字节对齐）；权重按块内最大权重线性量化为8位。
+
+    参数:
+        indptr, rows, weights (np.ndarray): 按词组织的倒排数组，每个词条内文档行号升序
+
+    返回:
+        dict: COMPRESSED_ARRAYS中的各个数组
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+
+    blocks_per_term, block_starts = _block_layout(indptr, block_size)
+    term_blocks = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(blocks_per_term, out=term_blocks[1:])
+    block_entries = np.append(block_starts, len(rows)).astype(np.int64)
+    counts = np.diff(block_entries)
+    entry_block = np.repeat(np.arange(len(block_starts)), counts)
+
+    # 块内相邻行号的间隔，块首条目的间隔为0（首个行号单独保存）
+    gaps = np.diff(rows, prepend=0)
+    gaps[block_starts] = 0
+    block_max_gap = np.maximum.reduceat(gaps, block_starts) if len(block_starts) else np.zeros(0, dtype=np.int64)
+    block_bits = np.frexp(block_max_gap.astype(np.float64))[1].astype(np.uint8)
+
+    block_bytes = (counts * block_bits + 7) // 8
+    block_offsets = np.zeros(len(block_starts) + 1, dtype=np.int64)
+    np.cumsum(block_bytes, out=block_offsets[1:])
+
+    # 逐位写入位数组：每个条目的第j位写在 块起始位 + 块内序号*位宽 + j
+    positions = np.arange(len(rows)) - block_starts[entry_block] if len(rows) else np.zeros(0, dtype=np.int64)
+    bit_positions = block_offsets[:-1][entry_block] * 8 + positions * block_bits[entry_block]
+    entry_bits = block_bits[entry_block]
+    bits = np.zeros(int(block_offsets[-1]) * 8, dtype=np.uint8)
+    for j in range(int(block_bits.max()) if len(block_bits) else 0):
+        selected = entry_bits > j
+        bits[bit_positions[selected] + j] = (gaps[selected] >> j) & 1
+    packed = np.packbits(bits, bitorder='little')
+    # 按小端32位字保存，解码时以字为单位读取
+    packed = np.concatenate([packed, np.zeros(-len(packed) % 4 + 4 * _PADDING_WORDS, dtype=np.uint8)]).view('<u4')
+
+    block_max = np.maximum.reduceat(weights, block_starts) if len(block_starts) else np.zeros(0, dtype=np.float32)
+    scale = np.where(block_max > 0, 255 / np.maximum(block_max, np.finfo(np.float32).tiny), 0)
+    # 量化后至少为1，被保留的条目不会因量化变成0分
+    impacts = np.clip(np.rint(weights * scale[entry_block]), 1, 255).astype(np.uint8)
+
+    return {
+        "term_blocks": term_blocks,
+        "block_entries": block_entries,
+        "block_first": rows[block_starts].astype(np.int32),
+        "block_bits": block_bits,
+        "block_offsets": block_offsets,
+        "block_max": block_max.astype(np.float32),
+        "packed": packed,
+        "impacts": impacts
+    }
+
+
+def save_compressed_postings(output_dir, arrays):
+    """把压缩倒排保存到output_dir下的子目录，返回保存的总字节数"""
+    directory = os.path.join(output_dir, COMPRESSED_DIR)
+    os.makedirs(directory, exist_ok=True)
+    for name in COMPRESSED_ARRAYS:
+        save_array(os.path.join(directory, f"{name}.npy"), arrays[name])
+    return int(sum(arrays[name].nbytes for name in COMPRESSED_ARRAYS))
+
+
+def remove_compressed_postings(output_dir):
+    """删除过时的压缩倒排"""
+    shutil.rmtree(os.path.join(output_dir, COMPRESSED_DIR), ignore_errors=True)
+
+
+def load_compressed_postings(index_dir, mmap_mode='r'):
+    """
+    加载压缩倒排
+
+    返回:
+        dict: 各个数组；文件不存在时返回None
+    """
+    directory = os.path.join(index_dir, COMPRESSED_DIR)
+    paths = {name: os.path.join(directory, f"{name}.npy") for name in COMPRESSED_ARRAYS}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+    return {name: np.load(path, mmap_mode=mmap_mode) for name, path in paths.items()}
+
+
+class CompressedPostings(PostingsView):
+    """
+    压缩倒排的只读字典视图，接口与PostingsView一致
+
+    每次访问词条时只解码该词条的块：取出每个条目起始位所在的32位字及其下一个字拼成64位整数，
+    移位、掩码得到间隔，再按块做前缀和还原行号，权重按块内最大权重反量化；全部为向量化的NumPy运算。
+    解码结果按LRU缓存在cache_mb以内，高频词条只在第一次访问时解码，打分与未压缩的倒排同样只需切片。
+
+    压缩以查询变慢换取更小的体积；block_max只是反量化的比例，打分时不用于跳过块。
+    """
+
+    def __init__(self, terms, arrays, doc_ids, cache_mb=64):
+        """
+        参数:
+            terms (sequence): 与词条编号对齐的词汇表
+            arrays (dict): load_compressed_postings或compress_postings返回的数组
+            doc_ids (np.ndarray): 文档行号 -> 原始文档ID
+            cache_mb (float): 解码结果缓存的上限(MB)，0表示不缓存
+        """
+        self.arrays = arrays
+        self.cache_bytes = int(cache_mb * 1024 * 1024)
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._cache_lock = threading.Lock()
+        self.term_blocks = np.asarray(arrays["term_blocks"])
+        self.block_entries = np.asarray(arrays["block_entries"])
+        self.block_first = arrays["block_first"]
+        self.block_bits = arrays["block_bits"]
+        self.block_offsets = arrays["block_offsets"]
+        self.block_max = arrays["block_max"]
+        self.packed = arrays["packed"]
+        self.impacts = arrays["impacts"]
+        # 每个词条的条目范围，供PostingsView统计条目数和非空词条
+        super().__init__(terms, self.block_entries[self.term_blocks], None, None, doc_ids)
+
+    def decode(self, term_id):
+        """
+        解码一个词条的倒排表（优先从缓存中取）
+
+        返回:
+            tuple: (int32文档行号, float32权重)，均为只读数组
+        """
+        with self._cache_lock:
+            postings = self._cache.get(term_id)
+            if postings is not None:
+                self._cache.move_to_end(term_id)
+                return postings
+
+        rows, weights = self._decode(term_id)
+        rows.flags.writeable = False
+        weights.flags.writeable = False
+        size = rows.nbytes + weights.nbytes
+        if size <= self.cache_bytes:
+            with self._cache_lock:
+                if term_id not in self._cache:
+                    self._cache[term_id] = (rows, weights)
+                    self._cached_bytes += size
+                while self._cached_bytes > self.cache_bytes:
+                    _, (old_rows, old_weights) = self._cache.popitem(last=False)
+                    self._cached_bytes -= old_rows.nbytes + old_weights.nbytes
+        return rows, weights
+
+    def _decode(self, term_id):
+        """解码一个词条的全部块"""
+        first_block, last_block = self.term_blocks[term_id], self.term_blocks[term_id + 1]
+        if first_block == last_block:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+        block_entries = np.asarray(self.block_entries[first_block:last_block + 1])
+        counts = np.diff(block_entries)
+        starts = block_entries[:-1] - block_entries[0]
+        block_bits = np.asarray(self.block_bits[first_block:last_block]).astype(np.uint64)
+
+        # 条目的起始位 = 块起始位 + 块内序号*位宽 = 条目序号*位宽 + (块起始位 - 块起始条目序号*位宽)，
+        # 括号内可能为负，按uint64取模运算，相加后结果仍然正确
+        word_start = int(self.block_offsets[first_block]) // 4
+        block_base = np.asarray(self.block_offsets[first_block:last_block]).astype(np.uint64) * 8 \
+            - np.uint64(word_start * 32) - starts.astype(np.uint64) * block_bits
+        bits = np.repeat(block_bits, counts)
+        bit_positions = np.arange(len(bits), dtype=np.uint64) * bits + np.repeat(block_base, counts)
+
+        words = np.asarray(self.packed[word_start:int(self.block_offsets[last_block]) // 4 + _PADDING_WORDS],
+                           dtype=np.uint64)
+        word_index = (bit_positions >> np.uint64(5)).astype(np.intp)
+        window = words[word_index] | (words[word_index + 1] << np.uint64(32))
+        gaps = (window >> (bit_positions & np.uint64(31))) & ((np.uint64(1) << bits) - np.uint64(1))
+
+        # 块内前缀和：块首的间隔为0，减去块首处的累计值即为相对块首行号的偏移
+        cumulative = np.cumsum(gaps.view(np.int64))
+        rows = cumulative + np.repeat(np.asarray(self.block_first[first_block:last_block]) - cumulative[starts], counts)
+
+        scale = np.asarray(self.block_max[first_block:last_block], dtype=np.float32) / np.float32(255)
+        weights = np.asarray(self.impacts[block_entries[0]:block_entries[-1]]) * np.repeat(scale, counts)
+        return rows.astype(np.int32), weights
+
+    def __getitem__(self, term):
+        rows, weights = self.decode(self.term_ids[term])
+        return list(zip(self.doc_ids[rows].tolist(), weights.tolist()))
+
+    @property
+    def nbytes(self):
+        """压缩倒排的总字节数"""
+        return int(sum(np.asarray(self.arrays[name]).nbytes for name in COMPRESSED_ARRAYS))
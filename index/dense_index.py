@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import logging
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+from preprocess.artifacts import load_tfidf
+from .postings import save_array
+from .stamp import touch_build_stamp
+
+logger = logging.getLogger(__name__)
+
+
+def spherical_kmeans(vectors, num_clusters, num_iterations=10, block_size=4096, random_state=42):
+    """
+    对L2归一化的向量做球面k-means聚类（以内积作为相似度）
+    
+    参数:
+        vectors (np.ndarray): (向量数, 维度) 的float32矩阵，行已归一化
+        num_clusters (int): 簇数
+        num_iterations (int): 迭代次数
+        block_size (int): 分配阶段每块处理的向量数，用于限制内存
+        random_state (int): 随机种子
+    
+    返回:
+        tuple: (簇中心矩阵, 每个向量所属的簇编号)
+    """
+    rng = np.random.default_rng(random_state)
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int32)
+
+    for _ in range(num_iterations):
+        for start in range(0, len(vectors), block_size):
+            block = vectors[start:start + block_size]
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # 空簇保留原中心
+        non_empty = norms > 0
+        centroids[non_empty] = sums[non_empty] / norms[non_empty, None]
+
+    return centroids, assignments
+
+
+class DenseIndexBuilder:
+    """
+    稠密索引构建器 - 在TF-IDF矩阵上拟合TruncatedSVD(潜在语义分析)得到文档向量，
+    并构建IVF倒排文件索引用于CPU上的近似最近邻检索
+    
+    输出目录(默认inverted_index/dense)包含:
+        components.npy   SVD投影矩阵，查询TF-IDF向量乘其转置即得查询向量
+        centroids.npy    IVF簇中心
+        list_offsets.npy 每个簇在embeddings.npy中的起止位置
+        embeddings.npy   按簇连续存放的float32文档向量，检索时以内存映射方式读取
+        doc_ids.npy      与embeddings.npy逐行对应的原始文档ID
+    """
+
+    def __init__(self, preprocessed_data_dir, output_dir=None, n_components=128, n_lists=None, random_state=42):
+        """
+        参数:
+            preprocessed_data_dir (str): 预处理数据目录，包含TF-IDF矩阵和文档ID映射
+            output_dir (str, optional): 输出目录，默认为preprocessed_data_dir/inverted_index/dense
+            n_components (int): 潜在语义维度
+            n_lists (int, optional): IVF簇数，默认取文档数的平方根
+            random_state (int): 随机种子
+        """
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.output_dir = output_dir if output_dir else os.path.join(preprocessed_data_dir, "inverted_index", "dense")
+        self.n_components = n_components
+        self.n_lists = n_lists
+        self.random_state = random_state
+
+        self.tfidf_matrix = None
+        self.doc_ids = None
+
+    def load_data(self):
+        """加载TF-IDF矩阵及文档ID映射"""
+        try:
+            self.tfidf_matrix, doc_ids = load_tfidf(self.preprocessed_data_dir)
+            self.doc_ids = np.asarray(doc_ids, dtype=np.int64) if doc_ids is not None else \
+                np.arange(self.tfidf_matrix.shape[0], dtype=np.int64)
+
+            logger.info(f"成功加载TF-IDF矩阵，维度: {self.tfidf_matrix.shape}")
+            return True
+        except Exception as e:
+            logger.error(f"加载TF-IDF矩阵失败: {e}")
+            return False
+
+    def run(self):
+        """运行完整的稠密索引构建流程"""
+        logger.info("开始构建稠密索引...")
+        start_time = time.time()
+
+        if not self.load_data():
+            logger.error("加载数据失败，流程终止")
+            return False
+
+        try:
+            num_docs, num_features = self.tfidf_matrix.shape
+            n_components = max(1, min(self.n_components, num_features - 1, num_docs - 1))
+
+            # 1. 潜在语义分析
+            svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+            embeddings = svd.fit_transform(self.tfidf_matrix).astype(np.float32)
+            norms = np.linalg.norm(embeddings, axis=1)
+            norms[norms == 0] = 1.0
+            embeddings /= norms[:, None]
+            logger.info(f"SVD完成，维度: {n_components}，解释方差比: {svd.explained_variance_ratio_.sum():.4f}")
+
+            # 2. IVF聚类，文档向量按簇连续存放
+            n_lists = self.n_lists or int(np.sqrt(num_docs))
+            n_lists = max(1, min(n_lists, num_docs))
+            centroids, assignments = spherical_kmeans(embeddings, n_lists, random_state=self.random_state)
+
+            order = np.argsort(assignments, kind='stable')
+            list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+            logger.info(f"IVF聚类完成，共{n_lists}个簇，最大簇{int(np.diff(list_offsets).max())}篇文档")
+
+            # 3. 保存
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir)
+            save_array(os.path.join(self.output_dir, "components.npy"), svd.components_.astype(np.float32))
+            save_array(os.path.join(self.output_dir, "centroids.npy"), centroids)
+            save_array(os.path.join(self.output_dir, "list_offsets.npy"), list_offsets)
+            save_array(os.path.join(self.output_dir, "embeddings.npy"), embeddings[order])
+            save_array(os.path.join(self.output_dir, "doc_ids.npy"), self.doc_ids[order])
+
+            info = {
+                "created_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "total_documents": int(num_docs),
+                "n_components": int(n_components),
+                "n_lists": int(n_lists),
+                "explained_variance_ratio": float(svd.explained_variance_ratio_.sum()),
+                "build_time_seconds": float(time.time() - start_time)
+            }
+            with open(os.path.join(self.output_dir, "dense_info.json"), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            # 稠密索引位于索引目录的子目录中，构建标记写在上一级的索引目录
+            touch_build_stamp(os.path.dirname(os.path.abspath(self.output_dir)))
+
+            logger.info(f"稠密索引构建完成，总耗时: {time.time() - start_time:.2f}秒")
+            return True
+        except Exception as e:
+            logger.error(f"构建稠密索引失败: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='构建LSA稠密索引')
+    parser.add_argument('--data_dir', type=str, required=True, help='预处理数据目录')
+    parser.add_argument('--output_dir', type=str, help='输出目录(可选)')
+    parser.add_argument('--n_components', type=int, default=128, help='潜在语义维度')
+    parser.add_argument('--n_lists', type=int, help='IVF簇数(可选)')
+
+    args = parser.parse_args()
+
+    builder = DenseIndexBuilder(
+        preprocessed_data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        n_components=args.n_components,
+        n_lists=args.n_lists
+    )
+    return 0 if builder.run() else 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from preprocess.artifacts import has_documents, iter_documents, PREVIEW_COLUMN
+from .inverted_index import parse_publish_time, MISSING_TIME
+from .stamp import touch_build_stamp
+
+logger = logging.getLogger(__name__)
+
+
+class FTSIndexBuilder:
+    """
+    SQLite FTS5索引构建器 - 把jieba预分词后的标题和正文写入FTS5虚拟表，
+    作为可替换倒排索引的磁盘常驻检索后端，也用作性能对比的基线
+
+    输出文件(默认inverted_index/fts.db)包含:
+        docs_fts    FTS5虚拟表(title, content)，rowid为原始文档ID；
+                    不保存原文(content='')，只保存倒排索引和BM25所需的统计
+        documents   结果展示与过滤用的文档元数据，publish_epoch缺失时为NULL
+    """
+
+    def __init__(self, preprocessed_data_dir, output_path=None, chunk_size=5000):
+        """
+        参数:
+            preprocessed_data_dir (str): 预处理数据目录，包含处理后的文档
+            output_path (str, optional): 输出数据库路径，默认为preprocessed_data_dir/inverted_index/fts.db
+            chunk_size (int): 每次读取并写入的文档数，用于限制内存
+        """
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.output_path = output_path if output_path else os.path.join(preprocessed_data_dir, "inverted_index", "fts.db")
+        self.chunk_size = chunk_size
+
+    def run(self):
+        """运行完整的FTS5索引构建流程"""
+        logger.info("开始构建FTS5索引...")
+        start_time = time.time()
+
+        if not has_documents(self.preprocessed_data_dir):
+            logger.error(f"找不到预处理数据: {self.preprocessed_data_dir}")
+            return False
+
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        # 写入临时文件后整体替换，构建过程中不影响正在使用的索引
+        temp_path = self.output_path + ".tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        try:
+            conn = sqlite3.connect(temp_path)
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("CREATE VIRTUAL TABLE docs_fts USING fts5(title, content, content='', tokenize='unicode61')")
+            conn.execute("""
+                CREATE TABLE documents (
+                    doc_id INTEGER PRIMARY KEY,
+                    title TEXT,
+                    source TEXT,
+                    publish_time TEXT,
+                    publish_epoch INTEGER,
+                    content_preview TEXT
+                )
+            """)
+
+            total_documents = 0
+            columns = ['doc_id', 'segmented_title', 'segmented_content', 'title', 'source', 'publish_time',
+                       PREVIEW_COLUMN]
+            for chunk in iter_documents(self.preprocessed_data_dir, columns, self.chunk_size):
+                doc_ids = chunk['doc_id'].astype(int).tolist()
+                conn.executemany(
+                    "INSERT INTO docs_fts (rowid, title, content) VALUES (?, ?, ?)",
+                    zip(doc_ids, chunk['segmented_title'].fillna(''), chunk['segmented_content'].fillna(''))
+                )
+
+                epochs = [None if epoch == MISSING_TIME else int(epoch)
+                          for epoch in parse_publish_time(chunk['publish_time'])]
+                meta = chunk[['title', 'source', 'publish_time']].astype(object)
+                meta = meta.where(meta.notna(), None)
+                conn.executemany(
+                    "INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                    zip(doc_ids, meta['title'], meta['source'], meta['publish_time'], epochs, chunk[PREVIEW_COLUMN])
+                )
+                total_documents += len(chunk)
+
+            # 合并FTS5内部的段，减少查询时需要读取的b-tree数量
+            conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+            conn.execute("CREATE INDEX idx_documents_source ON documents (source)")
+            conn.execute("CREATE INDEX idx_documents_epoch ON documents (publish_epoch)")
+            conn.commit()
+            conn.close()
+            os.replace(temp_path, self.output_path)
+
+            info = {
+                "created_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "total_documents": int(total_documents),
+                "database_size_bytes": int(os.path.getsize(self.output_path)),
+                "build_time_seconds": float(time.time() - start_time)
+            }
+            with open(os.path.join(output_dir, "fts_info.json"), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            touch_build_stamp(output_dir or '.')
+
+            logger.info(f"FTS5索引构建完成，共{total_documents}篇文档，总耗时: {time.time() - start_time:.2f}秒")
+            return True
+        except Exception as e:
+            logger.error(f"构建FTS5索引失败: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='构建SQLite FTS5索引')
+    parser.add_argument('--data_dir', type=str, required=True, help='预处理数据目录')
+    parser.add_argument('--output_path', type=str, help='输出数据库路径(可选)')
+
+    args = parser.parse_args()
+
+    builder = FTSIndexBuilder(
+        preprocessed_data_dir=args.data_dir,
+        output_path=args.output_path
+    )
+    return 0 if builder.run() else 1
+
+
+if __name__ == "__main__":
+    main()
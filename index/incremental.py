@@ -0,0 +1,429 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import sqlite3
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+from preprocess.artifacts import load_documents, load_duplicates
+from .inverted_index import parse_publish_time, extract_host, encode_column
+from .segments import (Segment, BASE_SEGMENT, segments_dir, read_manifest, write_manifest, new_segment_entry,
+                       read_tombstones, write_tombstones, tombstones_file)
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数上限以内的批大小
+_SQL_BATCH = 500
+
+
+def content_keys(clean_contents):
+    """清洗后内容的MD5，与全量预处理按clean_content去重的判断一致"""
+    return np.array([hashlib.md5((text or '').encode('utf-8')).hexdigest() for text in clean_contents], dtype='S32')
+
+
+class IncrementalIndexer:
+    """
+    增量索引器 - LSM式的增量段与分层合并
+
+    通过pages.content_hash与上次建索引时记录的哈希比较，找出新增或内容变化的页面，
+    只对这些页面做清洗、分词和TF-IDF编码（沿用基础索引的向量化器，词汇表和IDF不变），
+    写成一个小的增量段；SearchEngine加载时把各段的文档行依次追加在基础索引之后。
+
+    与全量预处理一样按清洗后的内容去重：与未删除的文档或同一批中更早的页面内容相同的页面不写入段，
+    只记录其内容哈希，内容再次变化时才重新处理。
+
+    删除用每个段（含基础索引）一个的删除位图表示：从数据库中消失的页面
+    （包括save_page以INSERT OR REPLACE重新抓取、换了新ID的页面的旧ID）在所有段中打删除标记，
+    内容变化的页面则是删除旧版本加上新段中的新版本。检索时在累加得分阶段跳过已删除的行，
+    合并段时清除这些行。
+
+    合并策略为分层合并：新段为第0层，同一层积累merge_factor个相邻的段后合并为上一层的一个段，
+    最高合并到max_level层，合并可以在后台线程中进行。增量段不会合并进基础索引，
+    全量重建基础索引时清除所有增量段。
+    """
+
+    # 同一进程内的增量构建与合并共用清单锁，合并另用一把锁保证同时只有一个合并在进行
+    _manifest_lock = threading.Lock()
+    _merge_lock = threading.Lock()
+
+    def __init__(self, preprocessed_data_dir='data/preprocessed_data', db_path='data/raw_data/crawler_data.db',
+                 config_path='preprocess/config.json', index_dir=None, merge_factor=4, max_level=3):
+        """
+        参数:
+            preprocessed_data_dir (str): 预处理数据目录，包含基础索引使用的处理后文档及tfidf_vectorizer.pkl
+            db_path (str): 爬虫数据库路径
+            config_path (str): 预处理配置文件路径
+            index_dir (str, optional): 基础索引目录，默认为preprocessed_data_dir下的inverted_index子目录
+            merge_factor (int): 同一层积累多少个段后合并
+            max_level (int): 合并的最高层数
+        """
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.db_path = db_path
+        self.config_path = config_path
+        self.index_dir = index_dir if index_dir else os.path.join(preprocessed_data_dir, "inverted_index")
+        self.merge_factor = merge_factor
+        self.max_level = max_level
+        self.state_file = os.path.join(segments_dir(self.index_dir), "doc_hashes.npz")
+
+        self._preprocessor = None
+        self._vectorizer = None
+
+    def _load_state(self):
+        """
+        读取已处理页面的内容哈希；首次增量运行时以基础索引为准：
+        基础索引中的文档及预处理去重时删除的页面视为已处理，其哈希取预处理时记录的值
+        （旧版本预处理没有记录去重删除的页面，改为把ID不超过基础索引最大文档ID的页面视为已处理，取数据库中的当前值）
+
+        返回:
+            tuple: (按ID升序的文档ID数组, 对应的内容哈希数组, 清洗后内容的哈希数组)；
+                   清洗后内容的哈希只记录未删除的文档，去重时删除的页面为空
+        """
+        if os.path.exists(self.state_file):
+            with np.load(self.state_file) as state:
+                return state['doc_ids'], state['hashes'], state['content_keys']
+
+        base_ids = self._base_doc_ids()
+        duplicates = load_duplicates(self.preprocessed_data_dir)
+        if duplicates is None:
+            page_ids, page_hashes = self._page_hashes()
+            seen = page_ids <= (int(base_ids.max()) if len(base_ids) else -1)
+            duplicates = page_ids[seen], page_hashes[seen]
+        duplicate_ids, duplicate_hashes = duplicates
+        # 基础索引中的文档即使已从数据库中消失也计入，下次检测时作为删除处理
+        doc_ids = np.union1d(base_ids, duplicate_ids)
+        hashes = np.zeros(len(doc_ids), dtype='S32')
+        hashes[np.searchsorted(doc_ids, duplicate_ids)] = duplicate_hashes
+        keys = np.zeros(len(doc_ids), dtype='S32')
+
+        processed = load_documents(self.preprocessed_data_dir, ['doc_id', 'content_hash', 'clean_content'])
+        processed_ids = processed['doc_id'].to_numpy(dtype=np.int64)
+        positions = np.searchsorted(doc_ids, processed_ids)
+        found = (positions < len(doc_ids)) & (doc_ids[np.minimum(positions, len(doc_ids) - 1)] == processed_ids)
+        found &= np.isin(processed_ids, base_ids)
+        if 'content_hash' in processed.columns:
+            hashes[positions[found]] = processed['content_hash'].fillna('').to_numpy(dtype='S32')[found]
+        keys[positions[found]] = content_keys(processed['clean_content'].fillna('').to_numpy()[found])
+        return doc_ids, hashes, keys
+
+    def _base_doc_ids(self):
+        """基础索引的文档行号 -> 原始文档ID"""
+        with open(os.path.join(self.index_dir, "doc_id_mapping.json"), 'r', encoding='utf-8') as f:
+            return np.asarray(json.load(f), dtype=np.int64)
+
+    def _save_state(self, doc_ids, hashes, keys):
+        order = np.argsort(doc_ids, kind='stable')
+        np.savez(self.state_file, doc_ids=doc_ids[order], hashes=hashes[order], content_keys=keys[order])
+
+    def _page_hashes(self):
+        """读取数据库中所有页面的ID和内容哈希，按ID升序"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT id, content_hash FROM pages ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        doc_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        hashes = np.array([row[1] or '' for row in rows], dtype='S32')
+        return doc_ids, hashes
+
+    def detect_changes(self):
+        """
+        比较数据库与已处理页面的内容哈希
+
+        返回:
+            tuple: (新增或内容变化的页面ID, 已处理过但已从数据库中消失的页面ID)
+        """
+        doc_ids, hashes = self._page_hashes()
+        known_ids, known_hashes, _ = self._load_state()
+
+        known = np.zeros(len(doc_ids), dtype=bool)
+        changed = np.zeros(len(doc_ids), dtype=bool)
+        if len(known_ids) > 0:
+            positions = np.minimum(np.searchsorted(known_ids, doc_ids), len(known_ids) - 1)
+            known = known_ids[positions] == doc_ids
+            changed = known & (known_hashes[positions] != hashes)
+        removed = known_ids[~np.isin(known_ids, doc_ids)]
+        return doc_ids[~known | changed], removed
+
+    def _load_pages(self, doc_ids):
+        """按ID读取页面，列与预处理的load_data一致"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            frames = []
+            for start in range(0, len(doc_ids), _SQL_BATCH):
+                batch = [int(doc_id) for doc_id in doc_ids[start:start + _SQL_BATCH]]
+                frames.append(pd.read_sql_query(
+                    f"SELECT id, url, title, content, publish_time, source, pagerank, content_hash FROM pages "
+                    f"WHERE id IN ({', '.join('?' * len(batch))}) ORDER BY id",
+                    conn, params=batch
+                ))
+        finally:
+            conn.close()
+        df = pd.concat(frames, ignore_index=True)
+        return df.rename(columns={'id': 'doc_id'})
+
+    def _components(self):
+        """预处理器（清洗、分词、SimHash）及基础索引的TF-IDF向量化器"""
+        if self._preprocessor is None:
+            from preprocess import ChineseDocumentPreprocessor
+            self._preprocessor = ChineseDocumentPreprocessor(self.config_path)
+            with open(os.path.join(self.preprocessed_data_dir, "tfidf_vectorizer.pkl"), 'rb') as f:
+                self._vectorizer = pickle.load(f)
+        return self._preprocessor, self._vectorizer
+
+    def build_segment(self, pages, live_keys=()):
+        """
+        按与全量预处理、建索引相同的步骤把一批页面编码为段
+
+        参数:
+            pages (pd.DataFrame): _load_pages返回的页面，会添加clean_content和content_key列
+            live_keys (array-like): 未删除文档的清洗后内容哈希，与其中之一或同一批中更早的页面内容相同的页面不写入段
+
+        返回:
+            Segment: 新段；所有页面都是重复内容时返回None
+        """
+        preprocessor, vectorizer = self._components()
+        pages['clean_content'] = pages['content'].apply(preprocessor.clean_text)
+        pages['content_key'] = content_keys(pages['clean_content'])
+        duplicated = pages['content_key'].isin(live_keys) | pages.duplicated(subset=['content_key'], keep='first')
+        if duplicated.any():
+            logger.info(f"移除了{int(duplicated.sum())}个重复内容的页面")
+            pages = pages[~duplicated]
+        if pages.empty:
+            return None
+
+        segmented_title = pages['title'].apply(preprocessor.clean_text).apply(preprocessor.segment_text)
+        segmented_content = pages['clean_content'].apply(preprocessor.segment_text)
+        matrix = vectorizer.transform(segmented_title + ' ' + segmented_content)
+
+        source_codes, source_values = encode_column(pages['source'])
+        host_codes, host_values = encode_column(pages['url'].map(extract_host))
+        columns = {
+            "source_codes": source_codes,
+            "publish_epoch": parse_publish_time(pages['publish_time']),
+            "pagerank": pd.to_numeric(pages['pagerank'], errors='coerce').fillna(0).to_numpy(dtype=np.float32),
+            "host_codes": host_codes
+        }
+
+        metadata = pages[['doc_id', 'title', 'source', 'publish_time']].copy()
+        metadata['content_preview'] = pages['content'].apply(
+            lambda x: str(x)[:50] + '...' if isinstance(x, str) and len(str(x)) > 50 else str(x)[:50]
+        )
+        metadata.set_index('doc_id', inplace=True)
+
+        return Segment(pages['doc_id'].to_numpy(dtype=np.int64), matrix, columns,
+                       {"source": source_values, "host": host_values},
+                       simhashes=preprocessor.compute_simhash(segmented_content), metadata=metadata)
+
+    def _delete_documents(self, entries, doc_ids):
+        """
+        在基础索引和给定的段中为doc_ids的所有版本打删除标记
+
+        参数:
+            entries (list): 清单中的段条目
+            doc_ids (np.ndarray): 要删除的原始文档ID
+
+        返回:
+            int: 新打上删除标记的行数
+        """
+        targets = [(BASE_SEGMENT, self._base_doc_ids())] + [
+            (entry["name"], np.load(os.path.join(segments_dir(self.index_dir), entry["name"], "doc_ids.npy")))
+            for entry in entries
+        ]
+        marked = 0
+        for name, segment_doc_ids in targets:
+            hits = np.isin(segment_doc_ids, doc_ids)
+            if not hits.any():
+                continue
+            deleted = read_tombstones(self.index_dir, name, len(segment_doc_ids))
+            new_hits = hits & ~deleted
+            if new_hits.any():
+                write_tombstones(self.index_dir, name, deleted | hits)
+                marked += int(new_hits.sum())
+        return marked
+
+    def add_delta(self):
+        """
+        检测变化的页面：新增和变化的页面写成一个新的增量段，变化和消失的页面的旧版本打删除标记
+
+        返回:
+            dict: 本次增量构建的统计信息
+        """
+        start_time = time.time()
+        os.makedirs(segments_dir(self.index_dir), exist_ok=True)
+
+        changed_ids, removed_ids = self.detect_changes()
+        info = {
+            "changed_documents": int(len(changed_ids)),
+            "removed_documents": int(len(removed_ids)),
+            "duplicate_documents": 0,
+            "deleted_rows": 0,
+            "segment": None
+        }
+        if len(changed_ids) > 0 or len(removed_ids) > 0:
+            pages = self._load_pages(changed_ids) if len(changed_ids) > 0 else None
+            segment = None
+            if pages is not None:
+                # 更新和删除的文档的旧版本不参与去重
+                known_ids, _, known_keys = self._load_state()
+                live_keys = known_keys[~np.isin(known_ids, np.concatenate([changed_ids, removed_ids]))]
+                segment = self.build_segment(pages, live_keys)
+                info["duplicate_documents"] = int(len(pages) - (len(segment) if segment is not None else 0))
+
+            with self._manifest_lock:
+                manifest = read_manifest(self.index_dir)
+                # 更新 = 删除旧版本 + 新段中的新版本；删除标记只打在新段之前的各段中
+                info["deleted_rows"] = self._delete_documents(manifest["segments"],
+                                                              np.concatenate([changed_ids, removed_ids]))
+                if segment is not None:
+                    entry = new_segment_entry(manifest, segment)
+                    segment.save(os.path.join(segments_dir(self.index_dir), entry["name"]))
+                    manifest["segments"].append(entry)
+                    write_manifest(self.index_dir, manifest)
+                    info["segment"] = entry["name"]
+
+                # 记录已处理页面（含因内容重复没有写入段的页面）的哈希，下次只处理在此之后变化的页面
+                known_ids, known_hashes, known_keys = self._load_state()
+                keep = ~np.isin(known_ids, np.concatenate([changed_ids, removed_ids]))
+                new_ids, new_hashes, new_keys = changed_ids, np.array([], dtype='S32'), np.array([], dtype='S32')
+                if pages is not None:
+                    new_ids = pages['doc_id'].to_numpy(dtype=np.int64)
+                    new_hashes = pages['content_hash'].fillna('').to_numpy(dtype='S32')
+                    indexed = np.isin(new_ids, segment.doc_ids if segment is not None else [])
+                    new_keys = np.where(indexed, pages['content_key'].to_numpy(dtype='S32'), b'')
+                self._save_state(np.concatenate([known_ids[keep], new_ids]),
+                                 np.concatenate([known_hashes[keep], new_hashes]),
+                                 np.concatenate([known_keys[keep], new_keys]))
+
+        info["build_time_seconds"] = float(time.time() - start_time)
+        logger.info(f"增量索引完成，{info['changed_documents']}个新增或变化的页面，"
+                    f"{info['removed_documents']}个消失的页面，{info['deleted_rows']}行打了删除标记，耗时: {info['build_time_seconds']:.2f}秒")
+        return info
+
+    def _next_merge(self, manifest):
+        """
+        找出需要合并的段：最低的一层中末尾连续的merge_factor个段
+        （新段总追加在末尾，层数从旧到新不增，同一层的段总是相邻的）
+
+        返回:
+            tuple: (起始下标, 段数)；不需要合并时返回None
+        """
+        entries = manifest["segments"]
+        for level in range(self.max_level):
+            positions = [i for i, entry in enumerate(entries) if entry["level"] == level]
+            if len(positions) >= self.merge_factor:
+                start = positions[-self.merge_factor]
+                if positions[-1] - start + 1 == self.merge_factor:
+                    return start, self.merge_factor
+        return None
+
+    def merge_segments(self):
+        """
+        按分层策略反复合并，直到没有需要合并的层
+
+        返回:
+            int: 完成的合并次数
+        """
+        if not self._merge_lock.acquire(blocking=False):
+            logger.info("已有合并在进行，跳过")
+            return 0
+
+        merges = 0
+        try:
+            vocabulary_size = len(self._components()[1].vocabulary_)
+            while True:
+                with self._manifest_lock:
+                    manifest = read_manifest(self.index_dir)
+                    selected = self._next_merge(manifest)
+                if selected is None:
+                    break
+                start, count = selected
+                entries = manifest["segments"][start:start + count]
+                names = [entry["name"] for entry in entries]
+
+                segments = [Segment.load(os.path.join(segments_dir(self.index_dir), name), vocabulary_size)
+                            for name in names]
+                deleted = np.concatenate([read_tombstones(self.index_dir, name, len(segment))
+                                          for name, segment in zip(names, segments)])
+                # 合并时清除已删除的行
+                merged = Segment.merge(segments, np.split(deleted, np.cumsum([len(s) for s in segments])[:-1]))
+
+                with self._manifest_lock:
+                    manifest = read_manifest(self.index_dir)
+                    position = [entry["name"] for entry in manifest["segments"]].index(names[0])
+                    replacement = []
+                    if len(merged) > 0:
+                        entry = new_segment_entry(manifest, merged, level=entries[0]["level"] + 1)
+                        merged.save(os.path.join(segments_dir(self.index_dir), entry["name"]))
+                        # 合并期间新打的删除标记按文档ID转移到合并后的段
+                        late = np.concatenate([read_tombstones(self.index_dir, name, len(segment))
+                                               for name, segment in zip(names, segments)]) & ~deleted
+                        if late.any():
+                            late_ids = np.concatenate([segment.doc_ids for segment in segments])[late]
+                            write_tombstones(self.index_dir, entry["name"], np.isin(merged.doc_ids, late_ids))
+                        replacement = [entry]
+                    manifest["segments"][position:position + count] = replacement
+                    write_manifest(self.index_dir, manifest)
+
+                # 清单切换后再删除旧段，已经读取旧清单的检索进程下次重新加载即可
+                for name in names:
+                    shutil.rmtree(os.path.join(segments_dir(self.index_dir), name), ignore_errors=True)
+                    if os.path.exists(tombstones_file(self.index_dir, name)):
+                        os.remove(tombstones_file(self.index_dir, name))
+                merges += 1
+                logger.info(f"合并了{count}个第{entries[0]['level']}层的段 -> "
+                            f"{replacement[0]['name'] if replacement else '(全部已删除)'}({len(merged)}篇文档)")
+        finally:
+            self._merge_lock.release()
+        return merges
+
+    def start_background_merge(self):
+        """在后台线程中执行合并"""
+        thread = threading.Thread(target=self.merge_segments, daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, merge=True, background=False):
+        """
+        运行一次增量索引
+
+        参数:
+            merge (bool): 是否在写入新段后按分层策略合并
+            background (bool): 合并是否在后台线程中进行
+        """
+        info = self.add_delta()
+        if merge:
+            if background:
+                self.start_background_merge()
+            else:
+                info["merges"] = self.merge_segments()
+        info["segments"] = read_manifest(self.index_dir)["segments"]
+        return info
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='增量索引')
+    parser.add_argument('--data_dir', type=str, default='data/preprocessed_data', help='预处理数据目录')
+    parser.add_argument('--db_path', type=str, default='data/raw_data/crawler_data.db', help='爬虫数据库路径')
+    parser.add_argument('--merge_factor', type=int, default=4, help='同一层积累多少个段后合并')
+
+    args = parser.parse_args()
+
+    indexer = IncrementalIndexer(
+        preprocessed_data_dir=args.data_dir,
+        db_path=args.db_path,
+        merge_factor=args.merge_factor
+    )
+    print(json.dumps(indexer.run(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
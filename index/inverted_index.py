@@ -1,11 +1,25 @@
 import os
-import pickle
 import numpy as np
 import pandas as pd
 import logging
 import time
 import json
-from collections import defaultdict
+from urllib.parse import urlsplit
+from scipy import sparse
+
+if __name__ == "__main__" and not __package__:
+    # 以脚本方式运行(python index/inverted_index.py)时，把项目根目录加入导入路径并按包内模块解析导入
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "index"
+
+from preprocess.artifacts import load_documents, load_tfidf, load_vocabulary, PREVIEW_COLUMN
+from .postings import (postings_from_matrix, prune_postings, relative_threshold_mask,
+                       top_k_epsilon_mask, evaluate_pruning, save_postings, PostingsView, POSTINGS_FILES,
+                       remove_row_aligned_files)
+from .stamp import touch_build_stamp
+from .codec import (compress_postings, save_compressed_postings, remove_compressed_postings, packed_gap_bytes,
+                    BLOCK_SIZE)
 
 # 设置日志
 logging.basicConfig(
@@ -32,6 +46,136 @@ def convert_numpy_types(obj):
     else:
         return obj
 
+# 缺失发布时间在时间列中的取值
+MISSING_TIME = np.iinfo(np.int64).min
+# 建索引用到的文档列：过滤列、重排序用的url及结果展示用的元数据
+DOCUMENT_COLUMNS = ['doc_id', 'title', 'source', 'publish_time', 'url', 'pagerank', PREVIEW_COLUMN]
+
+# 匹配 2024-03-05 / 2024/3/5 / 2024年03月05日 10:20 等常见发布时间格式
+_PUBLISH_TIME_PATTERN = (
+    r'(?P<year>\d{4})\s*[-/.年]\s*(?P<month>\d{1,2})\s*[-/.月]\s*(?P<day>\d{1,2})'
+    r'(?:\D{0,3}?(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?)?'
+)
+
+
+def parse_publish_time(values):
+    """
+    将发布时间字符串批量解析为int64的Unix时间戳（秒）
+    
+    参数:
+        values (iterable): 发布时间字符串序列
+        
+    返回:
+        np.ndarray: int64时间戳数组，无法解析的条目为MISSING_TIME
+    """
+    series = pd.Series(list(values), dtype=object).astype(str)
+    parts = series.str.extract(_PUBLISH_TIME_PATTERN)
+    parts = parts.apply(pd.to_numeric, errors='coerce')
+    parts[['hour', 'minute', 'second']] = parts[['hour', 'minute', 'second']].fillna(0)
+
+    times = pd.to_datetime(parts[['year', 'month', 'day', 'hour', 'minute', 'second']], errors='coerce')
+    epoch = np.full(len(series), MISSING_TIME, dtype=np.int64)
+    valid = times.notna().to_numpy()
+    epoch[valid] = (times[valid] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    return epoch
+
+
+def extract_host(url):
+    """
+    从URL中提取站点名（小写，去掉端口和开头的www.），无法解析时返回None
+    
+    参数:
+        url (str): 页面URL
+        
+    返回:
+        str: 站点名
+    """
+    if not isinstance(url, str) or not url:
+        return None
+    try:
+        host = urlsplit(url.strip()).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return host[4:] if host.startswith('www.') else host
+
+
+def encode_column(values):
+    """
+    对字符串列进行字典编码
+    
+    参数:
+        values (iterable): 原始取值序列，空值编码为-1
+        
+    返回:
+        tuple: (int32编码数组, 字典取值列表)
+    """
+    series = pd.Series(list(values), dtype=object)
+    series = series.where(series.notna() & (series.astype(str).str.strip() != ''), None)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(np.int32), [str(u) for u in uniques]
+
+
+def build_value_bitmaps(codes, num_values):
+    """
+    为每个取值构建按文档行排列的位图
+    
+    参数:
+        codes (np.ndarray): 与文档行对齐的取值编码，-1表示缺失
+        num_values (int): 取值个数
+        
+    返回:
+        np.ndarray: uint8数组，形状为(num_values, ceil(文档数/8))
+    """
+    num_bytes = (len(codes) + 7) // 8
+    bitmaps = np.zeros((num_values, num_bytes), dtype=np.uint8)
+    for value in range(num_values):
+        bitmaps[value] = np.packbits(codes == value)
+    return bitmaps
+
+
+def char_bigrams(term):
+    """
+    提取词语的字符二元组，首尾加边界标记，单字词也能得到二元组
+    
+    参数:
+        term (str): 词语
+        
+    返回:
+        list: 去重后的字符二元组列表
+    """
+    padded = f"^{term}$"
+    return list(dict.fromkeys(padded[i:i + 2] for i in range(len(padded) - 1)))
+
+
+def build_bigram_index(terms):
+    """
+    构建词汇表的字符二元组倒排索引
+    
+    参数:
+        terms (iterable): 词汇表，下标即词语编号
+        
+    返回:
+        tuple: (二元组列表, (二元组数, 词汇表大小) 的CSR矩阵，第i行是包含第i个二元组的词语)
+    """
+    bigram_ids = {}
+    rows, cols = [], []
+    num_terms = 0
+    for term_id, term in enumerate(terms):
+        for bigram in char_bigrams(term):
+            rows.append(bigram_ids.setdefault(bigram, len(bigram_ids)))
+            cols.append(term_id)
+        num_terms = term_id + 1
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int8), (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))),
+        shape=(len(bigram_ids), num_terms)
+    )
+    matrix.sort_indices()
+    return list(bigram_ids), matrix
+
+
 class InvertedIndexBuilder:
     """
     倒排索引构建器 - 基于预处理后的TF-IDF矩阵构建高效搜索索引
@@ -54,13 +198,22 @@ class InvertedIndexBuilder:
             
         # 存储索引相关数据
         self.processed_data = None
-        self.tfidf_vectorizer = None
+        self.idf = None  # 与词汇表对齐的IDF权重
         self.tfidf_matrix = None
         self.inverted_index = None
+        self.postings = None  # 按词组织的倒排数组(indptr, 文档行号, 权重)
         self.doc_lengths = None
         self.feature_names = None
         self.metadata = None
         self.doc_id_mapping = None  # 添加文档ID映射
+        self.doc_columns = None  # 与文档行对齐的过滤列
+        self.column_dictionaries = None  # 字典编码列的取值表
+        self.facet_bitmaps = None  # 分面取值 -> 文档位图
+        self.simhashes = None  # 文档SimHash指纹
+        self.rerank_features = {}  # 重排用稀疏特征矩阵(词项位置、标题词项)
+        self.spelling_index = None  # 词汇表字符二元组索引及词语文档频率（拼写纠错）
+        self.doc_order = None  # 文档重排后 新行号 -> 预处理时的行号
+        self.reordering = None  # 文档重排的方式及效果
         
         # 用于生成报告的数据收集
         self.report_data = {
@@ -84,31 +237,20 @@ class InvertedIndexBuilder:
     def load_preprocessed_data(self):
         """加载预处理后的数据"""
         try:
-            # 加载处理后的文档数据
-            processed_data_path = os.path.join(self.preprocessed_data_dir, "processed_documents.csv")
-            self.processed_data = pd.read_csv(processed_data_path, encoding='utf-8')
+            # 只加载建索引需要的文档列，长文本只解码内容预览所需的开头部分
+            self.processed_data = load_documents(self.preprocessed_data_dir, DOCUMENT_COLUMNS)
             logger.info(f"成功加载处理后的文档数据，共{len(self.processed_data)}条记录")
             
-            # 加载TF-IDF向量化器
-            vectorizer_path = os.path.join(self.preprocessed_data_dir, "tfidf_vectorizer.pkl")
-            with open(vectorizer_path, 'rb') as f:
-                self.tfidf_vectorizer = pickle.load(f)
-            
-            # 获取特征名称（词汇表）
-            self.feature_names = self.tfidf_vectorizer.get_feature_names_out()
-            logger.info(f"成功加载TF-IDF向量化器，词汇表大小: {len(self.feature_names)}")
+            # 加载词汇表（特征名称）及IDF
+            self.feature_names, self.idf = load_vocabulary(self.preprocessed_data_dir)
+            logger.info(f"成功加载词汇表，词汇表大小: {len(self.feature_names)}")
             
-            # 加载TF-IDF矩阵
-            matrix_path = os.path.join(self.preprocessed_data_dir, "tfidf_matrix.pkl")
-            with open(matrix_path, 'rb') as f:
-                self.tfidf_matrix = pickle.load(f)
+            # 加载TF-IDF矩阵及文档ID映射
+            self.tfidf_matrix, doc_ids = load_tfidf(self.preprocessed_data_dir)
             logger.info(f"成功加载TF-IDF矩阵，维度: {self.tfidf_matrix.shape}")
             
-            # 尝试加载文档ID映射
-            doc_id_mapping_path = os.path.join(self.preprocessed_data_dir, "doc_id_mapping.pkl")
-            if os.path.exists(doc_id_mapping_path):
-                with open(doc_id_mapping_path, 'rb') as f:
-                    self.doc_id_mapping = pickle.load(f)
+            if doc_ids is not None:
+                self.doc_id_mapping = doc_ids.tolist()
                 logger.info(f"成功加载文档ID映射，共{len(self.doc_id_mapping)}个映射")
             else:
                 # 如果没有专门的映射文件，检查处理后的数据是否包含doc_id
@@ -119,11 +261,82 @@ class InvertedIndexBuilder:
                     logger.warning("未找到文档ID映射，将使用行索引作为文档ID")
                     self.doc_id_mapping = None
             
+            # 加载SimHash指纹（可选）
+            simhash_path = os.path.join(self.preprocessed_data_dir, "simhash.npy")
+            if os.path.exists(simhash_path):
+                self.simhashes = np.load(simhash_path)
+                if len(self.simhashes) != self.tfidf_matrix.shape[0]:
+                    logger.warning("SimHash指纹与TF-IDF矩阵行数不一致，已忽略")
+                    self.simhashes = None
+            
+            # 加载重排特征（可选）
+            for name in ("term_positions", "title_terms"):
+                feature_path = os.path.join(self.preprocessed_data_dir, f"{name}.npz")
+                if os.path.exists(feature_path):
+                    feature = sparse.load_npz(feature_path)
+                    if feature.shape == self.tfidf_matrix.shape:
+                        self.rerank_features[name] = feature
+                    else:
+                        logger.warning(f"重排特征{name}与TF-IDF矩阵维度不一致，已忽略")
+            
             return True
         except Exception as e:
             logger.error(f"加载预处理数据失败: {e}")
             return False
     
+    def reorder_documents(self, method='url'):
+        """
+        重排文档行：相似的文档相邻，倒排表中的行号间隔更小、更易压缩，打分时访问的内存也更集中
+        
+        所有与文档行对齐的数据一起重排；doc_id_mapping随之重排，仍是 新行号 -> 原始文档ID，
+        没有ID映射时以预处理时的行号作为文档ID。
+        
+        参数:
+            method (str): 'url' 按站点和URL排列；'cluster' 按TF-IDF向量的粗聚类排列
+        """
+        from .reorder import url_order, cluster_order, REORDER_METHODS
+
+        if self.tfidf_matrix is None:
+            logger.error("TF-IDF矩阵未加载，无法重排文档")
+            return False
+        if method not in REORDER_METHODS:
+            logger.warning(f"未知的文档重排方式: {method}，保持原有顺序")
+            return False
+        if method == 'url' and 'url' not in self.processed_data.columns:
+            logger.warning("文档数据中没有url列，无法按URL重排，保持原有顺序")
+            return False
+
+        try:
+            logger.info(f"重排文档(方式: {method})...")
+            start_time = time.time()
+            self.tfidf_matrix = self.tfidf_matrix.tocsr()
+            order = url_order(self.processed_data['url']) if method == 'url' else cluster_order(self.tfidf_matrix)
+            original_bytes = packed_gap_bytes(*postings_from_matrix(self.tfidf_matrix)[:2])
+
+            if self.doc_id_mapping is None:
+                self.doc_id_mapping = list(range(self.tfidf_matrix.shape[0]))
+            self.doc_id_mapping = np.asarray(self.doc_id_mapping, dtype=np.int64)[order].tolist()
+            self.tfidf_matrix = self.tfidf_matrix[order]
+            self.processed_data = self.processed_data.iloc[order].reset_index(drop=True)
+            if self.simhashes is not None:
+                self.simhashes = self.simhashes[order]
+            for name, feature in self.rerank_features.items():
+                self.rerank_features[name] = feature.tocsr()[order]
+            self.doc_order = order
+
+            reordered_bytes = packed_gap_bytes(*postings_from_matrix(self.tfidf_matrix)[:2])
+            self.reordering = {
+                "method": method,
+                "packed_gap_bytes": {"original": original_bytes, "reordered": reordered_bytes},
+                "duration_seconds": float(time.time() - start_time)
+            }
+            logger.info(f"文档重排完成，位打包后的行号间隔: {original_bytes} -> {reordered_bytes}字节")
+            return True
+
+        except Exception as e:
+            logger.error(f"重排文档失败: {e}")
+            return False
+
     def compute_document_lengths(self):
         """计算文档向量的长度（用于余弦相似度计算）"""
         try:
@@ -148,31 +361,18 @@ class InvertedIndexBuilder:
         try:
             logger.info("开始构建倒排索引...")
             
-            # 初始化倒排索引字典
-            self.inverted_index = defaultdict(list)
-            
-            # 获取TF-IDF矩阵的非零元素
-            cx = self.tfidf_matrix.tocoo()
-            
-            # 遍历所有非零元素
-            for i, j, v in zip(cx.row, cx.col, cx.data):
-                # i: 矩阵行索引, j: 特征(词)的索引, v: TF-IDF值
-                if v > 0:  # 只记录TF-IDF值大于0的条目
-                    term = self.feature_names[j]
-                    
-                    # 使用原始文档ID而不是矩阵行索引
-                    if self.doc_id_mapping is not None:
-                        doc_id = int(self.doc_id_mapping[i])  # 获取原始文档ID
-                    else:
-                        doc_id = int(i)  # 如果没有映射，则使用矩阵行索引
-                    
-                    weight = float(v)  # 确保是Python原生float类型
-                    
-                    # 将(文档ID, 权重)对添加到该词的倒排列表中
-                    self.inverted_index[term].append((doc_id, weight))
+            # 一次性转换为CSC，按词切片即得到各词条的倒排表，不再逐个非零元素循环
+            self.postings = postings_from_matrix(self.tfidf_matrix)
+            
+            # 使用原始文档ID而不是矩阵行索引；如果没有映射，则使用矩阵行索引
+            if self.doc_id_mapping is not None:
+                doc_ids = np.asarray(self.doc_id_mapping, dtype=np.int64)
+            else:
+                doc_ids = np.arange(self.tfidf_matrix.shape[0], dtype=np.int64)
+            self.inverted_index = PostingsView(self.feature_names, *self.postings, doc_ids)
             
             # 统计索引大小
-            total_entries = sum(len(postings) for postings in self.inverted_index.values())
+            total_entries = self.inverted_index.total_entries
             
             logger.info(f"倒排索引构建完成，包含{len(self.inverted_index)}个词条，{total_entries}个索引条目")
             
@@ -185,6 +385,8 @@ class InvertedIndexBuilder:
                 "average_postings_per_term": float(total_entries / max(1, len(self.inverted_index))),
                 "uses_original_doc_ids": self.doc_id_mapping is not None  # 记录是否使用了原始文档ID
             }
+            if self.reordering is not None:
+                self.metadata["doc_reordering"] = self.reordering
             
             return True
             
@@ -192,92 +394,141 @@ class InvertedIndexBuilder:
             logger.error(f"构建倒排索引失败: {e}")
             return False
     
-    def optimize_index(self, min_tfidf=0.01):
+    def build_doc_columns(self):
+        """构建与文档行对齐的过滤列：字典编码的来源与站点、int64时间戳形式的发布时间"""
+        if self.processed_data is None:
+            logger.error("文档数据未加载，无法构建过滤列")
+            return False
+
+        try:
+            logger.info("构建文档过滤列...")
+            num_docs = len(self.processed_data)
+
+            if 'source' in self.processed_data.columns:
+                source_codes, source_values = encode_column(self.processed_data['source'])
+            else:
+                source_codes, source_values = np.full(num_docs, -1, dtype=np.int32), []
+
+            if 'publish_time' in self.processed_data.columns:
+                publish_epoch = parse_publish_time(self.processed_data['publish_time'])
+            else:
+                publish_epoch = np.full(num_docs, MISSING_TIME, dtype=np.int64)
+
+            self.doc_columns = {
+                "source_codes": source_codes,
+                "publish_epoch": publish_epoch
+            }
+            if 'pagerank' in self.processed_data.columns:
+                self.doc_columns["pagerank"] = pd.to_numeric(
+                    self.processed_data['pagerank'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+            self.column_dictionaries = {"source": source_values}
+            if 'url' in self.processed_data.columns:
+                host_codes, host_values = encode_column(self.processed_data['url'].map(extract_host))
+                self.doc_columns["host_codes"] = host_codes
+                self.column_dictionaries["host"] = host_values
+
+            logger.info(f"过滤列构建完成，来源取值{len(source_values)}个，"
+                        f"可解析发布时间的文档{int((publish_epoch != MISSING_TIME).sum())}个")
+            return True
+
+        except Exception as e:
+            logger.error(f"构建过滤列失败: {e}")
+            return False
+
+    def build_facet_bitmaps(self):
+        """基于过滤列构建分面位图：每个来源、每个发布月份各对应一个文档位图"""
+        if self.doc_columns is None:
+            logger.error("过滤列尚未构建，无法构建分面位图")
+            return False
+
+        try:
+            logger.info("构建分面位图...")
+            source_values = self.column_dictionaries["source"]
+
+            # 发布月份按 YYYY-MM 编码，缺失时间编码为-1
+            publish_epoch = self.doc_columns["publish_epoch"]
+            valid = publish_epoch != MISSING_TIME
+            months = np.full(len(publish_epoch), None, dtype=object)
+            months[valid] = pd.to_datetime(publish_epoch[valid], unit='s').strftime('%Y-%m')
+            month_codes, month_values = encode_column(months)
+
+            self.facet_bitmaps = {
+                "source": (build_value_bitmaps(self.doc_columns["source_codes"], len(source_values)), source_values),
+                "month": (build_value_bitmaps(month_codes, len(month_values)), month_values)
+            }
+
+            logger.info(f"分面位图构建完成，来源{len(source_values)}个，月份{len(month_values)}个")
+            return True
+
+        except Exception as e:
+            logger.error(f"构建分面位图失败: {e}")
+            return False
+
+    def build_spelling_index(self):
+        """构建词汇表的字符二元组索引，并统计每个词语的文档频率，供检索时给出拼写建议"""
+        if self.feature_names is None or self.tfidf_matrix is None:
+            logger.error("词汇表或TF-IDF矩阵尚未加载，无法构建拼写纠错索引")
+            return False
+
+        try:
+            logger.info("构建拼写纠错索引...")
+            bigrams, matrix = build_bigram_index(self.feature_names)
+            term_df = np.diff(self.tfidf_matrix.tocsc().indptr).astype(np.int32)
+            self.spelling_index = (bigrams, matrix, term_df)
+            logger.info(f"拼写纠错索引构建完成，{len(bigrams)}个字符二元组")
+            return True
+
+        except Exception as e:
+            logger.error(f"构建拼写纠错索引失败: {e}")
+            return False
+
+    def optimize_index(self, min_tfidf=0.01, pruning=None, relative_threshold=0.1, prune_top_k=10, epsilon=0.7):
         """
         优化倒排索引，去除低权重条目
         
         参数:
             min_tfidf (float): 最小TF-IDF阈值，低于此值的条目会被移除
+            pruning (str, optional): 在全局阈值之外按词条剪枝：
+                'relative' 保留权重不低于该词最大权重relative_threshold倍的条目；
+                'top_k' 保留权重不低于该词第prune_top_k大权重epsilon倍的条目
+            relative_threshold (float): relative模式的相对阈值
+            prune_top_k (int): top_k模式保证保留的每词条目数
+            epsilon (float): top_k模式的剪枝系数，越小保留越多
         """
         if self.inverted_index is None:
             logger.error("倒排索引尚未构建，无法优化")
             return False
         
         try:
-            logger.info(f"开始优化倒排索引(最小TF-IDF阈值: {min_tfidf})...")
+            logger.info(f"开始优化倒排索引(最小TF-IDF阈值: {min_tfidf}，按词条剪枝: {pruning or '无'})...")
             
             # 将min_tfidf确保为浮点数
             min_tfidf = float(min_tfidf)
             
             # 记录优化前的统计信息
-            original_terms = len(self.inverted_index)
-            original_entries = sum(len(postings) for postings in self.inverted_index.values())
-            
-            # 优化索引
-            optimized_index = defaultdict(list)
-            error_count = 0
-            
-            # 调试打印一些倒排表数据，看看实际存储的是什么
-            term_sample = next(iter(self.inverted_index.keys())) if self.inverted_index else None
-            if term_sample:
-                postings_sample = self.inverted_index[term_sample][:3] if self.inverted_index[term_sample] else []
-                logger.info(f"样本词条 '{term_sample}' 的倒排表(前3项): {postings_sample}")
-                if postings_sample:
-                    logger.info(f"样本权重类型: {type(postings_sample[0][1])}")
-            
-            for term, postings in self.inverted_index.items():
-                # 保留权重大于阈值的条目
-                filtered_postings = []
-                
-                for posting in postings:
-                    try:
-                        # 确保posting是元组，并且有两个元素
-                        if not isinstance(posting, (list, tuple)) or len(posting) != 2:
-                            logger.warning(f"倒排表项结构异常: {posting}")
-                            continue
-                        
-                        doc_id, weight = posting
-                        
-                        # 检查权重类型，进行适当的比较
-                        if isinstance(weight, (int, float)):
-                            # 直接使用数值比较
-                            if float(weight) >= min_tfidf:
-                                filtered_postings.append((int(doc_id), float(weight)))
-                        elif isinstance(weight, str):
-                            # 尝试将字符串转换为浮点数再比较
-                            weight_float = float(weight)
-                            if weight_float >= min_tfidf:
-                                filtered_postings.append((int(doc_id), weight_float))
-                        else:
-                            # 对于其他类型，记录错误并尝试强制转换
-                            logger.warning(f"未知权重类型: {type(weight)}, 值: {weight}")
-                            weight_float = float(str(weight))
-                            if weight_float >= min_tfidf:
-                                filtered_postings.append((int(doc_id), weight_float))
-                    
-                    except (ValueError, TypeError) as e:
-                        error_count += 1
-                        if error_count <= 10:
-                            logger.warning(f"处理倒排表项出错: {e}, 词条={term}, 倒排表项={posting}")
-                        elif error_count == 11:
-                            logger.warning("出现过多错误，后续错误将不再单独记录")
-                
-                # 如果该词仍有文档与之关联，则保留在索引中
-                if filtered_postings:
-                    optimized_index[term] = filtered_postings
-            
-            # 更新索引
-            self.inverted_index = optimized_index
+            indptr, rows, weights = self.postings
+            original_terms = int(np.count_nonzero(np.diff(indptr)))
+            original_entries = int(indptr[-1])
+            
+            # 保留权重不低于阈值的条目，倒排表被删空的词条随之从索引中移除
+            keep = weights >= min_tfidf
+            if pruning == 'relative':
+                keep &= relative_threshold_mask(indptr, weights, relative_threshold)
+            elif pruning == 'top_k':
+                keep &= top_k_epsilon_mask(indptr, weights, prune_top_k, epsilon)
+            elif pruning is not None:
+                logger.warning(f"未知的剪枝模式: {pruning}，只使用全局阈值")
+                pruning = None
+            original_postings = self.postings
+            self.postings = prune_postings(indptr, rows, weights, keep)
+            self.inverted_index = PostingsView(self.feature_names, *self.postings, self.inverted_index.doc_ids)
             
             # 更新统计信息 (确保使用原生Python类型)
             remaining_terms = len(self.inverted_index)
-            remaining_entries = sum(len(postings) for postings in self.inverted_index.values())
+            remaining_entries = self.inverted_index.total_entries
             reduction_terms = original_terms - remaining_terms
             reduction_entries = original_entries - remaining_entries
             
-            if error_count > 0:
-                logger.warning(f"优化过程中共处理了{error_count}个异常倒排表项")
-            
             logger.info(f"索引优化完成")
             logger.info(f"优化前: {original_terms}个词条，{original_entries}个索引条目")
             logger.info(f"优化后: {remaining_terms}个词条，{remaining_entries}个索引条目")
@@ -295,6 +546,18 @@ class InvertedIndexBuilder:
                 "terms": float(reduction_terms/max(1,original_terms)*100),
                 "entries": float(reduction_entries/max(1,original_entries)*100)
             }
+            self.metadata["pruning"] = {"mode": pruning or "global"}
+            if pruning == 'relative':
+                self.metadata["pruning"]["relative_threshold"] = float(relative_threshold)
+            elif pruning == 'top_k':
+                self.metadata["pruning"].update({"top_k": int(prune_top_k), "epsilon": float(epsilon)})
+            
+            # 用抽样查询估计剪枝前后的体积/质量取舍
+            tradeoff = evaluate_pruning(original_postings, self.postings, len(self.inverted_index.doc_ids))
+            self.metadata["pruning"]["tradeoff"] = tradeoff
+            logger.info(f"剪枝后索引体积: {tradeoff['size_bytes']['pruned']}/{tradeoff['size_bytes']['original']}字节，"
+                        f"权重保留{tradeoff['weight_mass_retained']*100:.2f}%，"
+                        f"抽样查询top10重合率{tradeoff['mean_top10_overlap']*100:.2f}%")
             
             return True
             
@@ -303,8 +566,18 @@ class InvertedIndexBuilder:
             import traceback
             logger.error(traceback.format_exc())
             return False
-    def save_inverted_index(self):
-        """保存倒排索引和相关数据"""
+    def save_inverted_index(self, compress=False, export_json=False):
+        """
+        保存倒排索引和相关数据
+        
+        二进制倒排数组(或压缩倒排)是主要输出；逐条转换为Python对象再序列化的JSON倒排表
+        体积大、耗时长，只在export_json时额外导出，供调试或外部工具查看。
+        
+        参数:
+            compress (bool): 是否以压缩倒排(分块位打包的行号间隔+8位量化权重)代替原始的二进制倒排数组；
+                             体积约为原来的1/5，但打分时需要解码，查询变慢（见CompressedPostings）
+            export_json (bool): 是否额外导出inverted_index.json
+        """
         if self.inverted_index is None:
             logger.error("倒排索引尚未构建，无法保存")
             return False
@@ -312,13 +585,35 @@ class InvertedIndexBuilder:
         try:
             logger.info("开始保存倒排索引...")
             
-            # 转换defaultdict为普通dict以便序列化，并转换NumPy类型
-            index_dict = convert_numpy_types(dict(self.inverted_index))
-            
-            # 保存倒排索引
+            # 导出JSON倒排表（可选），不导出时删除旧文件，避免与二进制倒排不一致
             index_file = os.path.join(self.output_dir, "inverted_index.json")
-            with open(index_file, 'w', encoding='utf-8') as f:
-                json.dump(index_dict, f, ensure_ascii=False)
+            if export_json:
+                with open(index_file, 'w', encoding='utf-8') as f:
+                    json.dump(dict(self.inverted_index), f, ensure_ascii=False)
+            elif os.path.exists(index_file):
+                os.remove(index_file)
+            
+            # 保存可内存映射的二进制倒排数组（检索时优先加载），两种格式只保留一种
+            if compress:
+                self.save_compressed_postings()
+                for file_name in POSTINGS_FILES:
+                    if os.path.exists(os.path.join(self.output_dir, file_name)):
+                        os.remove(os.path.join(self.output_dir, file_name))
+            else:
+                save_postings(self.output_dir, *self.postings)
+                remove_compressed_postings(self.output_dir)
+                self.metadata.pop("compression", None)
+            
+            # 基础索引已包含预处理时的全部文档，旧的增量段不再适用
+            from .segments import reset_segments
+            reset_segments(self.output_dir)
+            
+            # 与文档行对齐的文件只写出本次构建有的，先删除上一次构建留下的
+            remove_row_aligned_files(self.output_dir)
+            
+            # 保存文档重排的行号对应关系（新行号 -> 预处理时的行号）
+            if self.doc_order is not None:
+                np.save(os.path.join(self.output_dir, "doc_order.npy"), self.doc_order)
             
             # 保存文档长度数组
             if self.doc_lengths is not None:
@@ -332,13 +627,9 @@ class InvertedIndexBuilder:
                 meta_columns = ['doc_id', 'title', 'source', 'publish_time']
                 meta_columns = [col for col in meta_columns if col in self.processed_data.columns]
                 
-                # 添加内容预览列
-                if 'content' in self.processed_data.columns:
-                    # 创建一个内容预览列，提取前50个字符
-                    self.processed_data['content_preview'] = self.processed_data['content'].apply(
-                        lambda x: str(x)[:50] + '...' if isinstance(x, str) and len(str(x)) > 50 else str(x)[:50]
-                    )
-                    meta_columns.append('content_preview')
+                # 添加内容预览列（加载文档时已由content列的前50个字生成）
+                if PREVIEW_COLUMN in self.processed_data.columns:
+                    meta_columns.append(PREVIEW_COLUMN)
                 
                 # 保存文档元数据，使用doc_id作为索引
                 if 'doc_id' in self.processed_data.columns:
@@ -350,6 +641,39 @@ class InvertedIndexBuilder:
                     # 如果没有doc_id列，则使用默认索引
                     self.processed_data[meta_columns].to_csv(doc_meta_file, index=True, encoding='utf-8')
             
+            # 保存与文档行对齐的过滤列
+            if self.doc_columns is not None:
+                np.savez(os.path.join(self.output_dir, "doc_columns.npz"), **self.doc_columns)
+                with open(os.path.join(self.output_dir, "doc_columns_dict.json"), 'w', encoding='utf-8') as f:
+                    json.dump(self.column_dictionaries, f, ensure_ascii=False)
+            
+            # 保存完整的TF-IDF文档向量及重排特征（供二阶段重排使用）
+            if self.tfidf_matrix is not None:
+                sparse.save_npz(os.path.join(self.output_dir, "doc_vectors.npz"),
+                                self.tfidf_matrix.tocsr().astype(np.float32))
+            for name, feature in self.rerank_features.items():
+                sparse.save_npz(os.path.join(self.output_dir, f"{name}.npz"), feature)
+            
+            # 保存SimHash指纹
+            if self.simhashes is not None:
+                np.save(os.path.join(self.output_dir, "simhash.npy"), self.simhashes)
+            
+            # 保存分面位图及其取值
+            if self.facet_bitmaps is not None:
+                np.savez(os.path.join(self.output_dir, "facet_bitmaps.npz"),
+                         **{facet: bitmaps for facet, (bitmaps, _) in self.facet_bitmaps.items()})
+                with open(os.path.join(self.output_dir, "facet_values.json"), 'w', encoding='utf-8') as f:
+                    json.dump({facet: values for facet, (_, values) in self.facet_bitmaps.items()}, f, ensure_ascii=False)
+            
+            # 保存拼写纠错索引
+            if self.spelling_index is not None:
+                bigrams, matrix, term_df = self.spelling_index
+                with open(os.path.join(self.output_dir, "spelling_bigrams.txt"), 'w', encoding='utf-8') as f:
+                    for bigram in bigrams:
+                        f.write(f"{bigram}\n")
+                sparse.save_npz(os.path.join(self.output_dir, "spelling_index.npz"), matrix)
+                np.save(os.path.join(self.output_dir, "term_df.npy"), term_df)
+            
             # 如果存在文档ID映射，保存它
             if self.doc_id_mapping is not None:
                 doc_id_map_file = os.path.join(self.output_dir, "doc_id_mapping.json")
@@ -368,6 +692,11 @@ class InvertedIndexBuilder:
                 for term in self.feature_names:
                     f.write(f"{term}\n")
             
+            # 保存与词汇表对齐的IDF权重，检索时据此将查询编码为TF-IDF向量
+            if self.idf is not None:
+                np.save(os.path.join(self.output_dir, "idf.npy"), np.asarray(self.idf, dtype=np.float32))
+            
+            touch_build_stamp(self.output_dir)
             logger.info(f"倒排索引及相关数据保存完成")
             logger.info(f"数据已保存到: {self.output_dir}")
             
@@ -378,6 +707,26 @@ class InvertedIndexBuilder:
             logger.error(traceback.format_exc())
             return False
     
+    def save_compressed_postings(self):
+        """压缩并保存倒排数组，压缩率和量化误差记录在元数据中"""
+        indptr, rows, weights = self.postings
+        arrays = compress_postings(indptr, rows, weights)
+        compressed_bytes = save_compressed_postings(self.output_dir, arrays)
+        raw_bytes = int(indptr.nbytes + rows.nbytes + weights.nbytes)
+
+        dequantized = arrays["impacts"] * np.repeat(arrays["block_max"] / np.float32(255),
+                                                    np.diff(arrays["block_entries"]))
+        self.metadata["compression"] = {
+            "block_size": BLOCK_SIZE,
+            "raw_bytes": raw_bytes,
+            "compressed_bytes": compressed_bytes,
+            "compression_ratio": float(raw_bytes / max(1, compressed_bytes)),
+            "max_weight_error": float(np.abs(dequantized - weights).max()) if len(weights) else 0.0
+        }
+        logger.info(f"倒排压缩完成: {raw_bytes} -> {compressed_bytes}字节"
+                    f"({self.metadata['compression']['compression_ratio']:.2f}倍)，"
+                    f"最大量化误差{self.metadata['compression']['max_weight_error']:.4f}")
+
     def generate_report(self):
         """生成索引构建结果报告"""
         logger.info("正在生成索引构建结果报告...")
@@ -394,7 +743,7 @@ class InvertedIndexBuilder:
         
         # 索引统计信息
         if self.inverted_index is not None:
-            total_entries = sum(len(postings) for postings in self.inverted_index.values())
+            total_entries = self.inverted_index.total_entries
             
             self.report_data["index_statistics"] = {
                 "total_terms": len(self.inverted_index),
@@ -411,8 +760,11 @@ class InvertedIndexBuilder:
                     "optimized_terms": self.metadata["optimized_terms"],
                     "original_entries": self.metadata["original_entries"],
                     "optimized_entries": self.metadata["optimized_entries"],
-                    "reduction_percentage": self.metadata["reduction_percentage"]
+                    "reduction_percentage": self.metadata["reduction_percentage"],
+                    "pruning": self.metadata.get("pruning")
                 }
+            if self.metadata and 'compression' in self.metadata:
+                self.report_data["index_statistics"]["compression"] = self.metadata["compression"]
         
         # 性能指标
         self.report_data["performance_metrics"] = {
@@ -450,13 +802,19 @@ class InvertedIndexBuilder:
             logger.error(f"保存索引构建结果报告失败: {e}")
             return False
     
-    def run_pipeline(self, optimize=True, min_tfidf=0.01):
+    def run_pipeline(self, optimize=True, min_tfidf=0.01, pruning=None, compress=False, reorder=None,
+                     export_json=False, **pruning_params):
         """
         运行完整的倒排索引构建流程
         
         参数:
             optimize (bool): 是否优化索引
             min_tfidf (float): 优化时使用的最小TF-IDF阈值
+            pruning (str, optional): 按词条剪枝模式，'relative'或'top_k'
+            compress (bool): 是否保存为压缩倒排（体积更小，查询更慢）
+            reorder (str, optional): 写出倒排前重排文档，'url'或'cluster'
+            export_json (bool): 是否额外导出JSON格式的倒排表
+            **pruning_params: 剪枝参数(relative_threshold、prune_top_k、epsilon)，见optimize_index
         """
         logger.info("开始倒排索引构建流程...")
         start_time = time.time()
@@ -466,23 +824,32 @@ class InvertedIndexBuilder:
             logger.error("加载预处理数据失败，流程终止")
             return False
         
+        # 重排文档（可选）
+        if reorder:
+            self.reorder_documents(method=reorder)
+        
         # 2. 计算文档向量长度
         self.compute_document_lengths()
         
-        # 3. 构建倒排索引
+        # 3. 构建文档过滤列、分面位图及拼写纠错索引
+        if self.build_doc_columns():
+            self.build_facet_bitmaps()
+        self.build_spelling_index()
+        
+        # 4. 构建倒排索引
         if not self.build_inverted_index():
             logger.error("构建倒排索引失败，流程终止")
             return False
         
-        # 4. 优化索引（可选）
+        # 5. 优化索引（可选）
         if optimize:
-            self.optimize_index(min_tfidf=min_tfidf)
+            self.optimize_index(min_tfidf=min_tfidf, pruning=pruning, **pruning_params)
         
-        # 5. 保存索引
-        if not self.save_inverted_index():
+        # 6. 保存索引
+        if not self.save_inverted_index(compress=compress, export_json=export_json):
             logger.error("保存倒排索引失败")
             return False
-        # 6. 生成报告
+        # 7. 生成报告
         self.generate_report()
         
         total_time = time.time() - start_time
@@ -500,6 +867,13 @@ def main():
     parser.add_argument('--output_dir', type=str, help='输出目录(可选)')
     parser.add_argument('--optimize', action='store_true', help='是否优化索引')
     parser.add_argument('--min_tfidf', type=float, default=0.01, help='最小TF-IDF阈值')
+    parser.add_argument('--pruning', type=str, choices=['relative', 'top_k'], help='按词条剪枝模式(可选)')
+    parser.add_argument('--relative_threshold', type=float, default=0.1, help='relative模式的相对阈值')
+    parser.add_argument('--prune_top_k', type=int, default=10, help='top_k模式每词保证保留的条目数')
+    parser.add_argument('--epsilon', type=float, default=0.7, help='top_k模式的剪枝系数')
+    parser.add_argument('--compress', action='store_true', help='保存为压缩倒排(体积更小，查询更慢)')
+    parser.add_argument('--reorder', type=str, choices=['url', 'cluster'], help='写出倒排前重排文档(可选)')
+    parser.add_argument('--export_json', action='store_true', help='额外导出JSON格式的倒排表')
     
     args = parser.parse_args()
     
@@ -511,7 +885,14 @@ def main():
     
     result = builder.run_pipeline(
         optimize=args.optimize,
-        min_tfidf=args.min_tfidf
+        min_tfidf=args.min_tfidf,
+        pruning=args.pruning,
+        compress=args.compress,
+        reorder=args.reorder,
+        export_json=args.export_json,
+        relative_threshold=args.relative_threshold,
+        prune_top_k=args.prune_top_k,
+        epsilon=args.epsilon
     )
     
     return 0 if result else 1
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import logging
+import numpy as np
+
+from preprocess.artifacts import load_tfidf
+from .stamp import touch_build_stamp
+
+logger = logging.getLogger(__name__)
+
+
+class NeighborTableBuilder:
+    """
+    相似文档表构建器 - 离线计算每篇文档在TF-IDF空间中余弦相似度最高的k篇文档
+    
+    TF-IDF向量已做L2归一化，余弦相似度即行向量点积。按行分块计算
+    块×全量 的稀疏矩阵乘积，每块的稠密得分矩阵大小受内存上限约束。
+    """
+
+    def __init__(self, preprocessed_data_dir, output_dir=None, top_k=10, max_block_memory_mb=256):
+        """
+        参数:
+            preprocessed_data_dir (str): 预处理数据目录，包含TF-IDF矩阵和文档ID映射
+            output_dir (str, optional): 输出目录，默认为preprocessed_data_dir下的inverted_index子目录
+            top_k (int): 每篇文档保留的相似文档数
+            max_block_memory_mb (int): 单个分块稠密得分矩阵的内存上限(MB)
+        """
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.output_dir = output_dir if output_dir else os.path.join(preprocessed_data_dir, "inverted_index")
+        self.top_k = top_k
+        self.max_block_memory_mb = max_block_memory_mb
+
+        self.tfidf_matrix = None
+        self.doc_ids = None
+
+    def load_data(self):
+        """加载TF-IDF矩阵及文档ID映射"""
+        try:
+            self.tfidf_matrix, doc_ids = load_tfidf(self.preprocessed_data_dir)
+            self.tfidf_matrix = self.tfidf_matrix.astype(np.float32)
+            self.doc_ids = np.asarray(doc_ids, dtype=np.int64) if doc_ids is not None else \
+                np.arange(self.tfidf_matrix.shape[0], dtype=np.int64)
+
+            logger.info(f"成功加载TF-IDF矩阵，维度: {self.tfidf_matrix.shape}")
+            return True
+        except Exception as e:
+            logger.error(f"加载TF-IDF矩阵失败: {e}")
+            return False
+
+    def compute_neighbors(self):
+        """
+        分块计算相似文档表
+        
+        返回:
+            tuple: (相似文档ID矩阵, 相似度矩阵)，形状均为(文档数, top_k)，不足处ID为-1
+        """
+        num_docs = self.tfidf_matrix.shape[0]
+        k = min(self.top_k, max(num_docs - 1, 0))
+        block_size = max(1, int(self.max_block_memory_mb * 1024 * 1024 // (4 * max(num_docs, 1))))
+
+        neighbor_ids = np.full((num_docs, self.top_k), -1, dtype=np.int64)
+        neighbor_scores = np.zeros((num_docs, self.top_k), dtype=np.float32)
+        if k == 0:
+            return neighbor_ids, neighbor_scores
+
+        matrix_t = self.tfidf_matrix.T.tocsc()
+        for start in range(0, num_docs, block_size):
+            end = min(start + block_size, num_docs)
+            block_rows = np.arange(end - start)
+
+            scores = (self.tfidf_matrix[start:end] @ matrix_t).toarray()
+            scores[block_rows, block_rows + start] = -np.inf  # 排除文档自身
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = scores[block_rows[:, None], top]
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            # 相似度为0的不算相似文档
+            valid = top_scores > 0
+            neighbor_ids[start:end, :k] = np.where(valid, self.doc_ids[top], -1)
+            neighbor_scores[start:end, :k] = np.where(valid, top_scores, 0)
+
+            logger.info(f"已完成 {end}/{num_docs} 篇文档的相似文档计算")
+
+        return neighbor_ids, neighbor_scores
+
+    def run(self):
+        """运行完整的相似文档表构建流程"""
+        logger.info("开始构建相似文档表...")
+        start_time = time.time()
+
+        if not self.load_data():
+            logger.error("加载数据失败，流程终止")
+            return False
+
+        try:
+            neighbor_ids, neighbor_scores = self.compute_neighbors()
+
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir)
+            np.savez(
+                os.path.join(self.output_dir, "neighbors.npz"),
+                doc_ids=self.doc_ids,
+                neighbor_ids=neighbor_ids,
+                neighbor_scores=neighbor_scores
+            )
+
+            info = {
+                "created_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "total_documents": int(len(self.doc_ids)),
+                "top_k": int(self.top_k),
+                "build_time_seconds": float(time.time() - start_time)
+            }
+            with open(os.path.join(self.output_dir, "neighbors_info.json"), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            touch_build_stamp(self.output_dir)
+
+            logger.info(f"相似文档表构建完成，总耗时: {time.time() - start_time:.2f}秒")
+            return True
+        except Exception as e:
+            logger.error(f"构建相似文档表失败: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='构建相似文档表')
+    parser.add_argument('--data_dir', type=str, required=True, help='预处理数据目录')
+    parser.add_argument('--output_dir', type=str, help='输出目录(可选)')
+    parser.add_argument('--top_k', type=int, default=10, help='每篇文档保留的相似文档数')
+    parser.add_argument('--max_block_memory_mb', type=int, default=256, help='单个分块的内存上限(MB)')
+
+    args = parser.parse_args()
+
+    builder = NeighborTableBuilder(
+        preprocessed_data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        top_k=args.top_k,
+        max_block_memory_mb=args.max_block_memory_mb
+    )
+    return 0 if builder.run() else 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import pickle
+import json
+import time
+import shutil
+import logging
+import numpy as np
+from scipy import sparse
+
+from .stamp import touch_build_stamp
+
+logger = logging.getLogger(__name__)
+
+
+class PassageIndexBuilder:
+    """
+    段落索引构建器 - 用文档级TF-IDF的词汇表和IDF对预处理切分出的段落向量化，
+    构建段落级倒排索引，供RAG按查询取回少量相关段落而不是整篇文档
+
+    输出目录(默认inverted_index/passages)包含:
+        postings.npz         (词汇表大小, 段落数) 的CSR矩阵，每行是一个词的段落倒排列表
+        passages.npz         chunk_ids、doc_ids、ordinals，与postings的列逐一对应
+        passage_offsets.npy  段落原文在passage_text.bin中的起止字节位置
+        passage_text.bin     段落原文，检索时以内存映射方式按需读取
+    """
+
+    def __init__(self, preprocessed_data_dir, output_dir=None):
+        """
+        参数:
+            preprocessed_data_dir (str): 预处理数据目录，包含passages/和tfidf_vectorizer.pkl
+            output_dir (str, optional): 输出目录，默认为preprocessed_data_dir/inverted_index/passages
+        """
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.passage_dir = os.path.join(preprocessed_data_dir, "passages")
+        self.output_dir = output_dir if output_dir else os.path.join(preprocessed_data_dir, "inverted_index", "passages")
+
+        self.tfidf_vectorizer = None
+        self.passage_tokens = None
+
+    def load_data(self):
+        """加载TF-IDF向量化器及段落分词结果"""
+        try:
+            with open(os.path.join(self.preprocessed_data_dir, "tfidf_vectorizer.pkl"), 'rb') as f:
+                self.tfidf_vectorizer = pickle.load(f)
+
+            with open(os.path.join(self.passage_dir, "passage_tokens.txt"), 'r', encoding='utf-8') as f:
+                self.passage_tokens = [line.rstrip('\n') for line in f]
+
+            logger.info(f"成功加载{len(self.passage_tokens)}个段落")
+            return True
+        except Exception as e:
+            logger.error(f"加载段落数据失败: {e}")
+            return False
+
+    def run(self):
+        """运行完整的段落索引构建流程"""
+        logger.info("开始构建段落索引...")
+        start_time = time.time()
+
+        if not self.load_data():
+            logger.error("加载数据失败，流程终止")
+            return False
+
+        try:
+            # 1. 段落向量化（与文档、查询共用同一词汇表和IDF）
+            passage_vectors = self.tfidf_vectorizer.transform(self.passage_tokens).astype(np.float32)
+
+            # 2. 转置为按词组织的倒排列表
+            postings = passage_vectors.T.tocsr()
+            postings.eliminate_zeros()
+            postings.sort_indices()
+            logger.info(f"段落倒排索引构建完成，{postings.shape[1]}个段落，{postings.nnz}个倒排项")
+
+            # 3. 保存
+            if not os.path.exists(self.output_dir):
+                os.makedirs(self.output_dir)
+            sparse.save_npz(os.path.join(self.output_dir, "postings.npz"), postings)
+            for name in ("passages.npz", "passage_offsets.npy", "passage_text.bin"):
+                shutil.copyfile(os.path.join(self.passage_dir, name), os.path.join(self.output_dir, name))
+
+            offsets = np.load(os.path.join(self.output_dir, "passage_offsets.npy"))
+            passages = np.load(os.path.join(self.output_dir, "passages.npz"))
+            info = {
+                "created_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "total_passages": int(postings.shape[1]),
+                "total_documents": int(len(np.unique(passages['doc_ids']))),
+                "total_postings": int(postings.nnz),
+                "mean_passage_bytes": float(np.diff(offsets).mean()) if len(offsets) > 1 else 0.0,
+                "build_time_seconds": float(time.time() - start_time)
+            }
+            with open(os.path.join(self.output_dir, "passages_info.json"), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            # 段落索引位于索引目录的子目录中，构建标记写在上一级的索引目录
+            touch_build_stamp(os.path.dirname(os.path.abspath(self.output_dir)))
+
+            logger.info(f"段落索引构建完成，总耗时: {time.time() - start_time:.2f}秒")
+            return True
+        except Exception as e:
+            logger.error(f"构建段落索引失败: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='构建段落级倒排索引')
+    parser.add_argument('--data_dir', type=str, required=True, help='预处理数据目录')
+    parser.add_argument('--output_dir', type=str, help='输出目录(可选)')
+
+    args = parser.parse_args()
+
+    builder = PassageIndexBuilder(
+        preprocessed_data_dir=args.data_dir,
+        output_dir=args.output_dir
+    )
+    return 0 if builder.run() else 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from scipy import sparse
+
+# 二进制倒排数组的文件名，依次为 indptr、文档行号、权重
+POSTINGS_FILES = ("postings_indptr.npy", "postings_rows.npy", "postings_weights.npy")
+# InvertedIndexBuilder写出的与基础索引文档行对齐的文件，只在与同一次构建的倒排一起使用时有效
+ROW_ALIGNED_FILES = ("doc_order.npy", "doc_lengths.npy", "doc_columns.npz", "doc_columns_dict.json",
+                     "doc_vectors.npz", "term_positions.npz", "title_terms.npz", "simhash.npy",
+                     "facet_bitmaps.npz", "facet_values.json")
+
+
+def postings_from_matrix(matrix):
+    """
+    将TF-IDF矩阵(文档×词)一次性转换为按词组织的倒排数组
+
+    第t个词的倒排表为 rows[indptr[t]:indptr[t+1]]（文档行号，升序）及对应的 weights，
+    只保留权重大于0的条目。
+
+    参数:
+        matrix (scipy.sparse matrix): (文档数, 词汇表大小) 的TF-IDF矩阵
+
+    返回:
+        tuple: (int64的indptr, int32的文档行号, float32的权重)
+    """
+    csc = sparse.csc_matrix(matrix, dtype=np.float32, copy=True)
+    csc.data[csc.data <= 0] = 0
+    csc.eliminate_zeros()
+    csc.sort_indices()
+    return csc.indptr.astype(np.int64), csc.indices.astype(np.int32), csc.data
+
+
+def save_array(path, array):
+    """
+    保存.npy文件：先写临时文件再原子地替换
+
+    检索引擎以内存映射方式打开这些文件，原地覆盖会使已打开的映射读到截断的文件(SIGBUS)；
+    替换后旧文件的inode在映射关闭前仍然有效，正在使用旧索引的引擎不受影响。
+    """
+    with open(path + ".tmp", 'wb') as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+def save_postings(output_dir, indptr, rows, weights):
+    """将按词组织的倒排数组保存为可内存映射的.npy文件"""
+    for file_name, array in zip(POSTINGS_FILES, (indptr, rows, weights)):
+        save_array(os.path.join(output_dir, file_name), array)
+
+
+def remove_row_aligned_files(output_dir):
+    """删除上一次构建留下的与文档行对齐的文件，返回删除的文件名"""
+    removed = []
+    for file_name in ROW_ALIGNED_FILES:
+        path = os.path.join(output_dir, file_name)
+        if os.path.exists(path):
+            os.remove(path)
+            removed.append(file_name)
+    return removed
+
+
+def load_postings(index_dir, mmap_mode='r'):
+    """
+    加载二进制倒排数组
+
+    参数:
+        index_dir (str): 索引目录
+        mmap_mode (str, optional): 传给np.load的内存映射模式，None时读入内存
+
+    返回:
+        tuple: (indptr, 文档行号, 权重)；文件不存在时返回None
+    """
+    paths = [os.path.join(index_dir, file_name) for file_name in POSTINGS_FILES]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return tuple(np.load(path, mmap_mode=mmap_mode) for path in paths)
+
+
+class PostingsView(Mapping):
+    """
+    倒排数组的只读字典视图：词条 -> [(文档ID, 权重), ...]
+
+    倒排表只在被访问时才由数组切片生成，文档行号通过doc_ids数组映射为原始文档ID；
+    只有倒排表非空的词条出现在视图中。
+    """
+
+    def __init__(self, terms, indptr, rows, weights, doc_ids):
+        """
+        参数:
+            terms (sequence): 与indptr对齐的词汇表
+            indptr (np.ndarray): 每个词条倒排表的起止位置
+            rows (np.ndarray): 文档行号
+            weights (np.ndarray): 与rows对齐的权重
+            doc_ids (np.ndarray): 文档行号 -> 原始文档ID
+        """
+        self.terms = terms
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.doc_ids = doc_ids
+        self.term_ids = {terms[i]: int(i) for i in np.flatnonzero(np.diff(indptr))}
+
+    def __getitem__(self, term):
+        term_id = self.term_ids[term]
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return list(zip(self.doc_ids[self.rows[start:end]].tolist(), self.weights[start:end].tolist()))
+
+    def __iter__(self):
+        return iter(self.term_ids)
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    @property
+    def total_entries(self):
+        """索引条目总数"""
+        return int(self.indptr[-1])
+
+
+def prune_postings(indptr, rows, weights, keep):
+    """
+    按布尔掩码删除倒排条目，并重新计算每个词条倒排表的起止位置
+
+    参数:
+        indptr, rows, weights (np.ndarray): 按词组织的倒排数组
+        keep (np.ndarray): 与rows对齐的布尔掩码，True表示保留
+
+    返回:
+        tuple: 删除后的(indptr, rows, weights)
+    """
+    num_terms = len(indptr) - 1
+    term_of_entry = np.repeat(np.arange(num_terms), np.diff(indptr))
+    new_indptr = np.zeros(num_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_of_entry[keep], minlength=num_terms), out=new_indptr[1:])
+    return new_indptr, rows[keep], weights[keep]
+
+
+def _term_of_entry(indptr):
+    """每个倒排条目所属的词条编号"""
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def relative_threshold_mask(indptr, weights, ratio):
+    """
+    按词条相对阈值剪枝：保留权重不低于该词条最大权重ratio倍的条目
+
+    返回:
+        np.ndarray: 与weights对齐的布尔掩码
+    """
+    lengths = np.diff(indptr)
+    term_max = np.zeros(len(lengths), dtype=np.float32)
+    nonempty = lengths > 0
+    if nonempty.any():
+        term_max[nonempty] = np.maximum.reduceat(weights, indptr[:-1][nonempty])
+    return weights >= ratio * term_max[_term_of_entry(indptr)]
+
+
+def top_k_epsilon_mask(indptr, weights, k, epsilon):
+    """
+    按词条top-k剪枝（Carmel等人的静态剪枝）：z为词条第k大的权重，保留权重不低于 epsilon*z 的条目
+
+    每个词条的前k个条目总会保留，只含单个词的查询的top-k结果不变；
+    多词查询中被删条目对每个文档得分的影响不超过 epsilon*z。
+    倒排表不足k个条目的词条全部保留。
+
+    返回:
+        np.ndarray: 与weights对齐的布尔掩码
+    """
+    lengths = np.diff(indptr)
+    term_of_entry = _term_of_entry(indptr)
+    # 每个词条内按权重降序排列，第k大的权重位于 indptr[t]+k-1
+    order = np.lexsort((-weights, term_of_entry))
+    thresholds = np.zeros(len(lengths), dtype=np.float32)
+    long_terms = lengths >= k
+    thresholds[long_terms] = epsilon * weights[order[indptr[:-1][long_terms] + k - 1]]
+    return weights >= thresholds[term_of_entry]
+
+
+def evaluate_pruning(original, pruned, num_docs, num_queries=200, terms_per_query=2, top_k=10, seed=0):
+    """
+    用随机抽样的查询比较剪枝前后的top-k结果，估计剪枝对检索质量的影响
+
+    参数:
+        original, pruned (tuple): 剪枝前后的(indptr, rows, weights)
+        num_docs (int): 文档数
+        num_queries (int): 抽样查询数
+        terms_per_query (int): 每个查询的词数
+        top_k (int): 比较的结果数
+
+    返回:
+        dict: 条目与体积的保留比例、权重总量的保留比例、剪枝前后top-k结果的平均重合率
+    """
+    def top_rows(postings, term_ids):
+        indptr, rows, weights = postings
+        scores = np.zeros(num_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = indptr[term_id], indptr[term_id + 1]
+            scores[rows[start:end]] += weights[start:end]
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        return set(candidates.tolist())
+
+    def postings_bytes(postings):
+        return int(sum(array.nbytes for array in postings))
+
+    terms = np.flatnonzero(np.diff(original[0]))
+    overlaps = []
+    if len(terms) > 0:
+        rng = np.random.default_rng(seed)
+        for _ in range(num_queries):
+            term_ids = rng.choice(terms, size=min(terms_per_query, len(terms)), replace=False)
+            expected = top_rows(original, term_ids)
+            if expected:
+                overlaps.append(len(expected & top_rows(pruned, term_ids)) / len(expected))
+
+    original_mass = float(original[2].sum(dtype=np.float64))
+    return {
+        "entries_retained": float(len(pruned[1]) / max(1, len(original[1]))),
+        "size_bytes": {"original": postings_bytes(original), "pruned": postings_bytes(pruned)},
+        "weight_mass_retained": float(pruned[2].sum(dtype=np.float64) / original_mass) if original_mass > 0 else 1.0,
+        f"mean_top{top_k}_overlap": float(np.mean(overlaps)) if overlaps else 1.0,
+        "sample_queries": len(overlaps)
+    }
@@ -0,0 +1,66 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from .inverted_index import extract_host
+
+logger = logging.getLogger(__name__)
+
+# 支持的文档重排方式
+REORDER_METHODS = ("url", "cluster")
+
+
+def url_order(urls):
+    """
+    按站点和URL排列文档：站点名按域名层级倒序比较（cn.edu.whu.news），同一站点及其子站点的页面相邻，
+    站点内按URL排序；没有URL的文档排在最后，保持原有顺序
+
+    参数:
+        urls (iterable): 与文档行对齐的URL
+
+    返回:
+        np.ndarray: 新行号 -> 原行号
+    """
+    urls = pd.Series(list(urls), dtype=object)
+    hosts = urls.map(extract_host)
+    keys = pd.DataFrame({
+        "missing": hosts.isna(),
+        "host": hosts.map(lambda host: '.'.join(reversed(host.split('.'))) if isinstance(host, str) else ''),
+        "url": urls.fillna('').astype(str)
+    })
+    return keys.sort_values(["missing", "host", "url"], kind='stable').index.to_numpy(dtype=np.int64)
+
+
+def cluster_order(matrix, num_clusters=None, num_components=32, random_state=42):
+    """
+    按TF-IDF向量的粗聚类排列文档：先用高斯随机投影降到num_components维，再做球面k-means，
+    同一簇的文档相邻，簇按首个成员的原行号排列，簇内保持原有顺序
+
+    参数:
+        matrix (scipy.sparse matrix): (文档数, 词汇表大小) 的TF-IDF矩阵
+        num_clusters (int, optional): 簇数，默认为文档数的平方根
+        num_components (int): 随机投影的维数
+
+    返回:
+        np.ndarray: 新行号 -> 原行号
+    """
+    from .dense_index import spherical_kmeans
+
+    num_docs = matrix.shape[0]
+    if num_clusters is None:
+        num_clusters = int(np.sqrt(num_docs))
+    num_clusters = max(1, min(num_clusters, num_docs))
+    if num_docs == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    rng = np.random.default_rng(random_state)
+    projection = rng.standard_normal((matrix.shape[1], num_components)).astype(np.float32)
+    vectors = np.asarray(matrix @ projection, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    vectors[norms > 0] /= norms[norms > 0, None]
+
+    _, assignments = spherical_kmeans(vectors, num_clusters, num_iterations=5, random_state=random_state)
+    # 簇按首个成员出现的位置编号，排序后簇内保持原有顺序
+    first_seen = np.full(num_clusters, num_docs, dtype=np.int64)
+    np.minimum.at(first_seen, assignments, np.arange(num_docs))
+    return np.argsort(first_seen[assignments], kind='stable').astype(np.int64)
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .inverted_index import encode_column
+from .postings import postings_from_matrix, save_postings, load_postings
+from .stamp import touch_build_stamp
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS_DIR = "segments"
+MANIFEST_FILE = "manifest.json"
+# 基础索引在删除标记文件中使用的段名
+BASE_SEGMENT = "base"
+
+
+class Segment:
+    """
+    增量索引的一个段：一批文档的倒排数组及与文档行对齐的附属数据
+
+    段与基础索引共用词汇表和IDF，倒排数组的词条编号与基础索引一致，
+    检索时各段的文档行依次追加在基础索引之后。
+    """
+
+    def __init__(self, doc_ids, matrix, columns, dictionaries, simhashes=None, metadata=None):
+        """
+        参数:
+            doc_ids (np.ndarray): 段内行号 -> 原始文档ID
+            matrix (scipy.sparse matrix): (段内文档数, 词汇表大小) 的L2归一化TF-IDF矩阵
+            columns (dict): 与段内行对齐的过滤列(source_codes、host_codes、publish_epoch、pagerank)
+            dictionaries (dict): 段内字典编码列的取值表(source、host)
+            simhashes (np.ndarray, optional): SimHash指纹
+            metadata (pd.DataFrame, optional): 以doc_id为索引的展示用元数据
+        """
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.simhashes = simhashes
+        self.metadata = metadata
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def postings(self):
+        """按词组织的倒排数组(indptr, 段内行号, 权重)"""
+        return postings_from_matrix(self.matrix)
+
+    def decoded_column(self, name):
+        """把字典编码列还原为取值数组，缺失为None"""
+        values = np.array(self.dictionaries.get(name, []) + [None], dtype=object)
+        return values[self.columns[f"{name}_codes"]]
+
+    def save(self, segment_dir):
+        """保存段；写入临时目录后整体改名，读取方不会看到写了一半的段"""
+        temp_dir = segment_dir + ".tmp"
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+
+        save_postings(temp_dir, *self.postings())
+        np.save(os.path.join(temp_dir, "doc_ids.npy"), self.doc_ids)
+        sparse.save_npz(os.path.join(temp_dir, "doc_vectors.npz"), self.matrix)
+        np.savez(os.path.join(temp_dir, "doc_columns.npz"), **self.columns)
+        with open(os.path.join(temp_dir, "doc_columns_dict.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.dictionaries, f, ensure_ascii=False)
+        if self.simhashes is not None:
+            np.save(os.path.join(temp_dir, "simhash.npy"), self.simhashes)
+        if self.metadata is not None:
+            self.metadata.to_csv(os.path.join(temp_dir, "document_metadata.csv"), encoding='utf-8')
+
+        os.replace(temp_dir, segment_dir)
+
+    @classmethod
+    def load(cls, segment_dir, vocabulary_size):
+        """加载段"""
+        doc_ids = np.load(os.path.join(segment_dir, "doc_ids.npy"))
+        indptr, rows, weights = load_postings(segment_dir, mmap_mode=None)
+        matrix = sparse.csc_matrix((weights, rows, indptr), shape=(len(doc_ids), vocabulary_size)).tocsr()
+
+        with np.load(os.path.join(segment_dir, "doc_columns.npz")) as columns:
+            columns = {name: columns[name] for name in columns.files}
+        with open(os.path.join(segment_dir, "doc_columns_dict.json"), 'r', encoding='utf-8') as f:
+            dictionaries = json.load(f)
+
+        simhash_file = os.path.join(segment_dir, "simhash.npy")
+        simhashes = np.load(simhash_file) if os.path.exists(simhash_file) else None
+        meta_file = os.path.join(segment_dir, "document_metadata.csv")
+        metadata = pd.read_csv(meta_file, encoding='utf-8', index_col='doc_id') if os.path.exists(meta_file) else None
+
+        return cls(doc_ids, matrix, columns, dictionaries, simhashes, metadata)
+
+    @classmethod
+    def merge(cls, segments, deleted=None):
+        """
+        合并若干段（按从旧到新的顺序），清除打了删除标记的行，同一文档只保留最新的版本
+
+        参数:
+            segments (list): 从旧到新的段
+            deleted (list, optional): 与各段文档行对齐的删除位图
+
+        返回:
+            Segment: 合并后的段
+        """
+        doc_ids = np.concatenate([segment.doc_ids for segment in segments])
+        candidates = np.arange(len(doc_ids))
+        if deleted is not None:
+            candidates = np.flatnonzero(~np.concatenate(deleted))
+        # 倒序去重得到每个文档ID最后一次出现的行
+        _, last = np.unique(doc_ids[candidates][::-1], return_index=True)
+        keep = np.sort(candidates[len(candidates) - 1 - last])
+
+        matrix = sparse.vstack([segment.matrix for segment in segments]).tocsr()[keep]
+        columns = {}
+        dictionaries = {}
+        for name in ("source", "host"):
+            if all(f"{name}_codes" in segment.columns for segment in segments):
+                values = np.concatenate([segment.decoded_column(name) for segment in segments])[keep]
+                columns[f"{name}_codes"], dictionaries[name] = encode_column(values)
+        for name in ("publish_epoch", "pagerank"):
+            if all(name in segment.columns for segment in segments):
+                columns[name] = np.concatenate([segment.columns[name] for segment in segments])[keep]
+
+        simhashes = None
+        if all(segment.simhashes is not None for segment in segments):
+            simhashes = np.concatenate([segment.simhashes for segment in segments])[keep]
+        metadata = None
+        if all(segment.metadata is not None for segment in segments):
+            metadata = pd.concat([segment.metadata for segment in segments])
+            metadata = metadata[~metadata.index.duplicated(keep='last')]
+            metadata = metadata[metadata.index.isin(doc_ids[keep])]
+
+        return cls(doc_ids[keep], matrix, columns, dictionaries, simhashes, metadata)
+
+
+def segments_dir(index_dir):
+    """增量段目录"""
+    return os.path.join(index_dir, SEGMENTS_DIR)
+
+
+def read_manifest(index_dir):
+    """
+    读取增量段清单，不存在时返回空清单
+
+    返回:
+        dict: {"segments": [{"name", "level", "num_docs", "created_time"}, ...], "next_id": int}
+    """
+    manifest_file = os.path.join(segments_dir(index_dir), MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {"segments": [], "next_id": 1}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(index_dir, manifest):
+    """原子地替换增量段清单"""
+    manifest_file = os.path.join(segments_dir(index_dir), MANIFEST_FILE)
+    with open(manifest_file + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_file + ".tmp", manifest_file)
+    touch_build_stamp(index_dir)
+
+
+def reset_segments(index_dir):
+    """全量重建基础索引后删除所有增量段及变更检测状态"""
+    directory = segments_dir(index_dir)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+        logger.info("基础索引已重建，已清除增量段")
+
+
+def tombstones_file(index_dir, name):
+    """段的删除位图文件；段本身不可变，删除标记单独存放在段目录之外"""
+    return os.path.join(segments_dir(index_dir), f"{name}.deleted.npy")
+
+
+def read_tombstones(index_dir, name, num_rows):
+    """
+    读取段的删除位图
+
+    参数:
+        index_dir (str): 基础索引目录
+        name (str): 段名，基础索引为BASE_SEGMENT
+        num_rows (int): 段内文档行数
+
+    返回:
+        np.ndarray: 与段内文档行对齐的布尔数组，True表示已删除；没有删除标记时全为False
+    """
+    path = tombstones_file(index_dir, name)
+    if not os.path.exists(path):
+        return np.zeros(num_rows, dtype=bool)
+    return np.unpackbits(np.load(path), count=num_rows).astype(bool)
+
+
+def write_tombstones(index_dir, name, deleted):
+    """按位压缩后原子地替换段的删除位图"""
+    path = tombstones_file(index_dir, name)
+    with open(path + ".tmp", 'wb') as f:
+        np.save(f, np.packbits(deleted))
+    os.replace(path + ".tmp", path)
+    touch_build_stamp(index_dir)
+
+
+def load_segments(index_dir, vocabulary_size):
+    """
+    按从旧到新的顺序加载清单中的所有段
+
+    返回:
+        list: (段名, Segment) 列表
+    """
+    segments = []
+    for entry in read_manifest(index_dir)["segments"]:
+        segment_dir = os.path.join(segments_dir(index_dir), entry["name"])
+        if not os.path.exists(segment_dir):
+            logger.warning(f"增量段{entry['name']}不存在（可能正在合并），已跳过")
+            continue
+        segments.append((entry["name"], Segment.load(segment_dir, vocabulary_size)))
+    return segments
+
+
+def new_segment_entry(manifest, segment, level=0):
+    """为新段分配名称并生成清单条目"""
+    name = f"seg_{manifest['next_id']:06d}"
+    manifest["next_id"] += 1
+    return {
+        "name": name,
+        "level": level,
+        "num_docs": len(segment),
+        "created_time": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
@@ -0,0 +1,411 @@
+import os
+import re
+import json
+import time
+import heapq
+import shutil
+import logging
+import itertools
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from preprocess.artifacts import has_documents, iter_documents, PREVIEW_COLUMN
+from .postings import POSTINGS_FILES, save_array, remove_row_aligned_files
+from .codec import remove_compressed_postings
+from .segments import reset_segments
+from .stamp import touch_build_stamp
+
+logger = logging.getLogger(__name__)
+
+# 与TfidfVectorizer默认的token_pattern一致（预处理阶段已用空格分好词）
+_TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# 内存中每个倒排条目(行号+词频)及每个词条的估计开销(字节)
+_ENTRY_BYTES = 8
+_TERM_BYTES = 160
+
+
+def _add_document(postings, row, text):
+    """把一篇文档的词频追加到内存倒排表中，返回新增的估计内存(字节)"""
+    used = 0
+    for term, tf in Counter(_TOKEN_PATTERN.findall(text.lower())).items():
+        entry = postings.get(term)
+        if entry is None:
+            entry = postings[term] = (array('i'), array('i'))
+            used += _TERM_BYTES + len(term)
+        entry[0].append(row)
+        entry[1].append(tf)
+        used += _ENTRY_BYTES
+    return used
+
+
+def _write_run(run_dir, postings):
+    """把内存中的倒排表按词排序后写成一个run：词表、indptr、文档行号、词频"""
+    os.makedirs(run_dir)
+
+    terms = sorted(postings)
+    lengths = np.fromiter((len(postings[term][0]) for term in terms), dtype=np.int64, count=len(terms))
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+
+    with open(os.path.join(run_dir, "terms.txt"), 'w', encoding='utf-8') as f:
+        for term in terms:
+            f.write(f"{term}\n")
+    np.save(os.path.join(run_dir, "indptr.npy"), indptr)
+    for name, position in (("rows", 0), ("tfs", 1)):
+        with open(os.path.join(run_dir, f"{name}.bin"), 'wb') as f:
+            for term in terms:
+                postings[term][position].tofile(f)
+    logger.info(f"写出run {os.path.basename(run_dir)}，{len(terms)}个词条，{int(indptr[-1])}个条目")
+
+
+def _invert_partition(texts, first_row, run_prefix, budget):
+    """
+    在工作进程中倒排一个文档分区，写出按词排序的run
+
+    参数:
+        texts (list): 分区内按顺序排列的分好词的文档文本
+        first_row (int): 分区第一篇文档的全局文档行号
+        run_prefix (str): run目录的路径前缀，分区内的run依次编号
+        budget (float): 本进程内存中倒排表的预算(字节)
+
+    返回:
+        list: 按文档顺序排列的run目录
+    """
+    run_dirs = []
+    postings = {}
+    used = 0
+    for offset, text in enumerate(texts):
+        used += _add_document(postings, first_row + offset, text)
+        if used >= budget:
+            run_dirs.append(f"{run_prefix}_{len(run_dirs):03d}")
+            _write_run(run_dirs[-1], postings)
+            postings, used = {}, 0
+    if postings:
+        run_dirs.append(f"{run_prefix}_{len(run_dirs):03d}")
+        _write_run(run_dirs[-1], postings)
+    return run_dirs
+
+
+class SPIMIIndexBuilder:
+    """
+    外存倒排索引构建器(SPIMI, single-pass in-memory indexing)
+
+    流式读取预处理输出中分好词的文档，在内存中为每个词累积(文档行号, 词频)，
+    估计内存超过预算时把按词排序的倒排表作为一个run写入磁盘；读完后对所有run做k路归并，
+    按与TfidfVectorizer(min_df, max_df, smooth_idf, norm='l2')相同的公式计算TF-IDF，
+    直接写出SearchEngine可内存映射加载的二进制倒排数组。
+
+    内存占用由memory_budget_mb决定，与语料大小无关；只有每篇文档8字节的
+    文档ID及向量范数数组随文档数线性增长。
+
+    workers大于1时按文档范围把语料切成分区，由进程池并行分词和倒排，每个分区写出自己的run
+    （内存预算在工作进程间平分）；文档频率、IDF和文档向量范数都在归并阶段对全部run统一计算，
+    与单进程构建的结果完全一致。
+    """
+
+    def __init__(self, preprocessed_data_dir, output_dir=None, memory_budget_mb=256, chunk_size=2000,
+                 min_df=2, max_df=0.95, workers=1, partition_size=20000):
+        """
+        参数:
+            preprocessed_data_dir (str): 预处理数据目录，包含处理后的文档
+            output_dir (str, optional): 输出目录，默认为preprocessed_data_dir下的inverted_index子目录
+            memory_budget_mb (float): 内存中倒排表的预算(MB)，超过后写出一个run
+            chunk_size (int): 每次读取的文档数
+            min_df (int or float): 与预处理TF-IDF参数一致的最小文档频率（整数为文档数，小数为比例）
+            max_df (int or float): 与预处理TF-IDF参数一致的最大文档频率（整数为文档数，小数为比例）
+            workers (int): 并行倒排的进程数，1为在当前进程中构建
+            partition_size (int): 并行构建时每个分区的文档数
+        """
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.output_dir = output_dir if output_dir else os.path.join(preprocessed_data_dir, "inverted_index")
+        self.memory_budget_mb = memory_budget_mb
+        self.chunk_size = chunk_size
+        self.min_df = min_df
+        self.max_df = max_df
+        self.workers = max(1, int(workers))
+        self.partition_size = partition_size
+        self.runs_dir = os.path.join(self.output_dir, "spimi_runs")
+
+        self.run_dirs = []
+        self.num_docs = 0
+        self.num_partitions = 0
+
+    def _write_run(self, postings):
+        """在当前进程中写出一个run"""
+        run_dir = os.path.join(self.runs_dir, f"run_{len(self.run_dirs):05d}")
+        _write_run(run_dir, postings)
+        self.run_dirs.append(run_dir)
+
+    def invert(self):
+        """
+        流式读取文档并写出排序的倒排run；workers大于1时各分区在进程池中并行倒排
+
+        返回:
+            np.ndarray: 文档行号 -> 原始文档ID
+        """
+        meta_path = os.path.join(self.output_dir, "document_metadata.csv")
+        budget = self.memory_budget_mb * 1024 * 1024
+
+        postings = {}
+        used = 0
+        doc_ids = array('q')
+        meta_header = True
+        columns = ['doc_id', 'segmented_title', 'segmented_content', 'title', 'source', 'publish_time', PREVIEW_COLUMN]
+
+        # 并行时同时在途的分区数不超过进程数的两倍，读入内存的文本量有上限
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        pending = deque()
+        chunk_size = self.partition_size if executor is not None else self.chunk_size
+        try:
+            for chunk in iter_documents(self.preprocessed_data_dir, columns, chunk_size):
+                texts = chunk['segmented_title'].fillna('').astype(str) + ' ' + \
+                    chunk['segmented_content'].fillna('').astype(str)
+                if executor is not None:
+                    pending.append(executor.submit(
+                        _invert_partition, texts.tolist(), self.num_docs,
+                        os.path.join(self.runs_dir, f"run_{self.num_partitions:05d}"), budget / self.workers
+                    ))
+                    self.num_partitions += 1
+                    self.num_docs += len(texts)
+                    while len(pending) > 2 * self.workers:
+                        self.run_dirs.extend(pending.popleft().result())
+                else:
+                    for text in texts:
+                        used += _add_document(postings, self.num_docs, text)
+                        self.num_docs += 1
+                        if used >= budget:
+                            self._write_run(postings)
+                            postings, used = {}, 0
+
+                chunk_doc_ids = chunk['doc_id'].astype(np.int64) if 'doc_id' in chunk.columns else \
+                    pd.Series(np.arange(self.num_docs - len(chunk), self.num_docs), index=chunk.index)
+                doc_ids.extend(chunk_doc_ids.tolist())
+
+                # 结果展示用的文档元数据，与InvertedIndexBuilder的格式一致
+                meta = pd.DataFrame({'doc_id': chunk_doc_ids})
+                for column in ('title', 'source', 'publish_time'):
+                    if column in chunk.columns:
+                        meta[column] = chunk[column]
+                if PREVIEW_COLUMN in chunk.columns:
+                    meta[PREVIEW_COLUMN] = chunk[PREVIEW_COLUMN]
+                meta.to_csv(meta_path, mode='w' if meta_header else 'a', header=meta_header, index=False,
+                            encoding='utf-8')
+                meta_header = False
+
+            # 按提交顺序收集各分区的run，run列表保持文档顺序
+            while pending:
+                self.run_dirs.extend(pending.popleft().result())
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        if postings:
+            self._write_run(postings)
+        return np.frombuffer(doc_ids, dtype=np.int64)
+
+    def _open_runs(self):
+        """以内存映射方式打开所有run，返回(词表文件, indptr, 文档行号, 词频)列表"""
+        runs = []
+        for run_dir in self.run_dirs:
+            runs.append((
+                open(os.path.join(run_dir, "terms.txt"), 'r', encoding='utf-8'),
+                np.load(os.path.join(run_dir, "indptr.npy"), mmap_mode='r'),
+                np.memmap(os.path.join(run_dir, "rows.bin"), dtype=np.int32, mode='r')
+                if os.path.getsize(os.path.join(run_dir, "rows.bin")) else np.zeros(0, dtype=np.int32),
+                np.memmap(os.path.join(run_dir, "tfs.bin"), dtype=np.int32, mode='r')
+                if os.path.getsize(os.path.join(run_dir, "tfs.bin")) else np.zeros(0, dtype=np.int32)
+            ))
+        return runs
+
+    def _merged_terms(self):
+        """
+        k路归并所有run的词表
+
+        返回:
+            generator: 按词排序依次产生 (词条, [(run下标, run内词条下标), ...])，run下标升序
+        """
+        def term_stream(run_index, terms_file):
+            for term_index, line in enumerate(terms_file):
+                yield line.rstrip('\n'), run_index, term_index
+
+        runs = self._open_runs()
+        try:
+            streams = [term_stream(run_index, run[0]) for run_index, run in enumerate(runs)]
+            for term, group in itertools.groupby(heapq.merge(*streams), key=lambda item: item[0]):
+                yield term, [(run_index, term_index) for _, run_index, term_index in group]
+        finally:
+            for run in runs:
+                run[0].close()
+
+    def merge(self):
+        """
+        归并run，按文档频率过滤词条，计算L2归一化的TF-IDF并写出二进制倒排数组
+
+        返回:
+            tuple: (词汇表, idf数组)
+        """
+        num_docs = self.num_docs
+        max_doc_count = self.max_df if isinstance(self.max_df, int) else self.max_df * num_docs
+        min_doc_count = self.min_df if isinstance(self.min_df, int) else self.min_df * num_docs
+        indptrs = [np.load(os.path.join(run_dir, "indptr.npy"), mmap_mode='r') for run_dir in self.run_dirs]
+
+        # 第一遍：只读各run的词表和indptr，得到保留的词条及其文档频率
+        vocabulary = []
+        dfs = array('q')
+        for term, locations in self._merged_terms():
+            df = sum(int(indptrs[r][t + 1] - indptrs[r][t]) for r, t in locations)
+            if min_doc_count <= df <= max_doc_count:
+                vocabulary.append(term)
+                dfs.append(df)
+        if not vocabulary:
+            raise ValueError("按min_df/max_df过滤后没有剩余词条")
+
+        dfs = np.frombuffer(dfs, dtype=np.int64)
+        idf = (np.log((1 + num_docs) / (1 + dfs)) + 1).astype(np.float32)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(dfs, out=indptr[1:])
+        # 第二遍：按词拼接各run的倒排表（run按文档顺序写出，拼接后文档行号仍然升序），写入内存映射数组；
+        # 写在临时文件中，完成后再替换正式文件，正在以内存映射方式使用旧索引的引擎不受影响
+        paths = [os.path.join(self.output_dir, file_name) for file_name in POSTINGS_FILES]
+        rows_out = np.lib.format.open_memmap(paths[1] + ".tmp", mode='w+', dtype=np.int32, shape=(int(indptr[-1]),))
+        weights_out = np.lib.format.open_memmap(paths[2] + ".tmp", mode='w+', dtype=np.float32,
+                                                shape=(int(indptr[-1]),))
+        norms = np.zeros(num_docs, dtype=np.float64)
+        runs = self._open_runs()
+        term_id = 0
+        for term, locations in self._merged_terms():
+            if term_id == len(vocabulary) or term != vocabulary[term_id]:
+                continue
+            start = indptr[term_id]
+            for r, t in locations:
+                begin, end = runs[r][1][t], runs[r][1][t + 1]
+                rows_out[start:start + end - begin] = runs[r][2][begin:end]
+                weights_out[start:start + end - begin] = runs[r][3][begin:end] * idf[term_id]
+                start += end - begin
+            segment = slice(indptr[term_id], indptr[term_id + 1])
+            norms[rows_out[segment]] += np.square(weights_out[segment], dtype=np.float64)
+            term_id += 1
+        for run in runs:
+            run[0].close()
+
+        # 第三遍：分块做L2归一化
+        norms = np.sqrt(norms)
+        norms[norms == 0] = 1
+        block = 1 << 20
+        for start in range(0, len(weights_out), block):
+            weights_out[start:start + block] /= norms[rows_out[start:start + block]]
+        rows_out.flush()
+        weights_out.flush()
+        del rows_out, weights_out
+        save_array(paths[0], indptr)
+        for path in paths[1:]:
+            os.replace(path + ".tmp", path)
+
+        return vocabulary, idf
+
+    def run(self):
+        """运行完整的SPIMI构建流程"""
+        logger.info(f"开始SPIMI外存索引构建(内存预算: {self.memory_budget_mb}MB，进程数: {self.workers})...")
+        start_time = time.time()
+
+        if not has_documents(self.preprocessed_data_dir):
+            logger.error(f"找不到预处理数据: {self.preprocessed_data_dir}")
+            return False
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if os.path.exists(self.runs_dir):
+                shutil.rmtree(self.runs_dir)
+            self.run_dirs = []
+            self.num_docs = 0
+            self.num_partitions = 0
+
+            doc_ids = self.invert()
+            invert_time = time.time() - start_time
+            vocabulary, idf = self.merge()
+            num_runs = len(self.run_dirs)
+            shutil.rmtree(self.runs_dir)
+            reset_segments(self.output_dir)
+            # 检索时优先加载压缩倒排，之前压缩构建留下的压缩倒排已过时
+            remove_compressed_postings(self.output_dir)
+            # 之前InvertedIndexBuilder写出的过滤列、指纹、分面、重排特征等按它的文档行排列（可能经过重排），
+            # 与按预处理顺序排列的SPIMI倒排对不上，一并删除
+            removed = remove_row_aligned_files(self.output_dir)
+            if removed:
+                logger.info(f"已删除与新倒排的文档行不一致的旧文件: {', '.join(removed)}")
+
+            # 与InvertedIndexBuilder相同的词汇表、IDF及文档ID映射，查询编码器等组件可直接使用
+            with open(os.path.join(self.output_dir, "vocabulary.txt"), 'w', encoding='utf-8') as f:
+                for term in vocabulary:
+                    f.write(f"{term}\n")
+            save_array(os.path.join(self.output_dir, "idf.npy"), idf)
+            with open(os.path.join(self.output_dir, "doc_id_mapping.json"), 'w', encoding='utf-8') as f:
+                json.dump(doc_ids.tolist(), f)
+
+            total_entries = int(np.load(os.path.join(self.output_dir, POSTINGS_FILES[0]), mmap_mode='r')[-1])
+            metadata = {
+                "index_created_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "total_documents": int(self.num_docs),
+                "vocabulary_size": len(vocabulary),
+                "total_index_entries": total_entries,
+                "average_postings_per_term": float(total_entries / max(1, len(vocabulary))),
+                "uses_original_doc_ids": True,
+                "builder": "spimi"
+            }
+            with open(os.path.join(self.output_dir, "index_metadata.json"), 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+            info = {
+                "created_time": metadata["index_created_time"],
+                "memory_budget_mb": self.memory_budget_mb,
+                "workers": self.workers,
+                "partitions": self.num_partitions,
+                "runs": num_runs,
+                "total_documents": int(self.num_docs),
+                "vocabulary_size": len(vocabulary),
+                "total_index_entries": total_entries,
+                "invert_time_seconds": float(invert_time),
+                "build_time_seconds": float(time.time() - start_time)
+            }
+            with open(os.path.join(self.output_dir, "spimi_info.json"), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+            touch_build_stamp(self.output_dir)
+
+            logger.info(f"SPIMI索引构建完成，{num_runs}个run，{len(vocabulary)}个词条，{total_entries}个条目，"
+                        f"总耗时: {time.time() - start_time:.2f}秒")
+            return True
+        except Exception as e:
+            logger.error(f"SPIMI索引构建失败: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SPIMI外存倒排索引构建')
+    parser.add_argument('--data_dir', type=str, required=True, help='预处理数据目录')
+    parser.add_argument('--output_dir', type=str, help='输出目录(可选)')
+    parser.add_argument('--memory_budget_mb', type=float, default=256, help='内存中倒排表的预算(MB)')
+    parser.add_argument('--workers', type=int, default=1, help='并行倒排的进程数')
+
+    args = parser.parse_args()
+
+    builder = SPIMIIndexBuilder(
+        preprocessed_data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        memory_budget_mb=args.memory_budget_mb,
+        workers=args.workers
+    )
+    return 0 if builder.run() else 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import time
+
+# 索引目录中的构建标记文件，任何写入检索引擎所加载文件的构建步骤完成后都会更新它
+BUILD_STAMP_FILE = "build_stamp"
+
+
+def touch_build_stamp(index_dir):
+    """更新索引目录的构建标记；写入临时文件后替换，标记的inode和修改时间都会改变"""
+    path = os.path.join(index_dir, BUILD_STAMP_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(f"{time.time_ns()}\n")
+    os.replace(path + ".tmp", path)
+
+
+def read_build_stamp(index_dir):
+    """
+    读取索引目录的构建标记，只需一次stat
+
+    返回:
+        tuple: (inode, 修改时间ns)；没有构建标记时返回None
+    """
+    try:
+        stat = os.stat(os.path.join(index_dir, BUILD_STAMP_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
@@ -0,0 +1,299 @@
+import os
+import json
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# 预处理与建索引之间交接的二进制文件
+DOCUMENTS_DIR = "documents"
+VOCABULARY_DIR = "vocabulary"
+TFIDF_MATRIX_FILE = "tfidf_matrix.npz"
+DOC_IDS_FILE = "doc_ids.npy"
+COLUMNS_FILE = "columns.json"
+# 去重时删除的页面的ID及内容哈希，增量索引据此把它们视为已处理
+DUPLICATES_FILE = "duplicate_documents.npz"
+# 旧版本预处理生成的文件，二进制文件不存在时回退读取
+LEGACY_DOCUMENTS_FILE = "processed_documents.csv"
+LEGACY_MATRIX_FILE = "tfidf_matrix.pkl"
+LEGACY_DOC_IDS_FILE = "doc_id_mapping.pkl"
+VECTORIZER_FILE = "tfidf_vectorizer.pkl"
+# 由content列的前若干个字生成的内容预览列
+PREVIEW_COLUMN = "content_preview"
+PREVIEW_LENGTH = 50
+
+
+def make_preview(text, length=PREVIEW_LENGTH):
+    """结果展示用的内容预览：超过length个字时截断并加省略号"""
+    return text[:length] + '...' if len(text) > length else text
+
+
+def write_column_store(directory, frame):
+    """
+    把DataFrame按列保存为可内存映射的.npy文件
+
+    数值列直接保存；其余列按字符串保存为UTF-8字节数组加int64偏移量(第i行为utf8[offsets[i]:offsets[i+1]])，
+    有缺失值时另存缺失掩码。写入临时目录后整体替换，读取方不会看到写了一半的文件。
+
+    参数:
+        directory (str): 输出目录
+        frame (pd.DataFrame): 要保存的数据
+    """
+    temp_dir = directory + ".tmp"
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+
+    kinds = {}
+    for name in frame.columns:
+        values = frame[name]
+        if values.dtype.kind in 'biuf':
+            np.save(os.path.join(temp_dir, f"{name}.npy"), values.to_numpy())
+            kinds[name] = values.dtype.str
+            continue
+        missing = values.isna().to_numpy()
+        encoded = [b'' if absent else str(value).encode('utf-8') for value, absent in zip(values, missing)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        np.save(os.path.join(temp_dir, f"{name}.offsets.npy"), offsets)
+        np.save(os.path.join(temp_dir, f"{name}.utf8.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        if missing.any():
+            np.save(os.path.join(temp_dir, f"{name}.missing.npy"), missing)
+        kinds[name] = "str"
+
+    with open(os.path.join(temp_dir, COLUMNS_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"num_rows": int(len(frame)), "columns": kinds}, f, ensure_ascii=False, indent=2)
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(temp_dir, directory)
+
+
+class ColumnStore:
+    """
+    write_column_store保存的按列数据的只读视图
+
+    各列以内存映射方式打开，只有被读取的列和行才会被解码，不需要的长文本列不占用读取时间。
+    """
+
+    def __init__(self, directory, mmap_mode='r'):
+        """
+        参数:
+            directory (str): write_column_store的输出目录
+            mmap_mode (str, optional): 传给np.load的内存映射模式
+        """
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(directory, COLUMNS_FILE), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        self.num_rows = info["num_rows"]
+        self.kinds = info["columns"]
+        self._arrays = {}
+
+    @staticmethod
+    def exists(directory):
+        """目录中是否有完整保存的按列数据"""
+        return os.path.exists(os.path.join(directory, COLUMNS_FILE))
+
+    @property
+    def columns(self):
+        return list(self.kinds)
+
+    def __contains__(self, name):
+        return name in self.kinds
+
+    def __len__(self):
+        return self.num_rows
+
+    def _array(self, file_name):
+        """按需打开一个数组文件，不存在时返回None"""
+        if file_name not in self._arrays:
+            path = os.path.join(self.directory, file_name)
+            self._arrays[file_name] = np.load(path, mmap_mode=self.mmap_mode) if os.path.exists(path) else None
+        return self._arrays[file_name]
+
+    def _strings(self, name, start, end, max_chars=None):
+        """解码字符串列的[start, end)行；max_chars不为None时只解码每行前max_chars个字"""
+        offsets = np.asarray(self._array(f"{name}.offsets.npy")[start:end + 1])
+        base = int(offsets[0])
+        data = self._array(f"{name}.utf8.npy")[base:int(offsets[-1])].tobytes()
+        bounds = (offsets - base).tolist()
+        if max_chars is None:
+            values = [data[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+        else:
+            # UTF-8中每个字最多4个字节，截取的字节足以覆盖前max_chars个字，末尾被截断的字节忽略
+            values = [data[a:min(b, a + 4 * max_chars)].decode('utf-8', errors='ignore')[:max_chars]
+                      for a, b in zip(bounds[:-1], bounds[1:])]
+        result = np.array(values, dtype=object)
+        missing = self._array(f"{name}.missing.npy")
+        if missing is not None:
+            result[np.asarray(missing[start:end])] = None
+        return result
+
+    def column(self, name, start=0, end=None):
+        """
+        读取一列的[start, end)行
+
+        返回:
+            np.ndarray: 数值列为内存映射数组的切片；字符串列为object数组，缺失值为None
+        """
+        end = self.num_rows if end is None else min(end, self.num_rows)
+        if self.kinds[name] != "str":
+            return self._array(f"{name}.npy")[start:end]
+        return self._strings(name, start, end)
+
+    def previews(self, name, start=0, end=None, length=PREVIEW_LENGTH):
+        """只解码每行开头的length+1个字，生成与make_preview一致的内容预览，缺失值为空字符串"""
+        end = self.num_rows if end is None else min(end, self.num_rows)
+        prefixes = self._strings(name, start, end, max_chars=length + 1)
+        return np.array([make_preview(text or '', length) for text in prefixes], dtype=object)
+
+    def frame(self, columns=None, start=0, end=None):
+        """
+        把若干列的[start, end)行读成DataFrame
+
+        参数:
+            columns (list, optional): 列名，可包含PREVIEW_COLUMN（由content列生成）；不存在的列被忽略，默认全部列
+        """
+        end = self.num_rows if end is None else min(end, self.num_rows)
+        data = {}
+        for name in (self.columns if columns is None else columns):
+            if name in self.kinds:
+                data[name] = self.column(name, start, end)
+            elif name == PREVIEW_COLUMN and 'content' in self.kinds:
+                data[name] = self.previews('content', start, end)
+        return pd.DataFrame(data, index=pd.RangeIndex(start, end))
+
+
+def has_documents(preprocessed_data_dir):
+    """预处理目录中是否有处理后的文档（二进制或旧版CSV）"""
+    return ColumnStore.exists(os.path.join(preprocessed_data_dir, DOCUMENTS_DIR)) or \
+        os.path.exists(os.path.join(preprocessed_data_dir, LEGACY_DOCUMENTS_FILE))
+
+
+def _legacy_chunks(preprocessed_data_dir, columns, chunk_size):
+    """从旧版processed_documents.csv中读取需要的列"""
+    wanted = set(columns) if columns is not None else None
+    if wanted is not None and PREVIEW_COLUMN in wanted:
+        wanted.add('content')
+    chunks = pd.read_csv(os.path.join(preprocessed_data_dir, LEGACY_DOCUMENTS_FILE), encoding='utf-8',
+                         chunksize=chunk_size, usecols=None if wanted is None else lambda column: column in wanted)
+    for chunk in (chunks if chunk_size else [chunks]):
+        if columns is not None and PREVIEW_COLUMN in columns and 'content' in chunk.columns:
+            chunk[PREVIEW_COLUMN] = [make_preview(text) for text in chunk['content'].fillna('').astype(str)]
+            if 'content' not in columns:
+                chunk = chunk.drop(columns='content')
+        yield chunk
+
+
+def iter_documents(preprocessed_data_dir, columns=None, chunk_size=10000):
+    """
+    分块读取处理后的文档
+
+    参数:
+        preprocessed_data_dir (str): 预处理数据目录
+        columns (list, optional): 需要的列，可包含PREVIEW_COLUMN；不存在的列被忽略，默认全部列
+        chunk_size (int): 每块的文档数
+
+    返回:
+        generator: 与文档行对齐的DataFrame块
+    """
+    directory = os.path.join(preprocessed_data_dir, DOCUMENTS_DIR)
+    if not ColumnStore.exists(directory):
+        yield from _legacy_chunks(preprocessed_data_dir, columns, chunk_size)
+        return
+    store = ColumnStore(directory)
+    for start in range(0, len(store), chunk_size):
+        yield store.frame(columns, start, start + chunk_size)
+
+
+def load_documents(preprocessed_data_dir, columns=None):
+    """一次性读取处理后的文档，参数同iter_documents"""
+    directory = os.path.join(preprocessed_data_dir, DOCUMENTS_DIR)
+    if not ColumnStore.exists(directory):
+        return next(_legacy_chunks(preprocessed_data_dir, columns, None))
+    return ColumnStore(directory).frame(columns).reset_index(drop=True)
+
+
+def save_tfidf(output_dir, matrix, doc_ids, feature_names, idf):
+    """
+    保存TF-IDF矩阵、文档ID映射及词汇表
+
+    矩阵以不压缩的.npz保存，读取时无需反序列化；文档ID与IDF保存为可内存映射的.npy，
+    词汇表与IDF按列保存在vocabulary/下。
+    """
+    sparse.save_npz(os.path.join(output_dir, TFIDF_MATRIX_FILE), sparse.csr_matrix(matrix), compressed=False)
+    np.save(os.path.join(output_dir, DOC_IDS_FILE), np.asarray(doc_ids, dtype=np.int64))
+    write_column_store(os.path.join(output_dir, VOCABULARY_DIR),
+                       pd.DataFrame({'term': np.asarray(feature_names, dtype=object),
+                                     'idf': np.asarray(idf, dtype=np.float64)}))
+
+
+def load_tfidf(preprocessed_data_dir):
+    """
+    加载TF-IDF矩阵及文档ID映射，二进制文件不存在时回退读取旧版pickle
+
+    返回:
+        tuple: (CSR矩阵, int64文档ID数组)；没有文档ID映射时后者为None
+    """
+    matrix_path = os.path.join(preprocessed_data_dir, TFIDF_MATRIX_FILE)
+    if os.path.exists(matrix_path):
+        matrix = sparse.load_npz(matrix_path).tocsr()
+    else:
+        with open(os.path.join(preprocessed_data_dir, LEGACY_MATRIX_FILE), 'rb') as f:
+            matrix = pickle.load(f).tocsr()
+
+    doc_ids = None
+    doc_ids_path = os.path.join(preprocessed_data_dir, DOC_IDS_FILE)
+    legacy_path = os.path.join(preprocessed_data_dir, LEGACY_DOC_IDS_FILE)
+    if os.path.exists(doc_ids_path):
+        doc_ids = np.load(doc_ids_path, mmap_mode='r')
+    elif os.path.exists(legacy_path):
+        with open(legacy_path, 'rb') as f:
+            doc_ids = np.asarray(pickle.load(f), dtype=np.int64)
+    return matrix, doc_ids
+
+
+def load_vocabulary(preprocessed_data_dir):
+    """
+    加载词汇表及IDF，二进制文件不存在时回退为从旧版向量化器中读取
+
+    返回:
+        tuple: (object数组的词汇表, float64的IDF)
+    """
+    directory = os.path.join(preprocessed_data_dir, VOCABULARY_DIR)
+    if ColumnStore.exists(directory):
+        store = ColumnStore(directory)
+        return store.column('term'), np.asarray(store.column('idf'))
+    with open(os.path.join(preprocessed_data_dir, VECTORIZER_FILE), 'rb') as f:
+        vectorizer = pickle.load(f)
+    return vectorizer.get_feature_names_out(), vectorizer.idf_
+
+
+def save_duplicates(output_dir, doc_ids, content_hashes):
+    """保存去重时删除的页面的ID及内容哈希"""
+    np.savez(os.path.join(output_dir, DUPLICATES_FILE), doc_ids=np.asarray(doc_ids, dtype=np.int64),
+             hashes=np.asarray(content_hashes, dtype='S32'))
+
+
+def load_duplicates(preprocessed_data_dir):
+    """
+    加载去重时删除的页面
+
+    返回:
+        tuple: (文档ID数组, 内容哈希数组)；旧版本预处理没有记录时返回None
+    """
+    path = os.path.join(preprocessed_data_dir, DUPLICATES_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as duplicates:
+        return duplicates['doc_ids'], duplicates['hashes']
+
+
+def remove_legacy_artifacts(output_dir):
+    """删除旧版本预处理留下的CSV与pickle，避免与新的二进制文件不一致"""
+    for file_name in (LEGACY_DOCUMENTS_FILE, LEGACY_MATRIX_FILE, LEGACY_DOC_IDS_FILE):
+        path = os.path.join(output_dir, file_name)
+        if os.path.exists(path):
+            os.remove(path)
@@ -3,13 +3,24 @@ import re
 import jieba
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from scipy import sparse
 import pickle
+import hashlib
 import os
 import logging
 from datetime import datetime
 import json
 
+if __name__ == "__main__" and not __package__:
+    # 以脚本方式运行(python preprocess/preprocess.py)时，把项目根目录加入导入路径并按包内模块解析导入
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "preprocess"
+
+from .artifacts import (write_column_store, save_tfidf, save_duplicates, remove_legacy_artifacts, DOCUMENTS_DIR,
+                        VOCABULARY_DIR, TFIDF_MATRIX_FILE, DOC_IDS_FILE)
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -38,6 +49,7 @@ class ChineseDocumentPreprocessor:
         self.processed_data = None
         self.tfidf_vectorizer = None
         self.tfidf_matrix = None
+        self.simhashes = None
         
         # 创建输出目录
         if not os.path.exists(self.output_dir):
@@ -82,7 +94,7 @@ class ChineseDocumentPreprocessor:
         try:
             conn = sqlite3.connect(self.db_path)
             # 修改查询，添加id字段
-            query = "SELECT id, title, content, publish_time, source FROM pages"
+            query = "SELECT id, url, title, content, publish_time, source, pagerank, content_hash FROM pages"
             df = pd.read_sql_query(query, conn)
             conn.close()
             
@@ -166,6 +178,42 @@ class ChineseDocumentPreprocessor:
         
         return df_no_duplicates
     
+    def compute_simhash(self, segmented_texts):
+        """
+        计算每个文档的64位SimHash指纹，用于检索时折叠近似重复的结果
+        
+        参数:
+            segmented_texts (iterable): 分词后的文本，词语间用空格分隔
+            
+        返回:
+            np.ndarray: uint64指纹数组，与输入顺序对齐
+        """
+        bit_positions = np.arange(64, dtype=np.uint64)
+        token_hashes = {}
+        fingerprints = []
+        
+        for text in segmented_texts:
+            tokens = text.split() if isinstance(text, str) else []
+            if not tokens:
+                fingerprints.append(0)
+                continue
+            
+            # 以词频作为权重，每个不同的词只参与一次位运算
+            unique_tokens, counts = np.unique(tokens, return_counts=True)
+            hashes = np.empty(len(unique_tokens), dtype=np.uint64)
+            for i, token in enumerate(unique_tokens):
+                h = token_hashes.get(token)
+                if h is None:
+                    h = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+                    token_hashes[token] = h
+                hashes[i] = h
+            
+            bits = ((hashes[:, None] >> bit_positions) & np.uint64(1)).astype(np.int64)
+            votes = counts @ (2 * bits - 1)
+            fingerprints.append(int(((votes > 0).astype(np.uint64) << bit_positions).sum()))
+        
+        return np.array(fingerprints, dtype=np.uint64)
+    
     def process_data(self):
         """处理数据：清洗、分词和去重"""
         df = self.load_data()
@@ -184,6 +232,8 @@ class ChineseDocumentPreprocessor:
         # 去除重复内容的文档
         logger.info("开始去除重复内容的文档...")
         processed_df = self.remove_duplicates(processed_df)
+        duplicates = df.loc[~df.index.isin(processed_df.index)]
+        save_duplicates(self.output_dir, duplicates['doc_id'], duplicates['content_hash'].fillna(''))
         
         # 分词
         logger.info("开始分词...")
@@ -193,15 +243,113 @@ class ChineseDocumentPreprocessor:
         # 合并标题和内容用于向量化
         processed_df['combined_text'] = processed_df['segmented_title'] + ' ' + processed_df['segmented_content']
         
+        # 计算SimHash指纹（与处理后的文档行对齐）
+        logger.info("开始计算SimHash指纹...")
+        self.simhashes = self.compute_simhash(processed_df['segmented_content'])
+        np.save(f"{self.output_dir}/simhash.npy", self.simhashes)
+        
         self.processed_data = processed_df
         logger.info("数据预处理完成")
         
-        # 保存处理后的数据
-        processed_df.to_csv(f"{self.output_dir}/processed_documents.csv", index=False, encoding='utf-8')
-        logger.info(f"已保存处理后的数据至 {self.output_dir}/processed_documents.csv")
+        # 按列保存处理后的数据（combined_text可由分词后的标题和内容拼出，不再保存）
+        write_column_store(f"{self.output_dir}/{DOCUMENTS_DIR}", processed_df.drop(columns='combined_text'))
+        remove_legacy_artifacts(self.output_dir)
+        logger.info(f"已保存处理后的数据至 {self.output_dir}/{DOCUMENTS_DIR}/")
         
         return processed_df
     
+    def split_passages(self, text):
+        """
+        将文本按句切分，再组合成相互重叠、以句子为边界的段落
+        
+        参数:
+            text (str): 清洗后的文本
+            
+        返回:
+            list: (起始字符位置, 结束字符位置) 列表
+        """
+        passage_params = self.config.get('passage_params', {})
+        max_chars = passage_params.get('max_chars', 300)
+        overlap_sentences = passage_params.get('overlap_sentences', 1)
+        
+        # 句子边界：句末标点之后；超长句子按max_chars硬切分
+        sentences = []
+        for match in re.finditer(r'[^。！？；!?]+[。！？；!?]*', text):
+            start, end = match.span()
+            for piece_start in range(start, end, max_chars):
+                sentences.append((piece_start, min(piece_start + max_chars, end)))
+        
+        passages = []
+        first = 0
+        while first < len(sentences):
+            last = first
+            while last + 1 < len(sentences) and sentences[last + 1][1] - sentences[first][0] <= max_chars:
+                last += 1
+            passages.append((sentences[first][0], sentences[last][1]))
+            if last + 1 >= len(sentences):
+                break
+            # 下一段以本段末尾至多overlap_sentences个句子开头，重叠部分放不下下一句时减少重叠
+            next_first = last + 1
+            for overlap in range(min(overlap_sentences, last - first), 0, -1):
+                if sentences[last + 1][1] - sentences[last + 1 - overlap][0] <= max_chars:
+                    next_first = last + 1 - overlap
+                    break
+            first = next_first
+        
+        return passages
+    
+    def build_passages(self):
+        """
+        将文档切分为段落，供RAG检索段落级上下文使用
+        
+        输出目录passages/包含:
+            passage_text.bin     所有段落原文依次拼接的UTF-8字节
+            passage_offsets.npy  每个段落在passage_text.bin中的起止字节位置
+            passage_tokens.txt   每行一个段落的分词结果
+            passages.npz         chunk_ids(稳定的段落ID)、doc_ids(所属文档ID)、ordinals(文档内序号)
+        
+        段落ID由文档ID和段落原文哈希得到，文档内容不变时重建索引ID不变。
+        """
+        if self.processed_data is None or len(self.processed_data) == 0:
+            logger.error("没有处理过的数据可用于切分段落")
+            return
+        
+        logger.info("开始切分段落...")
+        passage_dir = f"{self.output_dir}/passages"
+        os.makedirs(passage_dir, exist_ok=True)
+        
+        chunk_ids, doc_ids, ordinals = [], [], []
+        offsets = [0]
+        with open(f"{passage_dir}/passage_text.bin", 'wb') as text_file, \
+                open(f"{passage_dir}/passage_tokens.txt", 'w', encoding='utf-8') as tokens_file:
+            for doc_id, content in zip(self.processed_data['doc_id'], self.processed_data['clean_content']):
+                seen = {}
+                for ordinal, (start, end) in enumerate(self.split_passages(content)):
+                    passage = content[start:end].strip()
+                    if not passage:
+                        continue
+                    # 同一文档内重复出现的段落以出现次数区分
+                    occurrence = seen.get(passage, 0)
+                    seen[passage] = occurrence + 1
+                    digest = hashlib.blake2b(f"{doc_id}:{occurrence}:{passage}".encode('utf-8'), digest_size=8).digest()
+                    chunk_ids.append(int.from_bytes(digest, 'little') & 0x7FFFFFFFFFFFFFFF)
+                    doc_ids.append(doc_id)
+                    ordinals.append(ordinal)
+                    
+                    encoded = passage.encode('utf-8')
+                    text_file.write(encoded)
+                    offsets.append(offsets[-1] + len(encoded))
+                    tokens_file.write(self.segment_text(passage) + '\n')
+        
+        np.save(f"{passage_dir}/passage_offsets.npy", np.array(offsets, dtype=np.int64))
+        np.savez(
+            f"{passage_dir}/passages.npz",
+            chunk_ids=np.array(chunk_ids, dtype=np.int64),
+            doc_ids=np.array(doc_ids, dtype=np.int64),
+            ordinals=np.array(ordinals, dtype=np.int32)
+        )
+        logger.info(f"段落切分完成，共{len(chunk_ids)}个段落，已保存至 {passage_dir}/")
+    
     def vectorize_documents(self):
         """
         使用TF-IDF对文档进行向量化
@@ -232,17 +380,16 @@ class ChineseDocumentPreprocessor:
         feature_names = self.tfidf_vectorizer.get_feature_names_out()
         logger.info(f"向量化完成，特征词汇量: {len(feature_names)}")
         
-        # 保存向量化结果
+        # 保存向量化器（增量索引、段落索引用它编码新文本）；stop_words_只记录被min_df/max_df过滤掉的词，
+        # 编码时用不到，去掉后体积小得多
+        if hasattr(self.tfidf_vectorizer, 'stop_words_'):
+            del self.tfidf_vectorizer.stop_words_
         with open(f"{self.output_dir}/tfidf_vectorizer.pkl", 'wb') as f:
             pickle.dump(self.tfidf_vectorizer, f)
         
-        with open(f"{self.output_dir}/tfidf_matrix.pkl", 'wb') as f:
-            pickle.dump(self.tfidf_matrix, f)
-        
-        # 保存文档ID与TF-IDF矩阵行索引的映射关系
-        doc_ids = self.processed_data['doc_id'].tolist()
-        with open(f"{self.output_dir}/doc_id_mapping.pkl", 'wb') as f:
-            pickle.dump(doc_ids, f)
+        # 保存TF-IDF矩阵、文档ID与矩阵行的映射关系及词汇表，建索引时直接读取二进制数组
+        save_tfidf(self.output_dir, self.tfidf_matrix, self.processed_data['doc_id'].to_numpy(),
+                   feature_names, self.tfidf_vectorizer.idf_)
         
         logger.info(f"已保存TF-IDF向量化结果及文档ID映射至 {self.output_dir}/")
         
@@ -257,6 +404,46 @@ class ChineseDocumentPreprocessor:
         
         return self.tfidf_matrix, self.tfidf_vectorizer
     
+    def build_rerank_features(self):
+        """
+        生成供检索二阶段重排使用的稀疏特征矩阵（行与TF-IDF矩阵对齐，列与词汇表对齐）:
+            term_positions.npz  每个词在文档(标题+内容)中首次出现的位置+1，用于词项邻近度
+            title_terms.npz     标题中是否出现该词(0/1)，用于标题匹配
+        """
+        if self.tfidf_vectorizer is None:
+            logger.error("尚未完成向量化，无法生成重排特征")
+            return
+        
+        logger.info("开始生成重排特征...")
+        vocabulary = self.tfidf_vectorizer.vocabulary_
+        analyzer = self.tfidf_vectorizer.build_analyzer()
+        
+        indptr = [0]
+        indices = []
+        positions = []
+        for text in self.processed_data['combined_text']:
+            first_seen = {}
+            for position, token in enumerate(analyzer(text)):
+                col = vocabulary.get(token)
+                if col is not None and col not in first_seen:
+                    first_seen[col] = position + 1
+            indices.extend(first_seen.keys())
+            positions.extend(first_seen.values())
+            indptr.append(len(indices))
+        
+        term_positions = sparse.csr_matrix(
+            (np.array(positions, dtype=np.int32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=self.tfidf_matrix.shape
+        )
+        term_positions.sort_indices()
+        sparse.save_npz(f"{self.output_dir}/term_positions.npz", term_positions)
+        
+        title_vectorizer = CountVectorizer(vocabulary=vocabulary, binary=True, dtype=np.int8)
+        title_terms = title_vectorizer.transform(self.processed_data['segmented_title'].fillna(''))
+        sparse.save_npz(f"{self.output_dir}/title_terms.npz", title_terms.tocsr())
+        
+        logger.info(f"已保存重排特征至 {self.output_dir}/")
+    
     def generate_document_vectors_sample(self):
         """
         生成并展示文档向量样例
@@ -325,10 +512,16 @@ class ChineseDocumentPreprocessor:
         # 1. 数据清洗和分词
         self.process_data()
         
-        # 2. TF-IDF向量化
+        # 2. 切分段落
+        self.build_passages()
+        
+        # 3. TF-IDF向量化
         self.vectorize_documents()
         
-        # 3. 生成文档向量样例
+        # 4. 生成重排特征
+        self.build_rerank_features()
+        
+        # 5. 生成文档向量样例
         self.generate_document_vectors_sample()
         
         end_time = datetime.now()
@@ -399,13 +592,19 @@ class ChineseDocumentPreprocessor:
                 "configuration": {
                     "tfidf_params": self.config.get('tfidf_params', {}),
                     "sample_size": self.config.get('sample_size', 5),
+                    "passage_params": self.config.get('passage_params', {}),
                     "stopwords_count": len(self.stopwords)
                 },
                 "output_files": {
-                    "processed_documents": f"{self.output_dir}/processed_documents.csv",
+                    "processed_documents": f"{self.output_dir}/{DOCUMENTS_DIR}/",
                     "tfidf_vectorizer": f"{self.output_dir}/tfidf_vectorizer.pkl",
-                    "tfidf_matrix": f"{self.output_dir}/tfidf_matrix.pkl",
-                    "doc_id_mapping": f"{self.output_dir}/doc_id_mapping.pkl",
+                    "tfidf_matrix": f"{self.output_dir}/{TFIDF_MATRIX_FILE}",
+                    "doc_id_mapping": f"{self.output_dir}/{DOC_IDS_FILE}",
+                    "vocabulary": f"{self.output_dir}/{VOCABULARY_DIR}/",
+                    "simhash": f"{self.output_dir}/simhash.npy",
+                    "term_positions": f"{self.output_dir}/term_positions.npz",
+                    "title_terms": f"{self.output_dir}/title_terms.npz",
+                    "passages": f"{self.output_dir}/passages/",
                     "feature_vocabulary": f"{self.output_dir}/feature_vocabulary.csv",
                     "document_vectors_sample": f"{self.output_dir}/document_vectors_sample.json"
                 }
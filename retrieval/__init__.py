@@ -1 +1,6 @@
-from .search_engine import SearchEngine
\ No newline at end of file
+from .search_engine import SearchEngine
+from .facets import FacetEngine
+from .reranker import Reranker
+from .passage_retriever import PassageRetriever
+from .fts_engine import FTSSearchEngine
+from .schema import SearchResult
\ No newline at end of file
@@ -0,0 +1,57 @@
+import re
+import numpy as np
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """
+    粗略估计文本的token数：中日韩字符及全角标点各记1个，其余字符每4个记1个
+
+    参数:
+        text (str): 文本
+
+    返回:
+        int: 估计的token数
+    """
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + -(-(len(text) - cjk) // 4)
+
+
+def maximal_marginal_relevance(relevance, vectors, k, diversity=0.3):
+    """
+    最大边际相关(MMR)选择：每一步选出 (1-diversity)*相关度 - diversity*与已选结果的最大相似度 最高的候选
+
+    参数:
+        relevance (np.ndarray): 候选与查询的相关度
+        vectors (scipy.sparse matrix): (候选数, 词汇表大小) 的L2归一化TF-IDF向量
+        k (int): 最多选出的候选数
+        diversity (float): 多样性权重，0时退化为按相关度排序
+
+    返回:
+        np.ndarray: 按选择顺序排列的候选下标
+    """
+    num_candidates = len(relevance)
+    k = min(k, num_candidates)
+    if k == 0:
+        return np.array([], dtype=np.int64)
+
+    # 候选两两之间的余弦相似度，一次稀疏矩阵乘法得到
+    similarity = np.asarray((vectors @ vectors.T).todense(), dtype=np.float32)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_relevance = relevance.max()
+    if max_relevance > 0:
+        relevance = relevance / max_relevance
+
+    selected = np.zeros(num_candidates, dtype=bool)
+    max_similarity = np.zeros(num_candidates, dtype=np.float32)
+    order = []
+    for _ in range(k):
+        gains = (1 - diversity) * relevance - diversity * max_similarity
+        gains[selected] = -np.inf
+        best = int(np.argmax(gains))
+        order.append(best)
+        selected[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return np.array(order, dtype=np.int64)
@@ -0,0 +1,99 @@
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DenseRetriever:
+    """
+    基于LSA文档向量和IVF倒排文件的近似最近邻检索
+    
+    查询TF-IDF向量经SVD投影矩阵映射到潜在语义空间，先与簇中心比较选出n_probe个
+    最近的簇，再只在这些簇的文档向量（磁盘上连续存放，内存映射读取）中精确计算内积。
+    """
+
+    def __init__(self, dense_dir):
+        """
+        参数:
+            dense_dir (str): DenseIndexBuilder的输出目录
+        """
+        self.dense_dir = dense_dir
+        self.components = None
+        self.centroids = None
+        self.list_offsets = None
+        self.embeddings = None
+        self.doc_ids = None
+        self.info = None
+
+    def load(self):
+        """加载稠密索引，目录不存在时返回False"""
+        if not os.path.exists(os.path.join(self.dense_dir, "embeddings.npy")):
+            return False
+
+        self.components = np.load(os.path.join(self.dense_dir, "components.npy"))
+        self.centroids = np.load(os.path.join(self.dense_dir, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(self.dense_dir, "list_offsets.npy"))
+        self.embeddings = np.load(os.path.join(self.dense_dir, "embeddings.npy"), mmap_mode='r')
+        self.doc_ids = np.load(os.path.join(self.dense_dir, "doc_ids.npy"))
+
+        info_file = os.path.join(self.dense_dir, "dense_info.json")
+        if os.path.exists(info_file):
+            with open(info_file, 'r', encoding='utf-8') as f:
+                self.info = json.load(f)
+
+        logger.info(f"成功加载稠密索引，{len(self.doc_ids)}篇文档，{len(self.centroids)}个簇，"
+                    f"维度{self.components.shape[0]}")
+        return True
+
+    def project(self, query_vectors):
+        """
+        将查询TF-IDF向量投影到潜在语义空间并归一化
+        
+        参数:
+            query_vectors (scipy.sparse matrix): (查询数, 词汇表大小)
+        
+        返回:
+            np.ndarray: (查询数, 维度) 的float32矩阵
+        """
+        embeddings = np.asarray(query_vectors @ self.components.T, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        return embeddings / norms[:, None]
+
+    def search(self, query_embedding, top_k=10, n_probe=8, doc_mask=None):
+        """
+        近似最近邻检索
+        
+        参数:
+            query_embedding (np.ndarray): 归一化后的查询向量
+            top_k (int): 返回的最大结果数
+            n_probe (int): 检索的簇数，越大召回越高、速度越慢
+            doc_mask (callable, optional): 接收文档ID数组、返回布尔数组的过滤函数
+        
+        返回:
+            tuple: (文档ID数组, 余弦相似度数组)，按相似度降序
+        """
+        n_probe = min(n_probe, len(self.centroids))
+        centroid_scores = self.centroids @ query_embedding
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        spans = [(self.list_offsets[c], self.list_offsets[c + 1]) for c in np.sort(probe)]
+        positions = np.concatenate([np.arange(start, end) for start, end in spans]) if spans else np.array([], dtype=np.int64)
+        if len(positions) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        doc_ids = self.doc_ids[positions]
+        if doc_mask is not None:
+            keep = doc_mask(doc_ids)
+            positions, doc_ids = positions[keep], doc_ids[keep]
+            if len(positions) == 0:
+                return doc_ids, np.array([], dtype=np.float32)
+
+        scores = np.asarray(self.embeddings[positions] @ query_embedding, dtype=np.float32)
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            doc_ids, scores = doc_ids[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return doc_ids[order], scores[order]
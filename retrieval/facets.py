@@ -0,0 +1,108 @@
+import os
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 0-255每个字节中置位的个数，用于位图的向量化popcount
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(array, axis=-1):
+    """
+    统计整数数组中置位的个数
+    
+    参数:
+        array (np.ndarray): 任意无符号整数数组
+        axis (int): uint8数组时沿该轴求和；更宽的整数按元素统计
+    
+    返回:
+        np.ndarray: 置位个数
+    """
+    if array.dtype == np.uint8:
+        return _POPCOUNT_TABLE[array].sum(axis=axis, dtype=np.int64)
+    bytes_view = np.ascontiguousarray(array)[..., None].view(np.uint8)
+    return _POPCOUNT_TABLE[bytes_view].sum(axis=-1, dtype=np.int64)
+
+
+class FacetEngine:
+    """
+    基于预计算位图的分面统计
+    
+    每个分面取值对应一个按文档行排列的位图（构建索引时生成），统计时将查询的
+    候选文档位图与所有取值位图按位与，再做popcount，一次向量化运算得到全部计数。
+    """
+
+    def __init__(self, index_dir):
+        """
+        参数:
+            index_dir (str): 倒排索引目录路径
+        """
+        self.index_dir = index_dir
+        self.bitmaps = {}  # 分面名 -> (取值数, 字节数) 的uint8位图矩阵
+        self.values = {}  # 分面名 -> 取值列表
+
+    def load(self):
+        """加载分面位图，文件不存在时返回False"""
+        bitmap_file = os.path.join(self.index_dir, "facet_bitmaps.npz")
+        values_file = os.path.join(self.index_dir, "facet_values.json")
+        if not (os.path.exists(bitmap_file) and os.path.exists(values_file)):
+            return False
+
+        with np.load(bitmap_file) as bitmaps:
+            self.bitmaps = {facet: bitmaps[facet] for facet in bitmaps.files}
+        with open(values_file, 'r', encoding='utf-8') as f:
+            self.values = json.load(f)
+
+        logger.info(f"成功加载分面位图: {', '.join(f'{k}({len(v)})' for k, v in self.values.items())}")
+        return True
+
+    def count(self, candidate_mask, facets=None, limit=None):
+        """
+        统计候选文档集合在各分面取值上的文档数
+        
+        参数:
+            candidate_mask (np.ndarray): 与文档行对齐的布尔数组，True表示文档属于结果集
+            facets (list, optional): 需要统计的分面名，默认全部
+            limit (int, optional): 每个分面最多返回的取值数
+        
+        返回:
+            dict: 分面名 -> [{'value': 取值, 'count': 文档数}, ...]，按文档数降序
+        """
+        candidate_bits = np.packbits(candidate_mask)
+        counts = {}
+
+        for facet in facets or self.bitmaps.keys():
+            if facet not in self.bitmaps:
+                logger.warning(f"未知的分面: {facet}")
+                continue
+
+            facet_counts = popcount(self.bitmaps[facet] & candidate_bits, axis=1)
+
+            nonzero = np.flatnonzero(facet_counts)
+            order = nonzero[np.argsort(-facet_counts[nonzero], kind='stable')]
+            if limit is not None:
+                order = order[:limit]
+
+            values = self.values[facet]
+            counts[facet] = [{'value': values[i], 'count': int(facet_counts[i])} for i in order]
+
+        return counts
+
+    def append_rows(self, num_rows, facet_codes):
+        """
+        为追加在现有文档行之后的新文档扩展位图（增量段）
+        
+        参数:
+            num_rows (int): 现有位图覆盖的文档行数
+            facet_codes (dict): 分面名 -> (新文档的取值编码, 取值列表)，取值列表以现有取值为前缀，-1表示缺失
+        """
+        for facet, (codes, values) in facet_codes.items():
+            if facet not in self.bitmaps:
+                continue
+            bits = np.unpackbits(self.bitmaps[facet], axis=1, count=num_rows)
+            bits = np.pad(bits, ((0, len(values) - len(bits)), (0, 0)))
+            new_bits = (codes[None, :] == np.arange(len(values))[:, None]).astype(np.uint8)
+            self.bitmaps[facet] = np.packbits(np.hstack([bits, new_bits]), axis=1)
+            self.values[facet] = list(values)
@@ -0,0 +1,144 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import List
+
+from .search_engine import SearchEngine
+from .schema import SearchResult
+
+logger = logging.getLogger(__name__)
+
+
+class FTSSearchEngine:
+    """
+    基于SQLite FTS5的检索后端，接口与SearchEngine.search一致
+
+    索引由FTSIndexBuilder构建，完全驻留在磁盘上，只有SQLite页缓存占用内存，
+    适合内存较小的部署环境，也可作为自建倒排索引的性能对比基线。
+    得分为FTS5 bm25()取负值（越大越相关），标题列权重高于正文。
+    bm25得分没有固定范围，与SearchEngine在[0,1]内的余弦得分不可比，因此忽略score_threshold。
+    """
+
+    def __init__(self, index_dir, title_weight=2.0, content_weight=1.0, cache_size_kb=8192):
+        """
+        参数:
+            index_dir (str): 索引目录路径，需包含fts.db
+            title_weight (float): bm25中标题列的权重
+            content_weight (float): bm25中正文列的权重
+            cache_size_kb (int): 每个连接的SQLite页缓存大小(KB)
+        """
+        self.index_dir = index_dir
+        self.db_path = os.path.join(index_dir, "fts.db")
+        self.title_weight = title_weight
+        self.content_weight = content_weight
+        self.cache_size_kb = cache_size_kb
+        self._local = threading.local()
+
+    def load_index(self):
+        """检查FTS5索引是否可用"""
+        if not os.path.exists(self.db_path):
+            logger.error(f"找不到FTS5索引: {self.db_path}，请先运行FTSIndexBuilder")
+            return False
+        try:
+            count = self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            logger.info(f"成功加载FTS5索引，包含{count}篇文档")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"加载FTS5索引失败: {e}")
+            return False
+
+    def _connection(self):
+        """每个线程使用各自的只读连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+            self._local.conn = conn
+        return conn
+
+    def _segment_query(self, query):
+        """查询预处理：分词"""
+        try:
+            import jieba
+            words = jieba.cut(query)
+            return [w for w in words if w.strip()]
+        except ImportError:
+            # 如果没有jieba，简单按空格分词
+            return query.split()
+
+    def _match_terms(self, query_terms):
+        """返回索引中存在的查询词（保持查询中的顺序并去重）"""
+        terms = list(dict.fromkeys(term.lower() for term in query_terms))
+        if not terms:
+            return []
+        conn = self._connection()
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.docs_vocab USING fts5vocab(main, docs_fts, 'row')")
+        placeholders = ', '.join('?' * len(terms))
+        found = {row[0] for row in conn.execute(f"SELECT term FROM docs_vocab WHERE term IN ({placeholders})", terms)}
+        return [term for term in terms if term in found]
+
+    def search(self, query, top_k=10, score_threshold=0.01, filters=None, **kwargs) -> List[SearchResult]:
+        """
+        搜索查询
+
+        参数:
+            query (str): 查询字符串
+            top_k (int): 返回的最大结果数
+            score_threshold (float): 为与SearchEngine.search接口一致而保留，bm25得分不可与之比较，忽略
+            filters (dict, optional): 过滤条件，可包含 source(str或list)、start_time、end_time
+            **kwargs: SearchEngine.search的其他参数，FTS5后端不支持，忽略
+
+        返回:
+            list: 搜索结果(SearchResult)列表
+        """
+        start_time = time.time()
+        query_terms = self._segment_query(query)
+        matched_terms = self._match_terms(query_terms)
+        if not matched_terms:
+            logger.info(f"未找到匹配的文档，查询耗时: {time.time() - start_time:.2f}秒")
+            return []
+
+        # 每个词作为短语加引号，词之间为OR，与倒排索引的累加语义一致
+        match = ' OR '.join('"' + term.replace('"', '""') + '"' for term in matched_terms)
+        sql = [
+            "SELECT d.doc_id, -bm25(docs_fts, ?, ?) AS score, d.title, d.source, d.publish_time, d.content_preview",
+            "FROM docs_fts JOIN documents d ON d.doc_id = docs_fts.rowid",
+            "WHERE docs_fts MATCH ?"
+        ]
+        params = [self.title_weight, self.content_weight, match]
+
+        if filters:
+            sources = filters.get('source')
+            if sources:
+                if isinstance(sources, str):
+                    sources = [sources]
+                sql.append(f"AND d.source IN ({', '.join('?' * len(sources))})")
+                params.extend(sources)
+            filter_start = SearchEngine._parse_filter_time(filters.get('start_time'))
+            filter_end = SearchEngine._parse_filter_time(filters.get('end_time'), end_of_day=True)
+            if filter_start is not None:
+                sql.append("AND d.publish_epoch >= ?")
+                params.append(filter_start)
+            if filter_end is not None:
+                sql.append("AND d.publish_epoch <= ?")
+                params.append(filter_end)
+
+        sql.append("ORDER BY bm25(docs_fts, ?, ?), d.doc_id DESC LIMIT ?")
+        params.extend([self.title_weight, self.content_weight, top_k])
+
+        results: List[SearchResult] = []
+        for doc_id, score, title, source, publish_time, content_preview in self._connection().execute(' '.join(sql), params):
+            results.append({
+                'doc_id': doc_id,
+                'score': score,
+                'matched_terms': matched_terms,
+                'title': title,
+                'source': source,
+                'publish_time': publish_time,
+                'content_preview': content_preview
+            })
+
+        logger.info(f"FTS5检索返回{len(results)}个结果，搜索耗时: {time.time() - start_time:.2f}秒")
+        return results
@@ -0,0 +1,107 @@
+import os
+import json
+import logging
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+class PassageRetriever:
+    """
+    段落级检索 - 在PassageIndexBuilder构建的段落倒排索引上按TF-IDF内积打分
+
+    只取查询词对应的倒排列表参与累加；段落原文以内存映射方式存放，
+    只有最终返回的段落才会被读取和解码，每次查询只读几KB。
+    """
+
+    def __init__(self, passage_dir):
+        """
+        参数:
+            passage_dir (str): PassageIndexBuilder的输出目录
+        """
+        self.passage_dir = passage_dir
+        self.postings = None
+        self.passage_vectors = None
+        self.chunk_ids = None
+        self.doc_ids = None
+        self.ordinals = None
+        self.offsets = None
+        self.text = None
+        self.info = None
+
+    def load(self):
+        """加载段落索引，目录不存在时返回False"""
+        if not os.path.exists(os.path.join(self.passage_dir, "postings.npz")):
+            return False
+
+        self.postings = sparse.load_npz(os.path.join(self.passage_dir, "postings.npz")).tocsr()
+        # 按段落组织的TF-IDF向量，用于段落之间的相似度计算
+        self.passage_vectors = self.postings.T.tocsr()
+        passages = np.load(os.path.join(self.passage_dir, "passages.npz"))
+        self.chunk_ids = passages['chunk_ids']
+        self.doc_ids = passages['doc_ids']
+        self.ordinals = passages['ordinals']
+        self.offsets = np.load(os.path.join(self.passage_dir, "passage_offsets.npy"))
+        self.text = np.memmap(os.path.join(self.passage_dir, "passage_text.bin"), dtype=np.uint8, mode='r') \
+            if self.offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+
+        info_file = os.path.join(self.passage_dir, "passages_info.json")
+        if os.path.exists(info_file):
+            with open(info_file, 'r', encoding='utf-8') as f:
+                self.info = json.load(f)
+
+        logger.info(f"成功加载段落索引，{len(self.chunk_ids)}个段落")
+        return True
+
+    def search(self, query_vector, top_k=10, doc_mask=None, max_per_doc=None):
+        """
+        检索与查询最相关的段落
+
+        参数:
+            query_vector (scipy.sparse matrix): (1, 词汇表大小) 的查询TF-IDF向量
+            top_k (int): 返回的最大段落数
+            doc_mask (callable, optional): 接收文档ID数组、返回布尔数组的过滤函数
+            max_per_doc (int, optional): 每篇文档最多返回的段落数
+
+        返回:
+            tuple: (段落下标数组, 得分数组)，按得分降序
+        """
+        query_vector = query_vector.tocsr()
+        if query_vector.nnz == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        # 只累加查询词的倒排列表
+        term_postings = self.postings[query_vector.indices]
+        scores = np.asarray(term_postings.T @ query_vector.data, dtype=np.float32).ravel()
+        candidates = np.flatnonzero(scores)
+        if doc_mask is not None and len(candidates) > 0:
+            candidates = candidates[doc_mask(self.doc_ids[candidates])]
+        if len(candidates) == 0:
+            return candidates, np.array([], dtype=np.float32)
+
+        candidate_scores = scores[candidates]
+        if max_per_doc is None and len(candidates) > top_k:
+            top = np.argpartition(-candidate_scores, top_k - 1)[:top_k]
+            candidates, candidate_scores = candidates[top], candidate_scores[top]
+        order = np.lexsort((candidates, -candidate_scores))
+        candidates, candidate_scores = candidates[order], candidate_scores[order]
+
+        if max_per_doc is not None:
+            # 按得分顺序计算每个段落在所属文档中的名次
+            parents = self.doc_ids[candidates]
+            by_doc = np.argsort(parents, kind='stable')
+            sorted_parents = parents[by_doc]
+            group_starts = np.flatnonzero(np.r_[True, sorted_parents[1:] != sorted_parents[:-1]])
+            group_sizes = np.diff(np.r_[group_starts, len(parents)])
+            rank_in_doc = np.empty(len(parents), dtype=np.int64)
+            rank_in_doc[by_doc] = np.arange(len(parents)) - np.repeat(group_starts, group_sizes)
+            keep = rank_in_doc < max_per_doc
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+
+        return candidates[:top_k], candidate_scores[:top_k]
+
+    def passage_text(self, index):
+        """读取单个段落的原文"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return bytes(self.text[start:end]).decode('utf-8')
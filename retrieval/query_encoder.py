@@ -0,0 +1,79 @@
+import os
+import re
+import logging
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEncoder:
+    """
+    查询编码器 - 用索引保存的词汇表和IDF权重把查询编码为TF-IDF向量
+    
+    与预处理阶段TfidfVectorizer的默认设置保持一致：jieba分词后以空格拼接，
+    小写化并按 (?u)\\b\\w\\w+\\b 抽取词语，词频乘IDF后做L2归一化。
+    """
+
+    TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+    def __init__(self, index_dir):
+        """
+        参数:
+            index_dir (str): 倒排索引目录路径，需包含vocabulary.txt和idf.npy
+        """
+        self.index_dir = index_dir
+        self.vocabulary = None  # 词语 -> 列号
+        self.idf = None
+
+    def load(self):
+        """加载词汇表与IDF权重，文件不存在时返回False"""
+        vocab_file = os.path.join(self.index_dir, "vocabulary.txt")
+        idf_file = os.path.join(self.index_dir, "idf.npy")
+        if not (os.path.exists(vocab_file) and os.path.exists(idf_file)):
+            return False
+
+        with open(vocab_file, 'r', encoding='utf-8') as f:
+            self.vocabulary = {line.rstrip('\n'): i for i, line in enumerate(f)}
+        self.idf = np.load(idf_file).astype(np.float32)
+
+        if len(self.vocabulary) != len(self.idf):
+            logger.warning("词汇表与IDF权重长度不一致，查询编码不可用")
+            return False
+        return True
+
+    @property
+    def dimension(self):
+        return len(self.idf)
+
+    def analyze(self, query_terms):
+        """将分词结果转换为词汇表中的列号列表（与TfidfVectorizer的分析器一致）"""
+        text = ' '.join(query_terms).lower()
+        return [self.vocabulary[token] for token in self.TOKEN_PATTERN.findall(text) if token in self.vocabulary]
+
+    def encode(self, query_terms_list):
+        """
+        批量编码查询
+        
+        参数:
+            query_terms_list (list): 每个元素是一个查询的分词结果
+        
+        返回:
+            scipy.sparse.csr_matrix: (查询数, 词汇表大小) 的L2归一化TF-IDF矩阵
+        """
+        rows, cols = [], []
+        for i, query_terms in enumerate(query_terms_list):
+            term_cols = self.analyze(query_terms)
+            rows.extend([i] * len(term_cols))
+            cols.extend(term_cols)
+
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(query_terms_list), self.dimension)
+        )
+        counts.sum_duplicates()
+        matrix = counts @ sparse.diags(self.idf)
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix, dtype=np.float32)
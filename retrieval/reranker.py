@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import logging
+import numpy as np
+from scipy import sparse
+
+from index.inverted_index import MISSING_TIME
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    二阶段重排器 - 对一阶段的前若干候选计算更丰富的特征，用线性模型重新打分
+    
+    特征(每列归一化到[0, 1]左右):
+        first_stage   一阶段得分 / 候选中的最高分
+        cosine        查询与文档完整TF-IDF向量的余弦相似度
+        proximity     命中查询词在文档中首次出现位置的紧凑程度
+        title_match   查询词在标题中出现的比例
+        pagerank      PageRank / 全库最高PageRank
+        freshness     按发布时间的指数衰减，缺失时间为0
+    
+    所有候选的特征组成 (候选数, 特征数) 的矩阵，与权重向量做一次矩阵乘法得到重排得分。
+    权重可通过索引目录下的rerank_model.json覆盖: {"weights": {特征名: 权重}, "bias": 0.0}
+    """
+
+    FEATURES = ['first_stage', 'cosine', 'proximity', 'title_match', 'pagerank', 'freshness']
+    DEFAULT_WEIGHTS = {
+        'first_stage': 0.45,
+        'cosine': 0.30,
+        'proximity': 0.10,
+        'title_match': 0.10,
+        'pagerank': 0.03,
+        'freshness': 0.02
+    }
+
+    def __init__(self, index_dir, doc_columns=None, freshness_half_life_days=365):
+        """
+        参数:
+            index_dir (str): 倒排索引目录路径
+            doc_columns (dict, optional): 与文档行对齐的列(pagerank、publish_epoch)
+            freshness_half_life_days (float): 新鲜度特征的半衰期(天)
+        """
+        self.index_dir = index_dir
+        self.doc_columns = doc_columns or {}
+        self.freshness_half_life_days = freshness_half_life_days
+
+        self.doc_vectors = None
+        self.term_positions = None
+        self.title_terms = None
+        self.weights = np.array([self.DEFAULT_WEIGHTS[name] for name in self.FEATURES], dtype=np.float32)
+        self.bias = 0.0
+
+    def load(self):
+        """加载文档向量、重排特征和模型权重；没有文档向量时返回False"""
+        doc_vectors_file = os.path.join(self.index_dir, "doc_vectors.npz")
+        if not os.path.exists(doc_vectors_file):
+            return False
+
+        self.doc_vectors = sparse.load_npz(doc_vectors_file).tocsr()
+
+        positions_file = os.path.join(self.index_dir, "term_positions.npz")
+        if os.path.exists(positions_file):
+            self.term_positions = sparse.load_npz(positions_file).tocsr()
+
+        title_file = os.path.join(self.index_dir, "title_terms.npz")
+        if os.path.exists(title_file):
+            self.title_terms = sparse.load_npz(title_file).tocsr()
+
+        model_file = os.path.join(self.index_dir, "rerank_model.json")
+        if os.path.exists(model_file):
+            with open(model_file, 'r', encoding='utf-8') as f:
+                model = json.load(f)
+            weights = {**self.DEFAULT_WEIGHTS, **model.get('weights', {})}
+            self.weights = np.array([weights[name] for name in self.FEATURES], dtype=np.float32)
+            self.bias = float(model.get('bias', 0.0))
+            logger.info(f"成功加载重排模型权重: {weights}")
+
+        return True
+
+    def append_rows(self, doc_vectors):
+        """
+        为追加在现有文档行之后的新文档（增量段）扩展文档向量；
+        新文档没有词项位置和标题特征，以空行补齐，这两项特征取0
+        """
+        self.doc_vectors = sparse.vstack([self.doc_vectors, doc_vectors], format='csr')
+        for name in ('term_positions', 'title_terms'):
+            feature = getattr(self, name)
+            if feature is not None:
+                padding = sparse.csr_matrix((doc_vectors.shape[0], feature.shape[1]), dtype=feature.dtype)
+                setattr(self, name, sparse.vstack([feature, padding], format='csr'))
+
+    def features(self, rows, first_stage_scores, query_vector):
+        """
+        计算候选文档的特征矩阵
+        
+        参数:
+            rows (np.ndarray): 候选文档行号
+            first_stage_scores (np.ndarray): 一阶段得分
+            query_vector (scipy.sparse matrix): (1, 词汇表大小) 的查询TF-IDF向量
+        
+        返回:
+            np.ndarray: (候选数, 特征数) 的float32特征矩阵
+        """
+        features = np.zeros((len(rows), len(self.FEATURES)), dtype=np.float32)
+        if len(rows) == 0:
+            return features
+
+        max_score = first_stage_scores.max()
+        features[:, 0] = first_stage_scores / max_score if max_score > 0 else 0
+
+        # 完整TF-IDF向量的余弦相似度（两侧均已L2归一化）
+        features[:, 1] = (self.doc_vectors[rows] @ query_vector.T).toarray().ravel()
+
+        query_cols = np.unique(query_vector.indices)
+        if len(query_cols) > 0:
+            # 词项邻近度：命中词首次出现位置的跨度越接近命中词数越紧凑
+            if self.term_positions is not None and len(query_cols) > 1:
+                positions = self.term_positions[rows][:, query_cols].toarray().astype(np.float32)
+                present = positions > 0
+                hits = present.sum(axis=1)
+                span = np.where(present, positions, -np.inf).max(axis=1) - np.where(present, positions, np.inf).min(axis=1)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    features[:, 2] = np.where(hits > 1, (hits - 1) / np.maximum(span, 1), 0)
+
+            # 标题匹配：查询词在标题中出现的比例
+            if self.title_terms is not None:
+                title_hits = np.asarray(self.title_terms[rows][:, query_cols].sum(axis=1)).ravel()
+                features[:, 3] = title_hits / len(query_cols)
+
+        pagerank = self.doc_columns.get('pagerank')
+        if pagerank is not None and len(pagerank) > 0 and pagerank.max() > 0:
+            features[:, 4] = pagerank[rows] / pagerank.max()
+
+        publish_epoch = self.doc_columns.get('publish_epoch')
+        if publish_epoch is not None:
+            epochs = publish_epoch[rows]
+            valid = epochs != MISSING_TIME
+            age_days = np.maximum(time.time() - epochs[valid], 0) / 86400
+            features[valid, 5] = np.exp2(-age_days / self.freshness_half_life_days)
+
+        return features
+
+    def rerank(self, rows, first_stage_scores, query_vector):
+        """
+        对候选文档重新打分并排序
+        
+        返回:
+            tuple: (按重排得分降序的行号, 重排得分, 对应的一阶段得分)
+        """
+        scores = self.features(rows, first_stage_scores, query_vector) @ self.weights + self.bias
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order], first_stage_scores[order]
@@ -0,0 +1,77 @@
+import math
+from typing import List, Optional, TypedDict
+
+import numpy as np
+
+
+class SearchResult(TypedDict, total=False):
+    """
+    搜索结果的固定结构：所有取值都是Python原生类型，缺失值为None，可直接序列化为严格JSON
+
+    doc_id至content_preview为每条结果都有的字段，其余字段只由对应的检索方式附加。
+    """
+    doc_id: int
+    score: float
+    matched_terms: List[str]
+    title: Optional[str]
+    source: Optional[str]
+    publish_time: Optional[str]
+    content_preview: Optional[str]
+    # 二阶段重排前的一阶段得分
+    first_stage_score: float
+    # 折叠掉的近似重复数
+    near_duplicates: int
+    # 混合检索中两路的名次(从1开始)，未召回为None
+    lexical_rank: Optional[int]
+    dense_rank: Optional[int]
+    # 段落级检索命中的段落
+    chunk_id: int
+    ordinal: int
+    text: str
+    # build_context中引用的编号
+    citation: int
+
+
+class SearchSummary(TypedDict):
+    """iter_search(summary=True)在全部结果之后产出的汇总"""
+    done: bool
+    total: int
+    suggestion: Optional[dict]
+
+
+def to_native(value):
+    """
+    将NumPy/pandas标量转换为Python原生类型，NaN、NaT等缺失值转换为None
+    
+    参数:
+        value: 任意标量
+        
+    返回:
+        Python原生类型的值
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if value != value:  # pandas的NaT/NA
+        return None
+    return value
+
+
+def shape_metadata(document_metadata):
+    """
+    将以doc_id为索引的文档元数据表预先转换为 {doc_id: {列名: 原生类型取值}}，
+    检索时组装结果只需一次字典查找，不再逐条调用DataFrame.loc
+    
+    参数:
+        document_metadata (pd.DataFrame): 以doc_id为索引的元数据
+        
+    返回:
+        dict: 文档ID -> 元数据字典
+    """
+    columns = list(document_metadata.columns)
+    doc_ids = [int(doc_id) for doc_id in document_metadata.index]
+    values = [[to_native(v) for v in document_metadata[col].tolist()] for col in columns]
+    return {doc_id: dict(zip(columns, row)) for doc_id, row in zip(doc_ids, zip(*values))}
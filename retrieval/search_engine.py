@@ -4,8 +4,29 @@ import pandas as pd
 import logging
 import time
 import json
-from collections import defaultdict
-import heapq
+from collections import Counter
+from typing import Iterator, List, Union
+from scipy import sparse
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == "__main__" and not __package__:
+    # 以脚本方式运行(python retrieval/search_engine.py)时，把项目根目录加入导入路径并按包内模块解析导入
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "retrieval"
+
+from index.inverted_index import parse_publish_time, MISSING_TIME
+from index.postings import load_postings, PostingsView
+from index.codec import load_compressed_postings, CompressedPostings
+from index.segments import load_segments, segments_dir, read_tombstones, BASE_SEGMENT
+from .facets import FacetEngine, popcount
+from .query_encoder import QueryEncoder
+from .dense_retriever import DenseRetriever
+from .reranker import Reranker
+from .passage_retriever import PassageRetriever
+from .context import maximal_marginal_relevance, estimate_tokens
+from .spelling import SpellingCorrector
+from .schema import SearchResult, SearchSummary, shape_metadata
 
 # 设置日志
 logging.basicConfig(
@@ -15,6 +36,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 折叠近似重复时候选池的上限，避免大量模板化重复页面使候选池无限扩大
+MAX_COLLAPSE_POOL = 8192
+# 按站点多样化结果的方式
+DIVERSIFY_METHODS = ('cap', 'xquad')
+
 class SearchEngine:
     """
     基于倒排索引的搜索引擎
@@ -31,17 +57,33 @@ class SearchEngine:
         self.inverted_index = None
         self.doc_lengths = None
         self.document_metadata = None
+        self.metadata_lookup = None  # 文档ID -> 原生类型的元数据字典
         self.vocabulary = None
         self.metadata = None
+        self.doc_ids = None  # 矩阵行号 -> 原始文档ID
+        self.term_ids = None  # 词条 -> 倒排矩阵行号
+        self.postings_matrix = None  # 倒排矩阵(词条×文档行)，用于向量化打分；压缩倒排时只含增量段的条目
+        self._doc_id_order = None  # doc_ids的排序下标，用于文档ID到行号的映射
+        self.live_rows = None  # 与文档行对齐的未删除掩码，没有删除标记时为None
+        self.base_rows = 0  # 基础索引的文档行数，其后是增量段的文档行
+        self.doc_columns = None  # 与文档行对齐的过滤列
+        self.column_dictionaries = {}  # 字典编码列的取值表
+        self.source_lookup = {}  # 来源取值 -> 字典编码
+        self.facet_engine = None  # 分面统计（可选）
+        self.simhashes = None  # 与文档行对齐的SimHash指纹（可选）
+        self.neighbor_ids = None  # 预计算的相似文档表（可选）
+        self.neighbor_scores = None
+        self.neighbor_lookup = {}  # 文档ID -> 相似文档表行号
+        self.query_encoder = None  # 查询TF-IDF编码器（可选）
+        self.dense_retriever = None  # LSA稠密检索（可选）
+        self.reranker = None  # 二阶段重排（可选）
+        self.passage_retriever = None  # 段落级检索（可选）
+        self.spelling_corrector = None  # 拼写纠错（可选）
+        self._executor = None  # 混合检索两路并行使用的线程池
 
     def load_index(self):
         """加载倒排索引及相关数据"""
         try:
-            # 加载倒排索引
-            index_file = os.path.join(self.index_dir, "inverted_index.json")
-            with open(index_file, 'r', encoding='utf-8') as f:
-                self.inverted_index = json.load(f)
-
             # 加载文档长度（可选）
             doc_lengths_file = os.path.join(self.index_dir, "doc_lengths.npy")
             if os.path.exists(doc_lengths_file):
@@ -56,6 +98,7 @@ class SearchEngine:
                     # 检查是否有doc_id列，如果有，将其设为索引
                     if 'doc_id' in self.document_metadata.columns:
                         self.document_metadata.set_index('doc_id', inplace=True)
+                    self.metadata_lookup = shape_metadata(self.document_metadata)
                     logger.info(f"成功加载文档元数据，包含{len(self.document_metadata)}行")
                 except Exception as e:
                     logger.warning(f"加载文档元数据失败: {e}，将使用简化结果展示")
@@ -72,6 +115,69 @@ class SearchEngine:
                 with open(vocab_file, 'r', encoding='utf-8') as f:
                     self.vocabulary = [line.strip() for line in f.readlines()]
 
+            # 加载文档ID映射（可选）
+            doc_id_map_file = os.path.join(self.index_dir, "doc_id_mapping.json")
+            if os.path.exists(doc_id_map_file):
+                with open(doc_id_map_file, 'r', encoding='utf-8') as f:
+                    self.doc_ids = np.asarray(json.load(f), dtype=np.int64)
+
+            # 加载倒排索引
+            self._load_postings()
+
+            # 加载文档过滤列（可选）
+            doc_columns_file = os.path.join(self.index_dir, "doc_columns.npz")
+            if os.path.exists(doc_columns_file):
+                with np.load(doc_columns_file) as columns:
+                    self.doc_columns = {name: columns[name] for name in columns.files}
+                with open(os.path.join(self.index_dir, "doc_columns_dict.json"), 'r', encoding='utf-8') as f:
+                    self.column_dictionaries = json.load(f)
+                self.source_lookup = {
+                    value: code for code, value in enumerate(self.column_dictionaries.get('source', []))
+                }
+
+            # 加载SimHash指纹（可选）
+            simhash_file = os.path.join(self.index_dir, "simhash.npy")
+            if os.path.exists(simhash_file):
+                self.simhashes = np.load(simhash_file)
+
+            # 加载相似文档表（可选）
+            neighbors_file = os.path.join(self.index_dir, "neighbors.npz")
+            if os.path.exists(neighbors_file):
+                with np.load(neighbors_file) as neighbors:
+                    self.neighbor_ids = neighbors['neighbor_ids']
+                    self.neighbor_scores = neighbors['neighbor_scores']
+                    self.neighbor_lookup = {int(doc_id): row for row, doc_id in enumerate(neighbors['doc_ids'])}
+
+            # 加载查询编码器与稠密索引（可选）
+            query_encoder = QueryEncoder(self.index_dir)
+            if query_encoder.load():
+                self.query_encoder = query_encoder
+                dense_retriever = DenseRetriever(os.path.join(self.index_dir, "dense"))
+                if dense_retriever.load():
+                    self.dense_retriever = dense_retriever
+                reranker = Reranker(self.index_dir, self.doc_columns)
+                if reranker.load():
+                    self.reranker = reranker
+                passage_retriever = PassageRetriever(os.path.join(self.index_dir, "passages"))
+                if passage_retriever.load():
+                    self.passage_retriever = passage_retriever
+
+            # 加载拼写纠错索引（可选）
+            spelling_corrector = SpellingCorrector(self.index_dir)
+            if spelling_corrector.load(self.vocabulary):
+                self.spelling_corrector = spelling_corrector
+
+            # 加载分面位图（可选）
+            facet_engine = FacetEngine(self.index_dir)
+            if facet_engine.load():
+                self.facet_engine = facet_engine
+
+            # 检查与文档行对齐的数据与倒排是否属于同一次构建
+            self._check_row_alignment()
+
+            # 加载增量段（可选）
+            self._load_segments()
+
             logger.info(f"成功加载倒排索引，包含{len(self.inverted_index)}个词条")
             if self.metadata:
                 logger.info(f"文档数量: {self.metadata.get('total_documents', '未知')}")
@@ -83,94 +189,1063 @@ class SearchEngine:
             logger.error(traceback.format_exc())
             return False
 
-    def search(self, query, top_k=10, score_threshold=0.01):
+    def _load_postings(self):
         """
-        搜索查询
+        加载倒排索引：优先内存映射压缩倒排，其次内存映射二进制倒排数组，都没有时读取inverted_index.json
+        """
+        num_terms = len(self.vocabulary) if self.vocabulary is not None else -1
+        compressed = load_compressed_postings(self.index_dir)
+        if compressed is not None and len(compressed["term_blocks"]) == num_terms + 1:
+            if self.doc_ids is None:
+                block_first = compressed["block_first"]
+                self._default_doc_ids(int(block_first.max()) + 1 if len(block_first) else 0)
+            self._doc_id_order = np.argsort(self.doc_ids, kind='stable')
+
+            # 倒排条目在打分时按词条解码；postings_matrix只用于容纳增量段的条目
+            self.inverted_index = CompressedPostings(self.vocabulary, compressed, self.doc_ids)
+            self.term_ids = self.inverted_index.term_ids
+            self.postings_matrix = sparse.csr_matrix((len(self.vocabulary), len(self.doc_ids)), dtype=np.float32)
+            return
+
+        postings = load_postings(self.index_dir)
+        if postings is not None and len(postings[0]) == num_terms + 1:
+            indptr, rows, weights = postings
+            if self.doc_ids is None:
+                self._default_doc_ids(int(rows.max()) + 1 if len(rows) else 0)
+            self._doc_id_order = np.argsort(self.doc_ids, kind='stable')
+
+            self.inverted_index = PostingsView(self.vocabulary, indptr, rows, weights, self.doc_ids)
+            self.term_ids = self.inverted_index.term_ids
+            self.postings_matrix = sparse.csr_matrix(
+                (weights, rows, indptr), shape=(len(self.vocabulary), len(self.doc_ids))
+            )
+            return
+
+        index_file = os.path.join(self.index_dir, "inverted_index.json")
+        with open(index_file, 'r', encoding='utf-8') as f:
+            self.inverted_index = json.load(f)
+        self._build_postings_matrix()
+
+    def _check_row_alignment(self):
+        """
+        检查与文档行对齐的数据与加载的倒排是否属于同一次构建：doc_order.npy须与元数据中的文档重排记录
+        同时存在且行数相同，各数组的行数须与文档ID映射一致。不一致时不使用这些数据，
+        避免过滤、折叠、分面和重排作用在错误的文档上。
+        """
+        num_rows = len(self.doc_ids)
+        doc_order_file = os.path.join(self.index_dir, "doc_order.npy")
+        doc_order = np.load(doc_order_file, mmap_mode='r') if os.path.exists(doc_order_file) else None
+        reordered = bool((self.metadata or {}).get('doc_reordering'))
+        if (doc_order is not None) != reordered or (doc_order is not None and len(doc_order) != num_rows):
+            logger.warning("doc_order.npy与倒排索引不属于同一次构建，忽略与文档行对齐的过滤列、指纹、分面和重排数据")
+            self.doc_lengths = self.doc_columns = self.simhashes = self.facet_engine = self.reranker = None
+            self.column_dictionaries, self.source_lookup = {}, {}
+            return
+
+        if self.doc_lengths is not None and len(self.doc_lengths) != num_rows:
+            logger.warning("文档长度与倒排索引的文档数不一致，已忽略")
+            self.doc_lengths = None
+        if self.doc_columns is not None and any(len(column) != num_rows for column in self.doc_columns.values()):
+            logger.warning("过滤列与倒排索引的文档数不一致，已忽略")
+            self.doc_columns, self.column_dictionaries, self.source_lookup = None, {}, {}
+            # 重排特征使用同一份过滤列
+            self.reranker = None
+        if self.simhashes is not None and len(self.simhashes) != num_rows:
+            logger.warning("SimHash指纹与倒排索引的文档数不一致，已忽略")
+            self.simhashes = None
+        if self.reranker is not None and self.reranker.doc_vectors.shape[0] != num_rows:
+            logger.warning("重排用的文档向量与倒排索引的文档数不一致，已忽略")
+            self.reranker = None
+        if self.facet_engine is not None and any(bitmaps.shape[1] != (num_rows + 7) // 8
+                                                 for bitmaps in self.facet_engine.bitmaps.values()):
+            logger.warning("分面位图与倒排索引的文档数不一致，已忽略")
+            self.facet_engine = None
+
+    def _default_doc_ids(self, num_rows):
+        """没有文档ID映射时，构建索引时使用的就是矩阵行号"""
+        num_docs = (self.metadata or {}).get('total_documents')
+        self.doc_ids = np.arange(num_rows if num_docs is None else num_docs, dtype=np.int64)
+
+    def _term_postings(self, term_id):
+        """
+        一个词条的倒排表
+
+        返回:
+            tuple: (文档行号, 权重)；压缩倒排时为解码后的基础索引条目加上增量段的条目
+        """
+        indptr = self.postings_matrix.indptr
+        start, end = indptr[term_id], indptr[term_id + 1]
+        rows = self.postings_matrix.indices[start:end]
+        weights = self.postings_matrix.data[start:end]
+        if isinstance(self.inverted_index, CompressedPostings):
+            base_rows, base_weights = self.inverted_index.decode(term_id)
+            if end > start:
+                return np.concatenate([base_rows, rows]), np.concatenate([base_weights, weights])
+            return base_rows, base_weights
+        return rows, weights
+
+    def _postings_rows(self, term_ids):
+        """取出若干词条的倒排行，得到(词条数×文档行)的CSR子矩阵"""
+        if not isinstance(self.inverted_index, CompressedPostings):
+            return self.postings_matrix[term_ids]
+        postings = [self._term_postings(term_id) for term_id in term_ids]
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows, _ in postings], out=indptr[1:])
+        rows = np.concatenate([rows for rows, _ in postings]) if postings else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate([weights for _, weights in postings]) if postings else np.zeros(0, dtype=np.float32)
+        return sparse.csr_matrix((weights, rows, indptr), shape=(len(postings), len(self.doc_ids)))
+
+    def _build_postings_matrix(self):
+        """将倒排表转换为CSR稀疏矩阵(词条×文档行)，供批量查询做向量化打分"""
+        terms = list(self.inverted_index.keys())
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+
+        lengths = np.fromiter((len(postings) for postings in self.inverted_index.values()),
+                              dtype=np.int64, count=len(terms))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        flat = np.array([posting for postings in self.inverted_index.values() for posting in postings],
+                        dtype=np.float64).reshape(-1, 2)
+        posting_doc_ids = flat[:, 0].astype(np.int64)
+
+        if self.doc_ids is None:
+            self._default_doc_ids(int(posting_doc_ids.max()) + 1 if len(posting_doc_ids) else 0)
+
+        self._doc_id_order = np.argsort(self.doc_ids, kind='stable')
+        rows = self._rows_for_doc_ids(posting_doc_ids)
+        weights = flat[:, 1].astype(np.float32)
+
+        # 文档ID映射中没有的文档（行号为-1）不能作为CSR列下标，丢弃这些条目并重建indptr
+        valid = rows >= 0
+        if not valid.all():
+            logger.warning(f"倒排表中有{int((~valid).sum())}个条目的文档不在文档ID映射中，已忽略")
+            term_of_entry = np.repeat(np.arange(len(terms)), lengths)
+            np.cumsum(np.bincount(term_of_entry[valid], minlength=len(terms)), out=indptr[1:])
+            rows, weights = rows[valid], weights[valid]
+
+        self.postings_matrix = sparse.csr_matrix(
+            (weights, rows.astype(np.int32), indptr),
+            shape=(len(terms), len(self.doc_ids))
+        )
+
+    @staticmethod
+    def _encode_values(values, raw_values):
+        """按已有取值表编码，新取值追加到取值表末尾；None编码为-1"""
+        lookup = {value: code for code, value in enumerate(values)}
+        codes = np.empty(len(raw_values), dtype=np.int32)
+        for i, value in enumerate(raw_values):
+            if value is None:
+                codes[i] = -1
+                continue
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(values)
+                values.append(value)
+            codes[i] = code
+        return codes
+
+    def _load_segments(self):
+        """
+        加载增量索引段：各段的文档行依次追加在基础索引之后，与文档行对齐的数据随之扩展；
+        再读取各段的删除位图，得到与全部文档行对齐的未删除掩码
+        """
+        self.base_rows = len(self.doc_ids)
+        if not os.path.exists(segments_dir(self.index_dir)):
+            return
+        named_segments = load_segments(self.index_dir, len(self.vocabulary or []))
+        if named_segments and not isinstance(self.inverted_index, PostingsView):
+            logger.warning("基础索引没有二进制倒排数组，无法加载增量段")
+            named_segments = []
+
+        base_rows = len(self.doc_ids)
+        deleted = np.concatenate([read_tombstones(self.index_dir, BASE_SEGMENT, base_rows)] + [
+            read_tombstones(self.index_dir, name, len(segment)) for name, segment in named_segments
+        ])
+        self.live_rows = ~deleted if deleted.any() else None
+        if not named_segments:
+            if self.live_rows is not None:
+                logger.info(f"基础索引中{int(deleted.sum())}篇文档已删除")
+            return
+
+        segments = [segment for _, segment in named_segments]
+        doc_ids = np.concatenate([self.doc_ids] + [segment.doc_ids for segment in segments])
+        matrix = sparse.hstack([self.postings_matrix] + [segment.matrix.T for segment in segments], format='csr')
+        self.postings_matrix = matrix
+        self.doc_ids = doc_ids
+        # 同一文档ID的多行中最新的一行排在前面，按文档ID查行号时得到最新版本
+        self._doc_id_order = np.lexsort((-np.arange(len(doc_ids)), doc_ids))
+        if isinstance(self.inverted_index, CompressedPostings):
+            # 压缩的基础倒排保持不变，增量段的条目留在postings_matrix中，打分时拼接
+            self.inverted_index.doc_ids = doc_ids
+            nonempty = np.diff(self.inverted_index.indptr) + np.diff(matrix.indptr) > 0
+            self.term_ids = {self.vocabulary[i]: int(i) for i in np.flatnonzero(nonempty)}
+        else:
+            self.inverted_index = PostingsView(self.vocabulary, matrix.indptr, matrix.indices, matrix.data, doc_ids)
+            self.term_ids = self.inverted_index.term_ids
+
+        if self.doc_columns is not None:
+            for name in ('source', 'host'):
+                if f"{name}_codes" in self.doc_columns:
+                    values = self.column_dictionaries.setdefault(name, [])
+                    self.doc_columns[f"{name}_codes"] = np.concatenate([self.doc_columns[f"{name}_codes"]] + [
+                        self._encode_values(values, segment.decoded_column(name)) for segment in segments
+                    ])
+            self.source_lookup = {
+                value: code for code, value in enumerate(self.column_dictionaries.get('source', []))
+            }
+            for name, missing in (('publish_epoch', MISSING_TIME), ('pagerank', 0)):
+                if name in self.doc_columns:
+                    self.doc_columns[name] = np.concatenate([self.doc_columns[name]] + [
+                        segment.columns.get(name, np.full(len(segment), missing, dtype=self.doc_columns[name].dtype))
+                        for segment in segments
+                    ])
+
+        if self.simhashes is not None:
+            self.simhashes = np.concatenate([self.simhashes] + [
+                segment.simhashes if segment.simhashes is not None else np.zeros(len(segment), dtype=np.uint64)
+                for segment in segments
+            ])
+
+        for segment in segments:
+            if segment.metadata is not None:
+                if self.metadata_lookup is None:
+                    self.metadata_lookup = {}
+                self.metadata_lookup.update(shape_metadata(segment.metadata))
+
+        if self.reranker is not None:
+            self.reranker.append_rows(sparse.vstack([segment.matrix for segment in segments], format='csr'))
+
+        if self.facet_engine is not None and self.doc_columns is not None:
+            new_rows = slice(base_rows, len(doc_ids))
+            facet_codes = {}
+            if 'source' in self.facet_engine.values:
+                facet_codes['source'] = (self.doc_columns['source_codes'][new_rows],
+                                         self.column_dictionaries.get('source', []))
+            if 'month' in self.facet_engine.values:
+                publish_epoch = self.doc_columns['publish_epoch'][new_rows]
+                valid = publish_epoch != MISSING_TIME
+                months = np.full(len(publish_epoch), None, dtype=object)
+                months[valid] = pd.to_datetime(publish_epoch[valid], unit='s').strftime('%Y-%m')
+                month_values = list(self.facet_engine.values['month'])
+                facet_codes['month'] = (self._encode_values(month_values, months), month_values)
+            self.facet_engine.append_rows(base_rows, facet_codes)
+
+        logger.info(f"成功加载{len(segments)}个增量段，共{len(doc_ids) - base_rows}篇文档，"
+                    f"{int(deleted.sum())}行已删除")
+        if self.dense_retriever is not None or self.passage_retriever is not None or self.neighbor_ids is not None:
+            logger.info("稠密检索、段落检索和相似文档只覆盖基础索引，不返回增量段中新增或更新的文档")
+
+    def _rows_for_doc_ids(self, doc_ids):
+        """将原始文档ID批量映射为矩阵行号，不在索引中的文档返回-1"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        if len(self.doc_ids) == 0:
+            return np.full(len(doc_ids), -1, dtype=np.int64)
+        positions = np.searchsorted(self.doc_ids, doc_ids, sorter=self._doc_id_order)
+        rows = self._doc_id_order[np.minimum(positions, len(self.doc_ids) - 1)]
+        return np.where(self.doc_ids[rows] == doc_ids, rows, -1)
+
+    def _segment_query(self, query):
+        """查询预处理：分词"""
+        try:
+            import jieba
+            words = jieba.cut(query)
+            return [w for w in words if w.strip()]
+        except ImportError:
+            # 如果没有jieba，简单按空格分词
+            return query.split()
+
+    def _format_result(self, doc_id, score, matched_terms) -> SearchResult:
+        """组装单条搜索结果，并附加预先整理好的文档元数据"""
+        result: SearchResult = {
+            'doc_id': doc_id,
+            'score': score,
+            'matched_terms': matched_terms
+        }
+
+        if self.metadata_lookup is not None:
+            metadata = self.metadata_lookup.get(doc_id)
+            if metadata is not None:
+                result.update(metadata)
+            else:
+                logger.warning(f"在元数据中找不到文档ID {doc_id}")
+
+        return result
+
+    def _build_filter_mask(self, filters):
+        """
+        将过滤条件转换为与文档行对齐的布尔掩码，已删除的文档行总是被过滤
+        
+        参数:
+            filters (dict): 可包含 source(str或list)、start_time、end_time(日期字符串或时间戳)
+        
+        返回:
+            np.ndarray: 布尔掩码；没有有效过滤条件且没有已删除的文档时返回None
+        """
+        if not filters:
+            return self.live_rows
+
+        mask = np.ones(len(self.doc_ids), dtype=bool) if self.live_rows is None else self.live_rows.copy()
+        applied = self.live_rows is not None
+
+        sources = filters.get('source')
+        if sources:
+            if isinstance(sources, str):
+                sources = [sources]
+            if self.doc_columns is None:
+                logger.warning("索引中没有过滤列，忽略来源过滤条件")
+            else:
+                codes = [self.source_lookup[s] for s in sources if s in self.source_lookup]
+                mask &= np.isin(self.doc_columns['source_codes'], codes)
+                applied = True
+
+        start_time = self._parse_filter_time(filters.get('start_time'))
+        end_time = self._parse_filter_time(filters.get('end_time'), end_of_day=True)
+        if start_time is not None or end_time is not None:
+            if self.doc_columns is None:
+                logger.warning("索引中没有过滤列，忽略时间过滤条件")
+            else:
+                publish_epoch = self.doc_columns['publish_epoch']
+                mask &= publish_epoch != MISSING_TIME
+                if start_time is not None:
+                    mask &= publish_epoch >= start_time
+                if end_time is not None:
+                    mask &= publish_epoch <= end_time
+                applied = True
+
+        return mask if applied else None
+
+    @staticmethod
+    def _parse_filter_time(value, end_of_day=False):
+        """解析过滤条件中的时间，支持时间戳或日期字符串；只给出日期时，结束时间取当天末尾"""
+        if value is None or value == '':
+            return None
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        epoch = int(parse_publish_time([value])[0])
+        if epoch == MISSING_TIME:
+            logger.warning(f"无法解析过滤时间: {value}")
+            return None
+        if end_of_day and ':' not in str(value):
+            epoch += 24 * 3600 - 1
+        return epoch
+
+    def _score_terms(self, query_terms, mask=None):
+        """
+        按查询词累加文档得分，过滤掩码在累加阶段直接作用于倒排表
+        
+        返回:
+            tuple: (与文档行对齐的得分数组, 匹配的查询词列表)
+        """
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        matched_terms = []
+
+        for term in query_terms:
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            matched_terms.append(term)
+
+            rows, weights = self._term_postings(term_id)
+            if mask is not None:
+                keep = mask[rows]
+                rows, weights = rows[keep], weights[keep]
+            # 同一词条的倒排表内文档行不重复，可直接按下标累加
+            scores[rows] += weights
+
+        return scores, matched_terms
+
+    def _select_top_k(self, rows, scores, top_k, score_threshold):
+        """从候选文档中选出得分最高的top_k个，按得分降序（同分按文档ID降序）返回(行号, 得分)"""
+        keep = scores >= score_threshold
+        rows, scores = rows[keep], scores[keep]
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((-self.doc_ids[rows], -scores))
+        return rows[order], scores[order]
+
+    def _collapse_near_duplicates(self, rows, top_k, max_distance):
+        """
+        折叠SimHash指纹汉明距离不超过max_distance的结果，每组只保留排序最靠前的一篇
+        
+        参数:
+            rows (np.ndarray): 已按得分降序排列的候选文档行号
+            
+        返回:
+            tuple: (保留的候选下标, 每篇保留文档折叠掉的近似重复数)
+        """
+        fingerprints = self.simhashes[rows]
+        # 每保留一篇只与尚未被折叠的候选比较，开销为 O(保留数×候选数)
+        remaining = np.arange(len(rows))
+        kept, collapsed = [], []
+        while len(remaining) > 0 and len(kept) < top_k:
+            i = remaining[0]
+            near = popcount(fingerprints[remaining] ^ fingerprints[i]) <= max_distance
+            kept.append(i)
+            collapsed.append(int(near.sum()) - 1)
+            remaining = remaining[~near]
+
+        return np.array(kept, dtype=np.int64), collapsed
+
+    def _diversify_by_host(self, rows, scores, top_k, method='cap', max_per_host=2, diversity=0.5):
+        """
+        按站点多样化已按得分降序排列的候选
+        
+        参数:
+            rows (np.ndarray): 候选文档行号（降序）
+            scores (np.ndarray): 对应得分
+            method (str): 'cap' 一次顺序扫描，每个站点最多保留max_per_host条，不足top_k时按原顺序补齐；
+                          'xquad' 以站点为查询方面的xQuAD贪心选择
+            
+        返回:
+            np.ndarray: 选中候选的下标，按选择顺序排列
+        """
+        if method not in DIVERSIFY_METHODS:
+            raise ValueError(f"未知的多样化方式: {method}，可选: {', '.join(DIVERSIFY_METHODS)}")
+        hosts = self.doc_columns['host_codes'][rows]
+        # 缺失站点的文档各自视为独立站点
+        hosts = np.where(hosts >= 0, hosts, -1 - np.arange(len(hosts)))
+        _, hosts = np.unique(hosts, return_inverse=True)
+        top_k = min(top_k, len(rows))
+
+        if method == 'xquad':
+            # P(h|q)按站点得分占比估计，P(d|h)为文档在站点内的得分占比；
+            # 站点新颖度 = Π(1 - P(d_j|h))，d_j为该站点已选文档
+            scores = np.maximum(np.asarray(scores, dtype=np.float64), 0)
+            host_mass = np.bincount(hosts, weights=scores)
+            total = host_mass.sum()
+            if total == 0:
+                return np.arange(top_k)
+            relevance = scores / total
+            coverage = np.where(host_mass[hosts] > 0, scores / np.maximum(host_mass[hosts], 1e-12), 0)
+            host_share = host_mass[hosts] / total
+            novelty = np.ones(len(host_mass))
+
+            available = np.ones(len(rows), dtype=bool)
+            selected = []
+            for _ in range(top_k):
+                gains = (1 - diversity) * relevance + diversity * host_share * coverage * novelty[hosts]
+                gains[~available] = -np.inf
+                best = int(np.argmax(gains))
+                selected.append(best)
+                available[best] = False
+                novelty[hosts[best]] *= 1 - coverage[best]
+            return np.array(selected, dtype=np.int64)
+
+        # cap：计算每个候选在所属站点中的名次（保持原有顺序），一次筛选
+        by_host = np.argsort(hosts, kind='stable')
+        sorted_hosts = hosts[by_host]
+        group_starts = np.flatnonzero(np.r_[True, sorted_hosts[1:] != sorted_hosts[:-1]])
+        rank_in_host = np.empty(len(rows), dtype=np.int64)
+        rank_in_host[by_host] = np.arange(len(rows)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(rows)]))
+
+        within_cap = rank_in_host < max_per_host
+        selected = np.flatnonzero(within_cap)[:top_k]
+        if len(selected) < top_k:
+            selected = np.concatenate([selected, np.flatnonzero(~within_cap)[:top_k - len(selected)]])
+        return selected
+
+    def iter_search(self, query, top_k=10, score_threshold=0.01, filters=None,
+               collapse_duplicates=False, max_hamming_distance=3, rerank=False, rerank_depth=500,
+               diversify=None, max_per_host=2, diversity=0.5,
+               summary=False) -> Iterator[Union[SearchResult, SearchSummary]]:
+        """
+        搜索查询，逐条产出结果
+        
+        打分与排序完成后，每组装好一条结果（附加文档元数据）就立即产出，
+        调用方可以边生成边发送，不必等全部结果构建完成。
+        拼写建议等本次查询的汇总信息随结果一起返回，不保存在引擎上，并发查询之间互不影响。
         
         参数:
             query (str): 查询字符串
             top_k (int): 返回的最大结果数
+            score_threshold (float): 最低得分阈值
+            filters (dict, optional): 过滤条件，见_build_filter_mask
+            collapse_duplicates (bool): 是否折叠SimHash指纹相近的近似重复结果
+            max_hamming_distance (int): 判定为近似重复的最大汉明距离
+            rerank (bool): 是否对一阶段的前rerank_depth个候选做二阶段重排
+            rerank_depth (int): 参与重排的候选数
+            diversify (str, optional): 按站点多样化结果，'cap'(每个站点最多max_per_host条) 或 'xquad'，其他取值忽略
+            max_per_host (int): cap多样化时每个站点的最大结果数
+            diversity (float): xquad多样化时多样性的权重
+            summary (bool): 是否在全部结果之后再产出一条汇总(SearchSummary)
+                            {'done': True, 'total': 结果数, 'suggestion': 无结果时的拼写建议(见suggest_query)或None}
         
-        返回:
-            list: 搜索结果列表，每个结果是一个字典
+        产出:
+            SearchResult: 按得分降序的搜索结果
         """
         if self.inverted_index is None:
             logger.error("倒排索引尚未加载，请先调用load_index()")
-            return []
+            return
 
         start_time = time.time()
         logger.info(f"执行查询: '{query}'...")
 
+        if diversify and diversify not in DIVERSIFY_METHODS:
+            logger.warning(f"未知的多样化方式: {diversify}，不做多样化")
+            diversify = None
+
         # 1. 查询预处理：分词
-        try:
-            import jieba
-            words = jieba.cut(query)
-            query_terms = [w for w in words if w.strip()]
-        except ImportError:
-            # 如果没有jieba，简单按空格分词
-            query_terms = query.split()
+        query_terms = self._segment_query(query)
 
         logger.info(f"查询分词结果: {', '.join(query_terms)}")
 
-        # 2. 计算每个文档的得分
-        doc_scores = defaultdict(float)
-        matched_terms = []
+        # 2. 计算每个文档的得分（过滤条件在累加时生效）
+        mask = self._build_filter_mask(filters)
+        scores, matched_terms = self._score_terms(query_terms, mask)
+        candidate_rows = np.flatnonzero(scores)
 
-        for term in query_terms:
-            if term in self.inverted_index:
-                matched_terms.append(term)
+        if len(candidate_rows) == 0:
+            logger.info(f"未找到匹配的文档，查询耗时: {time.time() - start_time:.2f}秒")
+            if summary:
+                yield {'done': True, 'total': 0, 'suggestion': self.suggest_query(query, query_terms)}
+            return
 
-                # 为每个包含该词的文档增加得分
-                for doc_id_str, weight in self.inverted_index[term]:
-                    # 注意：JSON中的键都是字符串，需要转换为整数
-                    doc_id = int(doc_id_str) if isinstance(doc_id_str, str) else doc_id_str
-                    doc_scores[doc_id] += weight
+        # 3. 找出得分最高的top_k个文档，并按得分降序排列
+        candidate_scores = scores[candidate_rows]
+        collapse = collapse_duplicates and self.simhashes is not None
+        diversify = diversify if diversify and self.doc_columns is not None and 'host_codes' in self.doc_columns else None
+        # 多样化需要在比top_k更大的候选列表上进行
+        needed = top_k * 4 if diversify else top_k
+        collapsed = None
+        first_stage = None
+        if rerank and self.reranker is not None:
+            # 二阶段重排：在更大的候选池上计算完整特征后重新排序
+            pool_rows, pool_scores = self._select_top_k(
+                candidate_rows, candidate_scores, max(rerank_depth, needed), score_threshold)
+            pool_rows, pool_scores, first_stage = self.reranker.rerank(
+                pool_rows, pool_scores, self.query_encoder.encode([query_terms]))
+            if collapse:
+                kept, collapsed = self._collapse_near_duplicates(pool_rows, needed, max_hamming_distance)
+            else:
+                kept = np.arange(min(needed, len(pool_rows)))
+        elif collapse:
+            # 在比top_k更大的候选池上折叠近似重复，池不够时逐步扩大，最多扩大到MAX_COLLAPSE_POOL
+            max_pool = max(MAX_COLLAPSE_POOL, needed)
+            pool_size = min(needed * 4, max_pool)
+            while True:
+                pool_rows, pool_scores = self._select_top_k(
+                    candidate_rows, candidate_scores, pool_size, score_threshold)
+                kept, collapsed = self._collapse_near_duplicates(pool_rows, needed, max_hamming_distance)
+                if len(kept) == needed or len(pool_rows) < pool_size or pool_size == max_pool:
+                    break
+                pool_size = min(pool_size * 4, max_pool)
+        else:
+            pool_rows, pool_scores = self._select_top_k(candidate_rows, candidate_scores, needed, score_threshold)
+            kept = np.arange(len(pool_rows))
 
-        if not doc_scores:
-            logger.info(f"未找到匹配的文档，查询耗时: {time.time() - start_time:.2f}秒")
+        if diversify:
+            selected = self._diversify_by_host(pool_rows[kept], pool_scores[kept], top_k,
+                                               diversify, max_per_host, diversity)
+            kept = kept[selected]
+            if collapsed is not None:
+                collapsed = [collapsed[i] for i in selected]
+
+        # 4. 逐条组装并产出结果
+        for i, position in enumerate(kept):
+            row = pool_rows[position]
+            result = self._format_result(int(self.doc_ids[row]), float(pool_scores[position]), matched_terms)
+            if first_stage is not None:
+                result['first_stage_score'] = float(first_stage[position])
+            if collapsed is not None:
+                result['near_duplicates'] = collapsed[i]
+            yield result
+
+        logger.info(f"找到{len(candidate_rows)}个匹配文档，返回得分最高的{len(kept)}个")
+        logger.info(f"匹配的查询词: {', '.join(matched_terms)}")
+        logger.info(f"搜索耗时: {time.time() - start_time:.2f}秒")
+        if summary:
+            suggestion = self.suggest_query(query, query_terms) if len(kept) == 0 else None
+            yield {'done': True, 'total': int(len(kept)), 'suggestion': suggestion}
+
+    def search(self, query, top_k=10, score_threshold=0.01, filters=None, **options) -> List[SearchResult]:
+        """
+        搜索查询
+        
+        参数:
+            query (str): 查询字符串
+            top_k (int): 返回的最大结果数
+            score_threshold (float): 最低得分阈值
+            filters (dict, optional): 过滤条件，见_build_filter_mask
+            **options: 折叠近似重复、二阶段重排、站点多样化等选项，见iter_search
+        
+        返回:
+            list: 搜索结果(SearchResult)列表
+        """
+        return list(self.iter_search(query, top_k=top_k, score_threshold=score_threshold, filters=filters, **options))
+
+    def suggest_query(self, query, query_terms=None):
+        """
+        为包含词汇表外词语的查询给出"您是不是要找"建议
+        
+        连续的词汇表外词语合并后整体纠错（错别字常被分词切成单字），每段取得分最高的候选。
+        
+        参数:
+            query (str): 原始查询字符串
+            query_terms (list, optional): 已有的分词结果
+        
+        返回:
+            dict: {'suggestion': 纠正后的查询, 'corrections': [{'term', 'suggestion', 'score'}]}；
+                  没有可用建议时返回None
+        """
+        if self.spelling_corrector is None:
+            return None
+
+        if query_terms is None:
+            query_terms = self._segment_query(query)
+
+        def best_correction(text):
+            # 只建议仍在倒排索引中的词语
+            for candidate, score in self.spelling_corrector.suggest(text, limit=5):
+                if candidate in self.term_ids:
+                    return {'term': text, 'suggestion': candidate, 'score': score}
+            return None
+
+        # 找出连续的词汇表外词语
+        runs, current = [], []
+        for term in query_terms + [None]:
+            if term is not None and term.lower() not in self.term_ids:
+                current.append(term)
+            elif current:
+                runs.append(current)
+                current = []
+
+        suggestion = query
+        corrections = []
+        for run in runs:
+            # 整段纠错与逐词纠错取平均得分更高者，未得到建议的词记0分
+            joined = ''.join(run)
+            whole = best_correction(joined) if len(joined) >= 2 and joined in query else None
+            per_term = [best_correction(term) if len(term) >= 2 else None for term in run]
+            per_term_score = sum(c['score'] for c in per_term if c) / len(run)
+            if whole is not None and whole['score'] >= per_term_score:
+                chosen = [whole]
+            else:
+                chosen = [c for c in per_term if c]
+            for correction in chosen:
+                suggestion = suggestion.replace(correction['term'], correction['suggestion'], 1)
+                corrections.append(correction)
+
+        if not corrections:
+            return None
+        logger.info(f"拼写建议: '{query}' -> '{suggestion}'")
+        return {'suggestion': suggestion, 'corrections': corrections}
+
+    def facet_counts(self, query, filters=None, facets=None, score_threshold=0.0, limit=None):
+        """
+        统计查询完整匹配集合（而非top_k）在来源、发布月份等分面上的文档数
+        
+        参数:
+            query (str): 查询字符串
+            filters (dict, optional): 过滤条件，与search一致
+            facets (list, optional): 需要统计的分面名，默认全部
+            score_threshold (float): 计入统计的最低得分
+            limit (int, optional): 每个分面最多返回的取值数
+        
+        返回:
+            dict: 分面名 -> [{'value': 取值, 'count': 文档数}, ...]
+        """
+        if self.inverted_index is None:
+            logger.error("倒排索引尚未加载，请先调用load_index()")
+            return {}
+        if self.facet_engine is None:
+            logger.warning("索引中没有分面位图，无法进行分面统计")
+            return {}
+
+        start_time = time.time()
+        mask = self._build_filter_mask(filters)
+        scores, _ = self._score_terms(self._segment_query(query), mask)
+        candidate_mask = (scores > 0) & (scores >= score_threshold)
+
+        counts = self.facet_engine.count(candidate_mask, facets=facets, limit=limit)
+        logger.info(f"分面统计完成，匹配文档{int(candidate_mask.sum())}个，耗时: {time.time() - start_time:.3f}秒")
+        return counts
+
+    def _dense_candidates(self, query_terms, top_k, n_probe, mask=None):
+        """
+        稠密检索候选：返回(原始文档ID数组, 余弦相似度数组)，按相似度降序
+        
+        参数:
+            mask (np.ndarray, optional): 与文档行对齐的过滤掩码
+        """
+        query_embedding = self.dense_retriever.project(self.query_encoder.encode([query_terms]))[0]
+        if not query_embedding.any():
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        return self.dense_retriever.search(query_embedding, top_k=top_k, n_probe=n_probe,
+                                           doc_mask=self._doc_id_filter(mask))
+
+    def _doc_id_filter(self, mask):
+        """
+        将与文档行对齐的过滤掩码包装为按原始文档ID过滤的函数，供只覆盖基础索引的稠密检索、段落检索和相似文档使用：
+        最新版本在增量段中的文档（基础索引中的向量已过时）同样被过滤掉。mask为None且没有增量段时返回None
+        """
+        if mask is None and self.base_rows == len(self.doc_ids):
+            return None
+
+        def doc_mask(doc_ids):
+            rows = self._rows_for_doc_ids(doc_ids)
+            keep = (rows >= 0) & (rows < self.base_rows)
+            return keep & mask[np.maximum(rows, 0)] if mask is not None else keep
+
+        return doc_mask
+
+    def dense_search(self, query, top_k=10, n_probe=8, filters=None) -> List[SearchResult]:
+        """
+        LSA稠密检索：查询经TF-IDF编码和SVD投影后，在IVF索引中做近似最近邻检索
+        
+        参数:
+            query (str): 查询字符串
+            top_k (int): 返回的最大结果数
+            n_probe (int): 检索的IVF簇数
+            filters (dict, optional): 过滤条件，与search一致
+        
+        返回:
+            list: 搜索结果列表，score为查询与文档在潜在语义空间的余弦相似度
+        """
+        if self.dense_retriever is None:
+            logger.warning("索引中没有稠密索引，请先运行DenseIndexBuilder")
             return []
 
-        # 3. 使用最小堆找出得分最高的top_k个文档
-        top_docs = []
-        for doc_id, score in doc_scores.items():
-            if score >= score_threshold:
-                if len(top_docs) < top_k:
-                    heapq.heappush(top_docs, (score, doc_id))
-                else:
-                    if score > top_docs[0][0]:
-                        heapq.heappushpop(top_docs, (score, doc_id))
-
-        # 4. 按得分降序排列结果
-        results = []
-        for score, doc_id in sorted(top_docs, reverse=True):
-            result = {
-                'doc_id': doc_id,
-                'score': score,
-                'matched_terms': matched_terms
-            }
+        start_time = time.time()
+        query_terms = self._segment_query(query)
+        doc_ids, scores = self._dense_candidates(query_terms, top_k, n_probe, self._build_filter_mask(filters))
 
-            # 修改: 添加文档元数据 - 通过doc_id查找元数据，而不是通过位置索引
-            if self.document_metadata is not None:
-                try:
-                    # 直接使用doc_id查找对应的行
-                    if doc_id in self.document_metadata.index:
-                        doc_data = self.document_metadata.loc[doc_id]
-                        # 遍历元数据所有列
-                        for col in self.document_metadata.columns:
-                            result[col] = doc_data[col]
-                    else:
-                        logger.warning(f"在元数据中找不到文档ID {doc_id}")
-                except Exception as e:
-                    logger.warning(f"获取文档{doc_id}元数据失败: {e}")
+        matched_terms = [term for term in query_terms if term in self.term_ids]
+        results = [self._format_result(int(doc_id), float(score), matched_terms)
+                   for doc_id, score in zip(doc_ids, scores)]
+
+        logger.info(f"稠密检索返回{len(results)}个结果，耗时: {(time.time() - start_time) * 1000:.1f}毫秒")
+        return results
+
+    def hybrid_search(self, query, top_k=10, lexical_k=100, dense_k=100, fusion='rrf',
+                      rrf_k=60, dense_weight=0.5, n_probe=8, filters=None, return_stats=False):
+        """
+        稀疏+稠密混合检索：倒排索引与LSA稠密检索两路并行召回，再融合排序
+        
+        参数:
+            query (str): 查询字符串
+            top_k (int): 返回的最大结果数
+            lexical_k (int): 倒排索引一路的候选数
+            dense_k (int): 稠密检索一路的候选数
+            fusion (str): 'rrf'(倒数排名融合) 或 'weighted'(归一化得分加权)
+            rrf_k (int): RRF平滑常数
+            dense_weight (float): weighted融合时稠密一路的权重
+            n_probe (int): 稠密检索的IVF簇数
+            filters (dict, optional): 过滤条件，与search一致
+            return_stats (bool): 是否同时返回两路候选数与各阶段耗时(毫秒)
+        
+        返回:
+            list: 搜索结果列表，附带lexical_rank/dense_rank(从1开始，未召回为None)；
+                  return_stats为True时返回(结果列表, 统计信息)
+        """
+        if self.inverted_index is None:
+            logger.error("倒排索引尚未加载，请先调用load_index()")
+            return ([], None) if return_stats else []
+        if self.dense_retriever is None:
+            logger.warning("索引中没有稠密索引，混合检索退化为倒排索引检索")
+            results = self.search(query, top_k=top_k, score_threshold=0.0, filters=filters)
+            return (results, None) if return_stats else results
+
+        start_time = time.time()
+        query_terms = self._segment_query(query)
+        mask = self._build_filter_mask(filters)
+
+        def lexical_arm():
+            arm_start = time.time()
+            scores, _ = self._score_terms(query_terms, mask)
+            candidate_rows = np.flatnonzero(scores)
+            rows, arm_scores = self._select_top_k(candidate_rows, scores[candidate_rows], lexical_k, 0.0)
+            return rows, arm_scores, time.time() - arm_start
+
+        def dense_arm():
+            arm_start = time.time()
+            doc_ids, arm_scores = self._dense_candidates(query_terms, dense_k, n_probe, mask)
+            rows = self._rows_for_doc_ids(doc_ids)
+            valid = rows >= 0
+            return rows[valid], arm_scores[valid], time.time() - arm_start
 
+        # 两路并行执行，各自只保留一个较小的候选池
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='hybrid')
+        dense_future = self._executor.submit(dense_arm)
+        lexical_rows, lexical_scores, lexical_time = lexical_arm()
+        dense_rows, dense_scores, dense_time = dense_future.result()
+
+        # 融合：在两路候选的并集上向量化计算融合得分
+        fusion_start = time.time()
+        rows = np.union1d(lexical_rows, dense_rows)
+        lexical_rank = np.zeros(len(rows), dtype=np.int64)
+        dense_rank = np.zeros(len(rows), dtype=np.int64)
+        lexical_rank[np.searchsorted(rows, lexical_rows)] = np.arange(1, len(lexical_rows) + 1)
+        dense_rank[np.searchsorted(rows, dense_rows)] = np.arange(1, len(dense_rows) + 1)
+
+        if fusion == 'weighted':
+            def normalize(arm_scores):
+                if len(arm_scores) == 0:
+                    return arm_scores
+                low, high = arm_scores.min(), arm_scores.max()
+                return (arm_scores - low) / (high - low) if high > low else np.ones_like(arm_scores)
+
+            fused = np.zeros(len(rows), dtype=np.float32)
+            fused[np.searchsorted(rows, lexical_rows)] += (1 - dense_weight) * normalize(lexical_scores)
+            fused[np.searchsorted(rows, dense_rows)] += dense_weight * normalize(dense_scores)
+        else:
+            fused = np.where(lexical_rank > 0, 1.0 / (rrf_k + lexical_rank), 0.0) \
+                + np.where(dense_rank > 0, 1.0 / (rrf_k + dense_rank), 0.0)
+
+        top_rows, top_scores = self._select_top_k(rows, fused, top_k, -np.inf)
+        positions = np.searchsorted(rows, top_rows)
+        fusion_time = time.time() - fusion_start
+
+        matched_terms = [term for term in query_terms if term in self.term_ids]
+        results = []
+        for row, score, position in zip(top_rows, top_scores, positions):
+            result = self._format_result(int(self.doc_ids[row]), float(score), matched_terms)
+            result['lexical_rank'] = int(lexical_rank[position]) or None
+            result['dense_rank'] = int(dense_rank[position]) or None
             results.append(result)
 
-        logger.info(f"找到{len(doc_scores)}个匹配文档，返回得分最高的{len(results)}个")
-        logger.info(f"匹配的查询词: {', '.join(matched_terms)}")
-        logger.info(f"搜索耗时: {time.time() - start_time:.2f}秒")
+        stats = {
+            'lexical_ms': lexical_time * 1000,
+            'dense_ms': dense_time * 1000,
+            'fusion_ms': fusion_time * 1000,
+            'total_ms': (time.time() - start_time) * 1000,
+            'lexical_candidates': int(len(lexical_rows)),
+            'dense_candidates': int(len(dense_rows))
+        }
+        logger.info(f"混合检索完成: 倒排{len(lexical_rows)}个候选/{lexical_time * 1000:.1f}毫秒，"
+                    f"稠密{len(dense_rows)}个候选/{dense_time * 1000:.1f}毫秒，"
+                    f"融合{fusion_time * 1000:.1f}毫秒，总耗时{stats['total_ms']:.1f}毫秒")
+        return (results, stats) if return_stats else results
 
+    def search_passages(self, query, top_k=10, filters=None, max_per_doc=None) -> List[SearchResult]:
+        """
+        段落级检索：返回与查询最相关的段落及其所属文档，供RAG组装上下文
+        
+        参数:
+            query (str): 查询字符串
+            top_k (int): 返回的最大段落数
+            filters (dict, optional): 过滤条件，与search一致，作用于段落所属文档
+            max_per_doc (int, optional): 每篇文档最多返回的段落数
+        
+        返回:
+            list: 段落结果列表，包含chunk_id、ordinal(文档内序号)、text(段落原文)
+                  以及所属文档的doc_id和元数据
+        """
+        if self.passage_retriever is None:
+            logger.warning("索引中没有段落索引，请先运行PassageIndexBuilder")
+            return []
+
+        start_time = time.time()
+        query_terms = self._segment_query(query)
+        indices, scores = self.passage_retriever.search(
+            self.query_encoder.encode([query_terms]),
+            top_k=top_k,
+            doc_mask=self._doc_id_filter(self._build_filter_mask(filters)),
+            max_per_doc=max_per_doc
+        )
+
+        matched_terms = [term for term in query_terms if term in self.term_ids]
+        results = []
+        for index, score in zip(indices, scores):
+            result = self._format_result(int(self.passage_retriever.doc_ids[index]), float(score), matched_terms)
+            result['chunk_id'] = int(self.passage_retriever.chunk_ids[index])
+            result['ordinal'] = int(self.passage_retriever.ordinals[index])
+            result['text'] = self.passage_retriever.passage_text(index)
+            results.append(result)
+
+        logger.info(f"段落检索返回{len(results)}个段落，耗时: {(time.time() - start_time) * 1000:.1f}毫秒")
         return results
 
+    def build_context(self, query, budget=2000, unit='chars', num_candidates=50, diversity=0.3,
+                      filters=None, max_per_doc=None):
+        """
+        为RAG组装上下文：召回候选段落，用MMR选出相关且互不重复的段落，按预算打包并附带引用
+        
+        参数:
+            query (str): 查询字符串
+            budget (int): 上下文预算
+            unit (str): 预算单位，'chars'(字符数) 或 'tokens'(估计的token数)
+            num_candidates (int): 参与MMR选择的候选段落数
+            diversity (float): MMR多样性权重
+            filters (dict, optional): 过滤条件，与search一致
+            max_per_doc (int, optional): 每篇文档最多入选的段落数
+        
+        返回:
+            dict: context(带[n]引用标记的上下文文本)、citations(引用列表)、used(已用预算)等
+        """
+        context = {'query': query, 'budget': budget, 'unit': unit, 'used': 0, 'context': '', 'citations': []}
+        if self.passage_retriever is None:
+            logger.warning("索引中没有段落索引，请先运行PassageIndexBuilder")
+            return context
+
+        start_time = time.time()
+        query_terms = self._segment_query(query)
+        indices, scores = self.passage_retriever.search(
+            self.query_encoder.encode([query_terms]),
+            top_k=num_candidates,
+            doc_mask=self._doc_id_filter(self._build_filter_mask(filters)),
+            max_per_doc=max_per_doc
+        )
+        order = maximal_marginal_relevance(scores, self.passage_retriever.passage_vectors[indices],
+                                           len(indices), diversity=diversity)
+
+        measure = estimate_tokens if unit == 'tokens' else len
+        separator = '\n\n'
+        blocks = []
+        for position in order:
+            index = indices[position]
+            text = self.passage_retriever.passage_text(index)
+            block = f"[{len(blocks) + 1}] {text}"
+            cost = measure(block) + (measure(separator) if blocks else 0)
+            # 放不下的段落跳过，继续尝试更短的候选
+            if context['used'] + cost > budget:
+                continue
+            context['used'] += cost
+            blocks.append(block)
+
+            citation = self._format_result(int(self.passage_retriever.doc_ids[index]), float(scores[position]), [])
+            citation.pop('matched_terms')
+            citation.pop('content_preview', None)
+            citation['citation'] = len(blocks)
+            citation['chunk_id'] = int(self.passage_retriever.chunk_ids[index])
+            citation['ordinal'] = int(self.passage_retriever.ordinals[index])
+            citation['text'] = text
+            context['citations'].append(citation)
+
+        context['context'] = separator.join(blocks)
+        logger.info(f"上下文组装完成，{len(indices)}个候选段落选入{len(blocks)}个，"
+                    f"用量{context['used']}/{budget}{unit}，耗时: {(time.time() - start_time) * 1000:.1f}毫秒")
+        return context
+
+    def similar_documents(self, doc_id, top_k=10) -> List[SearchResult]:
+        """
+        查询预计算的相似文档（"更多类似结果"）
+        
+        参数:
+            doc_id (int): 原始文档ID
+            top_k (int): 返回的最大结果数，不超过构建相似文档表时的k
+        
+        返回:
+            list: 相似文档列表，score为余弦相似度；文档不在表中时返回空列表
+        """
+        if self.neighbor_ids is None:
+            logger.warning("索引中没有相似文档表，请先运行NeighborTableBuilder")
+            return []
+
+        row = self.neighbor_lookup.get(int(doc_id))
+        if row is None:
+            logger.warning(f"相似文档表中找不到文档ID {doc_id}")
+            return []
+
+        if self._rows_for_doc_ids([doc_id])[0] >= self.base_rows:
+            logger.warning(f"文档ID {doc_id} 已在增量段中更新，相似文档表只覆盖基础索引")
+            return []
+
+        neighbor_ids = self.neighbor_ids[row]
+        neighbor_scores = self.neighbor_scores[row]
+        valid = neighbor_ids >= 0
+        doc_filter = self._doc_id_filter(self.live_rows)
+        if doc_filter is not None:
+            valid &= doc_filter(neighbor_ids)
+        return [
+            self._format_result(int(neighbor_id), float(score), [])
+            for neighbor_id, score in zip(neighbor_ids[valid][:top_k], neighbor_scores[valid][:top_k])
+        ]
+
+    def search_batch(self, queries, top_k=10, score_threshold=0.01, block_size=256, filters=None):
+        """
+        批量搜索：一次性完成所有查询的分词，合并各查询共享的词条查找，
+        再按查询块进行稀疏矩阵乘法打分。结果按查询顺序逐条产出，便于流式返回。
+        
+        参数:
+            queries (list): 查询字符串列表
+            top_k (int): 每个查询返回的最大结果数
+            score_threshold (float): 最低得分阈值
+            block_size (int): 每个打分块包含的查询数
+            filters (dict, optional): 作用于整批查询的过滤条件
+        
+        返回:
+            generator: 逐个产出 (查询, 结果列表)
+        """
+        if self.inverted_index is None:
+            logger.error("倒排索引尚未加载，请先调用load_index()")
+            return
+
+        start_time = time.time()
+        queries = list(queries)
+        logger.info(f"执行批量查询，共{len(queries)}个查询...")
+
+        # 1. 一次性分词，重复的查询只处理一次
+        unique_queries = list(dict.fromkeys(queries))
+        query_terms = {query: self._segment_query(query) for query in unique_queries}
+
+        # 2. 合并整批查询的词条查找：每个不同的词只查一次倒排表
+        batch_terms = {}
+        for terms in query_terms.values():
+            for term in terms:
+                if term not in batch_terms and term in self.term_ids:
+                    batch_terms[term] = len(batch_terms)
+
+        # 只保留本批次涉及的倒排行，得到(批次词条×文档)子矩阵
+        term_rows = np.fromiter((self.term_ids[term] for term in batch_terms),
+                                dtype=np.int64, count=len(batch_terms))
+        sub_postings = self._postings_rows(term_rows)
+
+        # 过滤条件对整批查询只作用一次：直接剔除子矩阵中被过滤的文档列
+        mask = self._build_filter_mask(filters)
+        if mask is not None:
+            sub_postings = (sub_postings @ sparse.diags(mask.astype(np.float32))).tocsr()
+            sub_postings.eliminate_zeros()
+
+        # 3. 分块打分：查询-词条计数矩阵 × 倒排子矩阵，每完成一块就按原查询顺序产出结果；
+        # 每个查询的最后一次出现产出后即释放其结果，内存只保留已打分但尚未产出的查询
+        batch_results = {}
+        remaining = Counter(queries)
+        next_output = 0
+        for block_start in range(0, len(unique_queries), block_size):
+            block_queries = unique_queries[block_start:block_start + block_size]
+
+            q_rows, q_cols = [], []
+            for i, query in enumerate(block_queries):
+                for term in query_terms[query]:
+                    if term in batch_terms:
+                        q_rows.append(i)
+                        q_cols.append(batch_terms[term])
+            # 重复词条会被累加，与单条search的计分方式一致
+            query_matrix = sparse.csr_matrix(
+                (np.ones(len(q_rows), dtype=np.float32), (q_rows, q_cols)),
+                shape=(len(block_queries), len(batch_terms))
+            )
+            block_scores = (query_matrix @ sub_postings).tocsr()
+
+            for i, query in enumerate(block_queries):
+                row_start, row_end = block_scores.indptr[i], block_scores.indptr[i + 1]
+                rows = block_scores.indices[row_start:row_end]
+                scores = block_scores.data[row_start:row_end]
+
+                rows, scores = self._select_top_k(rows, scores, top_k, score_threshold)
+
+                matched_terms = [term for term in query_terms[query] if term in batch_terms]
+                batch_results[query] = [
+                    self._format_result(int(self.doc_ids[row]), float(score), matched_terms)
+                    for row, score in zip(rows, scores)
+                ]
+
+            while next_output < len(queries) and queries[next_output] in batch_results:
+                query = queries[next_output]
+                results = batch_results[query]
+                remaining[query] -= 1
+                if remaining[query] == 0:
+                    del batch_results[query]
+                yield query, results
+                next_output += 1
+
+        logger.info(f"批量查询完成，共{len(unique_queries)}个不同查询，涉及{len(batch_terms)}个词条，"
+                    f"耗时: {time.time() - start_time:.2f}秒")
+
     def get_term_stats(self):
         """获取索引词汇的统计信息"""
         if not self.inverted_index:
@@ -227,6 +1302,9 @@ class SearchEngine:
                     print("-" * 60)
             else:
                 print("未找到匹配的文档，请尝试其他关键词。")
+                suggestion = self.suggest_query(query)
+                if suggestion:
+                    print(f"您是不是要找: {suggestion['suggestion']}")
 
             # 询问是否需要查看文档详情
             if results:
@@ -300,6 +1378,9 @@ def main():
                 print("-" * 50)
         else:
             print("未找到匹配的文档。")
+            suggestion = search_engine.suggest_query(args.query)
+            if suggestion:
+                print(f"您是不是要找: {suggestion['suggestion']}")
     else:
         # 如果没有提供查询参数，进入交互式模式
         search_engine.interactive_search()
@@ -0,0 +1,96 @@
+import os
+import logging
+import numpy as np
+from scipy import sparse
+
+from index.inverted_index import char_bigrams
+
+logger = logging.getLogger(__name__)
+
+
+class SpellingCorrector:
+    """
+    拼写纠错 - 基于词汇表字符二元组索引给出"您是不是要找"建议
+
+    候选词与查询词共享的二元组越多、文档频率越高，排名越靠前：
+        score = Dice(二元组重叠) + df_weight * log(1 + df) / log(1 + 最大df)
+    只读取查询词二元组对应的几行倒排列表，单个词的纠错在毫秒以内。
+    """
+
+    def __init__(self, index_dir, min_similarity=0.4, df_weight=0.1):
+        """
+        参数:
+            index_dir (str): 倒排索引目录路径
+            min_similarity (float): 候选词的最低Dice相似度
+            df_weight (float): 文档频率在排序中的权重
+        """
+        self.index_dir = index_dir
+        self.min_similarity = min_similarity
+        self.df_weight = df_weight
+
+        self.terms = None
+        self.bigram_ids = None
+        self.bigram_index = None
+        self.term_bigram_counts = None
+        self.df_scores = None
+
+    def load(self, vocabulary):
+        """
+        加载拼写纠错索引，文件不存在时返回False
+
+        参数:
+            vocabulary (list): 与索引对齐的词汇表
+        """
+        index_file = os.path.join(self.index_dir, "spelling_index.npz")
+        if vocabulary is None or not os.path.exists(index_file):
+            return False
+
+        with open(os.path.join(self.index_dir, "spelling_bigrams.txt"), 'r', encoding='utf-8') as f:
+            self.bigram_ids = {line.rstrip('\n'): i for i, line in enumerate(f)}
+        self.bigram_index = sparse.load_npz(index_file).tocsr()
+        if self.bigram_index.shape[1] != len(vocabulary):
+            logger.warning("拼写纠错索引与词汇表长度不一致，拼写建议不可用")
+            return False
+
+        self.terms = vocabulary
+        self.term_bigram_counts = np.diff(self.bigram_index.tocsc().indptr)
+        term_df = np.load(os.path.join(self.index_dir, "term_df.npy")).astype(np.float32)
+        max_df = term_df.max() if len(term_df) > 0 else 0
+        self.df_scores = np.log1p(term_df) / np.log1p(max_df) if max_df > 0 else np.zeros_like(term_df)
+        return True
+
+    def suggest(self, term, limit=3):
+        """
+        为单个词给出纠错建议
+
+        参数:
+            term (str): 查询词
+            limit (int): 最多返回的建议数
+
+        返回:
+            list: (建议词, 得分) 列表，按得分降序
+        """
+        bigrams = char_bigrams(term.lower())
+        rows = [self.bigram_ids[bigram] for bigram in bigrams if bigram in self.bigram_ids]
+        if not rows:
+            return []
+
+        # 统计每个候选词与查询词共享的二元组数
+        candidates = self.bigram_index[rows].indices
+        overlap = np.bincount(candidates, minlength=len(self.terms))
+        candidate_ids = np.flatnonzero(overlap)
+        dice = 2 * overlap[candidate_ids] / (len(bigrams) + self.term_bigram_counts[candidate_ids])
+
+        keep = dice >= self.min_similarity
+        candidate_ids, dice = candidate_ids[keep], dice[keep]
+        scores = dice + self.df_weight * self.df_scores[candidate_ids]
+
+        order = np.argsort(-scores, kind='stable')
+        suggestions = []
+        for i in order:
+            candidate = self.terms[candidate_ids[i]]
+            if candidate != term:
+                suggestions.append((candidate, float(scores[i])))
+            if len(suggestions) == limit:
+                break
+        return suggestions